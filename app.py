@@ -1,258 +1,324 @@
-import matplotlib
-matplotlib.use("Agg")#juuste pour éviter un bug avec streamlit si t'as macos
 import streamlit as st
 import json
-from reportlab.platypus import SimpleDocTemplate, Image, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import plotly.graph_objects as go
-import streamlit.components.v1 as components
-from reportlab.lib.pagesizes import A4
-from sonalyse_advisor.agent_backend import interpret_json
-import re
-from reportlab.lib.enums import TA_LEFT
-from reportlab.lib.styles import ParagraphStyle
-import matplotlib.pyplot as plt
 import io
+import os
+import time
+import hashlib
 
 # Import vos fonctions existantes
-from sonalyse_advisor.json_utils import (
-    load_json,
-    json_extract_info,
-    get_average_rating,
-    get_noise_type_by_hour,
-    get_noise_type_percentage_hourly,
-    get_noise_type_percentage_daily,
-    get_average_db,
-    get_db_min_max_peak_by_hour,
-)
-
-from sonalyse_advisor.agent_backend import interpret_json
+from sonalyse_advisor.json_utils import load_json
+from sonalyse_advisor.pipeline import Pipeline, default_params
+from sonalyse_advisor.profiling import profiling_requested, stage, start_profile
+from sonalyse_advisor.validation import quarantine_path_for
+
+# matplotlib, reportlab et le client LLM sont importés à la demande
+# (génération PDF / onglet IA) pour garder un démarrage à froid rapide.
+# Voir benchmarks/startup_bench.py pour le budget d'import.
+
+CAPTURE_PATH = "data/dps_analysis_pi3_exemple.json"
+CONTEXT_PATH = "sonalyse_advisor/context.txt"
+ACCOMMODATION_PATH = "data/logement1.json"
+LIVE_DIR = "data/live"
+LIVE_REFRESH_SECONDS = 5
+SHARED_STORE_BUDGET_BYTES = 512 * 1024 * 1024
+D3_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "d3_charts")
 
 st.set_page_config(page_title="Sonalyze Diagnostic", page_icon="🔊", layout="wide")
 
+# ========================================
+# ⏱️ PROFILAGE À LA DEMANDE
+# ========================================
+
+# SONALYSE_PROFILE=1 ou ?profile=1 : la page entière est profilée (flame graph
+# + allocations par étape). Désactivé, ``stage`` ne fait rien.
+profile_run = None
+if profiling_requested(st.experimental_get_query_params()):
+    profile_run = start_profile(os.path.splitext(os.path.basename(CAPTURE_PATH))[0])
+
 # ========================================
 # 🔒 CHARGEMENT DES DONNÉES
 # ========================================
 
-@st.cache_data
-def load_data():
-    """Load real data from JSON and process it.
-    
+@st.cache_resource
+def get_shared_store():
+    """Process-wide store shared by every session of this server."""
+    from sonalyse_advisor.shared_store import SharedCaptureStore
 
-    Returns:
-        _type_: _description_
+    return SharedCaptureStore(SHARED_STORE_BUDGET_BYTES)
+
+
+def get_pipeline(capture_path, room_type=None, room=None, use_llm=False, cache=True):
+    """Pipeline of the capture (see ``pipeline``): dashboard, reports and PDF are its artifacts.
+
+    ``room_type`` is the ``pieces[].type`` of the measured room (grade
+    thresholds) and ``room`` its name in the long-term history (baseline of
+    the loud nights). Artifacts are cached on disk and shared with the CLI and
+    the HTTP service; ``cache=False`` rebuilds everything.
+    """
+    sources = {"capture": capture_path, "accommodation": ACCOMMODATION_PATH, "context": CONTEXT_PATH}
+    params = default_params(room_type, use_llm, room)
+    return Pipeline(sources, params) if cache else Pipeline(sources, params, cache_dir=None)
+
+
+def build_dashboard_data(pipeline):
+    """Dashboard data of the capture, each artifact in its own profiling stage."""
+    for name in ("segments", "aggregates", "dashboard"):
+        with stage(name):
+            data = pipeline.get(name)
+    return data
+
+
+def load_data(pipeline, capture_path, room_type=None, room=None):
+    """Return the dashboard data of the capture from the shared store.
+
+    Sessions viewing the same capture share one build; each receives its own copy.
     """
+    from sonalyse_advisor.shared_store import capture_key
+
     try:
-        # Load JSON
-        raw_data = load_json("data/dps_analysis_pi3_exemple.json")
-
-        # Extraction via ton module json_utils
-        (
-            extracted_rating,
-            extracted_dominant_noise,
-            extracted_average_median,
-            extracted_min_max_peak,
-            extracted_background_noise,
-        ) = json_extract_info(raw_data)
-
-        # Calculs statistiques via json_utils
-        average_db = get_average_db(extracted_average_median)
-        average_rating = get_average_rating(extracted_rating)
-        noise_percentage = get_noise_type_percentage_daily(extracted_dominant_noise)
-        noise_by_hour = get_noise_type_by_hour(extracted_dominant_noise)
-        noise_percentage_hourly = get_noise_type_percentage_hourly(noise_by_hour)
-        db_min_max_peak_by_hourly = get_db_min_max_peak_by_hour(extracted_average_median, extracted_min_max_peak)
-
-        # Retour uniforme
-        return {
-            "ratings": extracted_rating,
-            "dominant_noise": extracted_dominant_noise,
-            "average_median": extracted_average_median,
-            "min_max_peak": extracted_min_max_peak,
-            "background_noise": extracted_background_noise,
-            "stats": {
-                "avg_db": average_db,
-                "avg_db_day": average_db,
-                "avg_db_night": average_db * 0.8,
-                "max_db": max([x["max_dB"] for x in extracted_min_max_peak]),
-                "min_db": min([x["min_dB"] for x in extracted_min_max_peak]),
-            },
-            "grade": average_rating,
-            "noise_by_hour": noise_by_hour,
-            "noise_percentage": noise_percentage,
-            "noise_percentage_hourly": noise_percentage_hourly,
-            "db_min_max_peak_by_hourly": db_min_max_peak_by_hourly,
-        }
+        key = ("dashboard", room_type, room) + capture_key(capture_path)
+        return get_shared_store().get(key, lambda: build_dashboard_data(pipeline))
 
     except Exception as e:
         st.error(f"❌ Impossible de charger les données réelles : {e}")
         return None
 
-# Charger données
-data = load_data()
 
 # ========================================
-# TAB 2 — FCT PDF GENERATION
+# 📈 COMPOSANT D3
 # ========================================
 
-def fig_to_img(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches='tight', dpi=150)
-    buf.seek(0)
-    plt.close(fig)
-    return buf
+@st.cache_resource
+def get_d3_component():
+    """Composant déclaré une seule fois : HTML, CSS et JS sont servis en statique
+    (et mis en cache par le navigateur) au lieu d'être reconstruits à chaque rerun."""
+    import streamlit.components.v1 as components
 
-ia_response=interpret_json(
-    "sonalyse_advisor/dps_analysis_pi3_exemple.json",
-    "sonalyse_advisor/context.txt","data/logement1.json")
+    return components.declare_component("d3_charts", path=D3_COMPONENT_DIR)
 
-# Extraire uniquement la partie "3. Recommandations"
-match = re.search(r"3\. Recommandations\s*(.*?)(?:\n\d+\..*|$)", ia_response, re.DOTALL)
-recommendations_text = match.group(1).strip() if match else "Aucune recommandation disponible."
 
-# Enlever caractères spéciaux et bouts de code
-recommendations_text = re.sub(r"[^\w\s\-\.,:]", "", recommendations_text)
-recommendations_text = recommendations_text.replace("\n", "<br/>")
+def payload_version(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
 
 
+def render_d3_charts(charts, key="d3_charts"):
+    """Affiche les graphiques D3 en n'envoyant que les données qui ont changé.
 
-def generate_pdf_with_graphs(data):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # TITRE
-    elements.append(Paragraph("<b>Diagnostic Sonalyze - Rapport</b>", styles["Title"]))
-    elements.append(Spacer(1, 20))
-    
-    grade = data["grade"]
+    Chaque graphique part avec la version (hash) de ses données ; si le navigateur
+    l'a déjà, la donnée est remplacée par None. Une iframe rechargée redemande
+    les graphiques qui lui manquent via la valeur du composant.
+    """
+    sent = st.session_state.setdefault("d3_sent_versions", {})
+    request = st.session_state.get(key) or {}
+    missing = set()
+    if request.get("request") != st.session_state.get("d3_missing_handled"):
+        missing = set(request.get("missing", []))
+        st.session_state["d3_missing_handled"] = request.get("request")
 
-    grade_color = {
-        "A": "#00AA00",
-        "B": "#55CC00",
-        "C": "#AADD00",
-        "D": "#FFEE00",
-        "E": "#FFAA00",
-        "F": "#FF5500",
-        "G": "#DD0000",
-    }.get(grade, "#AADD00")
-
-    elements.append(Paragraph(
-        f"<para alignment='center'><font size=22><b>Note de performance : "
-        f"<font color='{grade_color}'>{grade}</font></b></font></para>",
-        styles["Title"]
-    ))
-    elements.append(Spacer(1, 20))
-
-    # =====================
-    # 📊 GRAPHE : Timeline
-    # =====================
-    timeline_data = data["db_min_max_peak_by_hourly"]
-
-    fig, ax = plt.subplots(figsize=(8, 3))
-    hours = sorted(timeline_data.keys())
-    values = [timeline_data[h]["average_dB"] for h in hours]
-    ax.plot(hours, values)
-    ax.set_title("Évolution du niveau sonore (24h)")
-    ax.set_xlabel("Heure")
-    ax.set_ylabel("dB")
-
-    img_timeline = fig_to_img(fig)
-    elements.append(Image(img_timeline, width=450, height=200))
-    elements.append(Spacer(1, 20))
-    
-        # ======================
-    # 🌐 GRAPHE RADAR : Sources de bruit
-    # ======================
-    labels = list(data["noise_percentage"].keys())
-    values = list(data["noise_percentage"].values())
+    args = {}
+    for name, payload in charts.items():
+        version = payload_version(payload)
+        unchanged = sent.get(name) == version and name not in missing
+        args[name] = {"version": version, "data": None if unchanged else payload}
+        sent[name] = version
 
-    # fermer le radar (dernier = premier)
-    values += values[:1]
-    angles = [n / float(len(labels)) * 2 * 3.1415926 for n in range(len(labels))]
-    angles += angles[:1]
+    return get_d3_component()(charts=args, key=key, default=None)
 
-    fig = plt.figure(figsize=(4, 4))
-    ax = plt.subplot(111, polar=True)
 
-    # Tracé
-    ax.plot(angles, values, linewidth=2)
-    ax.fill(angles, values, alpha=0.3)
+@st.cache_data
+def load_live_snapshot(snapshot_path, mtime):
+    """Build the dashboard data from the live aggregates snapshot.
 
-    # Label des axes
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(labels)
+    ``mtime`` is only there to invalidate the cache when the ingest endpoint
+    writes a new snapshot: the segment log itself is never re-parsed. The
+    dashboard shows the latest day of the source that sent the last segment.
+    """
+    from sonalyse_advisor.live_ingest import latest_day, load_snapshot
 
-    # Valeurs numériques
-    for i, v in enumerate(values[:-1]):
-        ax.text(angles[i], v + 3, f"{v:.1f}%", fontsize=9, ha='center')
+    source, day, aggregates = latest_day(load_snapshot(os.path.dirname(snapshot_path)))
+    if aggregates is None:
+        return None
+    hourly = aggregates["hourly"]["db_min_max_peak_per_hour"]
+    average_db = aggregates["daily"]["average_daily_db"]
+    max_values = [h["max_dB"] for h in hourly.values() if h["max_dB"] is not None]
+    min_values = [h["min_dB"] for h in hourly.values() if h["min_dB"] is not None]
+
+    return {
+        "stats": {
+            "avg_db": average_db,
+            "avg_db_day": aggregates["daily"]["period_leq_dB"]["day"],
+            "avg_db_night": aggregates["daily"]["period_leq_dB"]["night"],
+            "max_db": max(max_values) if max_values else 0,
+            "min_db": min(min_values) if min_values else 0,
+        },
+        "grade": aggregates["daily"]["average_daily_rating"],
+        "period_grades": aggregates["daily"]["period_grades"],
+        "measurements": aggregates["segments"],
+        "live_source": f"{source} — {day}",
+        # Déjà les types distincts de chaque heure, du plus fréquent au moins fréquent
+        "noise_types_by_hour": aggregates["hourly"]["labels_by_hour"],
+        "noise_percentage": aggregates["daily"]["noise_daily_percentage"],
+        "noise_percentage_hourly": aggregates["hourly"]["noise_hourly_percentage"],
+        "db_min_max_peak_by_hourly": hourly,
+    }
 
-    ax.set_title("Radar des sources de bruit (en %)")
 
-    img_radar = fig_to_img(fig)
-    elements.append(Image(img_radar, width=300, height=300))
-    elements.append(Spacer(1, 12))
+def load_live_data():
+    from sonalyse_advisor.live_ingest import SNAPSHOT_FILENAME
 
-    legend_text = "<br/>".join(
-        [f"<b>{k.title()}</b> : {v:.1f}% du temps" for k, v in data["noise_percentage"].items()]
-    )
-    elements.append(Paragraph(f"<b>Légende des sources de bruit :</b><br/>{legend_text}", styles["Normal"]))
-    elements.append(Spacer(1, 20))
+    snapshot_path = os.path.join(LIVE_DIR, SNAPSHOT_FILENAME)
+    try:
+        mtime = os.path.getmtime(snapshot_path)
+    except OSError:
+        mtime = None
+    data = None if mtime is None else load_live_snapshot(snapshot_path, mtime)
+    if data is None:
+        st.warning(f"📡 Aucun agrégat live dans {LIVE_DIR} : lancez `python -m sonalyse_advisor.live_ingest`.")
+    return data
+
+
+# ========================================
+# 📤 IMPORT D'UNE CAPTURE
+# ========================================
+
+def import_capture(uploaded):
+    """Store an upload (parsed and aggregated while it is read) or find it by content hash.
+
+    Returns:
+        dict: Index entry of the capture, with "duplicate" set when it was already known.
+    """
+    from sonalyse_advisor.shared_store import capture_key
+    from sonalyse_advisor.uploads import ingest_upload
+
+    progress = st.sidebar.progress(0.0, text="📥 Lecture de la capture...")
+
+    def on_progress(bytes_read, segments):
+        progress.progress(min(1.0, bytes_read / max(1, uploaded.size)), text=f"📥 {segments} segments lus")
+
+    from sonalyse_advisor.validation import clean_capture
+
+    entry, records, duplicate = ingest_upload(uploaded, uploaded.name, room_type=room_type, on_progress=on_progress)
+    progress.empty()
+    if records is not None:
+        # Les segments déjà parsés alimentent directement le pipeline et le store partagé
+        upload_pipeline = get_pipeline(entry["path"], room_type, room)
+        upload_pipeline.put("segments", clean_capture(records, quarantine_path_for(entry["path"])))
+        key = ("dashboard", room_type, room) + capture_key(entry["path"])
+        get_shared_store().get(key, lambda: build_dashboard_data(upload_pipeline))
+    return dict(entry, duplicate=duplicate)
+
+
+# Logement et pièce mesurée : le type de la pièce fixe les seuils de la note
+@st.cache_data
+def load_accommodation(path):
+    return load_json(path)[0]
+
+
+logement_info = load_accommodation(ACCOMMODATION_PATH)
+piece_labels = [f"{p['nom_de_la_piece']} ({p['type']})" for p in logement_info["pieces"]]
+piece_info = logement_info["pieces"][piece_labels.index(st.sidebar.selectbox("🏠 Pièce mesurée", piece_labels))]
+room_type = piece_info["type"]
+room = piece_info["nom_de_la_piece"]
+
+capture_path = CAPTURE_PATH
+uploaded = st.sidebar.file_uploader("📤 Importer une capture", type=["json", "gz", "xz", "zst"])
+if uploaded is not None:
+    # Le fichier reste dans le widget à chaque rerun : une seule importation par fichier
+    imported = st.session_state.setdefault("imported_captures", {})
+    if uploaded.file_id not in imported:
+        try:
+            imported[uploaded.file_id] = import_capture(uploaded)
+        except Exception as e:
+            st.sidebar.error(f"❌ Capture illisible : {e}")
+    entry = imported.get(uploaded.file_id)
+    if entry:
+        capture_path = entry["path"]
+        if entry["duplicate"]:
+            st.sidebar.info(f"♻️ Capture déjà importée ({entry['filename']}), résultats réutilisés")
+        else:
+            st.sidebar.success(f"✅ {entry['segments']} segments importés, note {entry['grade']}")
+
+# Charger données
+live_mode = st.sidebar.toggle("📡 Mode live", value=False)
+# En profilage, la capture est recalculée sans cache pour mesurer le chemin à froid
+pipeline = get_pipeline(capture_path, room_type, room, cache=not profile_run)
+if live_mode:
+    data = load_live_data()
+else:
+    data = (build_dashboard_data(pipeline) if profile_run
+            else load_data(pipeline, capture_path, room_type, room))
 
-    # =====================
-    # 🔥 GRAPHE : Heatmap
-    # =====================
-    heatmap = data["noise_percentage_hourly"]
+# ========================================
+# TAB 2 — FCT PDF GENERATION
+# ========================================
 
-    fig, ax = plt.subplots(figsize=(8, 3))
+@st.cache_data(show_spinner="🤖 Analyse IA en cours...")
+def get_ia_report(capture_path, room_type, room):
+    """Run the LLM diagnostic once and share it between the PDF and tab 3.
 
-    # Construire la matrice
-    matrix = [v["percentage"] for v in heatmap.values()]
+    The "report" artifact of the pipeline; concurrent identical requests
+    (threads or processes) share one computation, keyed by its fingerprint.
 
-    # Heatmap
-    cax = ax.imshow([matrix], aspect="auto", cmap="viridis")
+    Returns:
+        dict: "code" (Streamlit code of the whole report) and "sections"
+        (code of each section when generated in sectioned mode, else empty).
+    """
+    from sonalyse_advisor.single_flight import get_single_flight
 
-    ax.set_title("Heatmap des bruits (simplifiée)")
+    ia_pipeline = get_pipeline(capture_path, room_type, room, use_llm=True)
+    return get_single_flight().do(ia_pipeline.fingerprint("report"), lambda: ia_pipeline.get("report"))
 
-    # Ajouter une vraie barre de couleur (légende)
-    cbar = fig.colorbar(cax)
-    cbar.set_label("Intensité du bruit (%)", fontsize=8)
 
-    img_heatmap = fig_to_img(fig)
-    elements.append(Image(img_heatmap, width=450, height=150))
-    elements.append(Spacer(1, 12))
+@st.cache_data
+def get_rule_report(_pipeline, capture_path, room_type, room):
+    """Deterministic local report, same shape as ``get_ia_report``.
 
-    # Explication pour l'utilisateur final
-    legend_text = """
-    <b>Légende des couleurs :</b><br/>
-    • <b>Bleu</b> : très faible pourcentage de bruit.<br/>
-    • <b>Vert</b> : bruit modéré.<br/>
-    • <b>Jaune</b> : bruit notable / zones actives.<br/>
-    • <b>Blanc</b> : pics importants de bruit.<br/><br/>
-    <b>Utilité :</b> La heatmap permet de voir rapidement quelles heures présentent les taux 
-    de bruit les plus élevés. Plus la couleur est claire, plus l'environnement sonore a été perturbé.
+    Built from the aggregates of the dashboard (``_pipeline`` of this run,
+    not hashed); the other arguments identify it in the cache.
     """
+    return _pipeline.get("report")
 
-    elements.append(Paragraph(legend_text, styles["Normal"]))
-    elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph("<b>Recommandations :</b>", styles["Heading2"]))
-    elements.append(Spacer(1, 8))
-    elements.append(Paragraph(recommendations_text, styles["Normal"]))
-    elements.append(Spacer(1, 20))
 
+def generate_pdf_with_graphs(data):
+    from sonalyse_advisor.pdf_report import build_pdf, chart_images, extract_recommendations
 
-    # BUILD PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    # Le rapport IA n'est utilisé que s'il a déjà été demandé : le PDF
+    # n'attend jamais le LLM et retombe sur le diagnostic local.
+    if data.get("live_source"):
+        try:
+            report = (get_ia_report(capture_path, room_type, room) if st.session_state.get("ia_requested")
+                      else get_rule_report(pipeline, capture_path, room_type, room))
+            recommendations_text = extract_recommendations(report)
+        except Exception:
+            recommendations_text = "Aucune recommandation disponible."
+        return io.BytesIO(build_pdf(data, chart_images(data), recommendations_text))
+
+    # Capture : artefact "pdf" du pipeline, avec le rapport déjà affiché
+    pdf_pipeline = pipeline
+    if st.session_state.get("ia_requested"):
+        pdf_pipeline = get_pipeline(capture_path, room_type, room, use_llm=True)
+        pdf_pipeline.put("report", get_ia_report(capture_path, room_type, room))
+    return io.BytesIO(pdf_pipeline.get("pdf"))
 # ========================================
 
 if data:
     stats = data["stats"]
     grade = data["grade"]
-    st.success(f"✅ {len(data['ratings'])} mesures chargées depuis données réelles")
+    if data.get("live_source"):
+        st.success(f"📡 {data['measurements']} mesures live ({data['live_source']})")
+    else:
+        st.success(f"✅ {data['measurements']} mesures chargées depuis données réelles")
+    if data.get("rejected"):
+        st.warning(
+            f"⚠️ {data['rejected']} segments invalides écartés "
+            f"(rapport de quarantaine : {quarantine_path_for(capture_path)})"
+        )
+    coverage = data.get("coverage")
+    if coverage and coverage["gap_count"]:
+        st.warning(
+            f"📉 Couverture {coverage['coverage_percentage']:.1f} % : {coverage['gap_count']} coupure(s) du capteur, "
+            f"{coverage['gap_minutes']:.0f} min sans mesure. Les heures peu couvertes sont signalées sur la courbe."
+        )
 else:
     stats = {
         "avg_db": 42.5,
@@ -263,8 +329,8 @@ else:
     }
     grade = "C"
 
-logement = {"nom": "Logement Exemple", "adresse": "15 Rue de la République"}
-piece = {"nom": "Chambre"}
+logement = {"nom": logement_info["nom_du_logement"], "adresse": logement_info["adresse"]}
+piece = {"nom": piece_info["nom_de_la_piece"]}
 
 # ========================================
 # 🎨 HEADER
@@ -279,8 +345,9 @@ with col_info1:
 pdf_file = None
 
 with col_info2:
-    if st.button("📄 Générer PDF"):
-        pdf_file = generate_pdf_with_graphs(data)
+    if st.button("📄 Générer PDF") or (profile_run and data):
+        with stage("pdf"):
+            pdf_file = generate_pdf_with_graphs(data)
         st.success("✅ PDF généré ! Vous pouvez maintenant le télécharger.")
 
     st.download_button(
@@ -329,18 +396,74 @@ with tab1:
             """,
             unsafe_allow_html=True,
         )
+        if data and "period_grades" in data:
+            st.caption(
+                f"☀️ Jour : note {data['period_grades']['day']} · "
+                f"🌙 Nuit : note {data['period_grades']['night']} (la note globale retient la moins bonne)"
+            )
+
+    if data and "grade_distribution" in data:
+        with st.expander("📊 Répartition des notes (% des mesures)"):
+            st.table(data["grade_distribution"]["period"])
+            st.table(data["grade_distribution"]["hourly"])
 
     st.divider()
 
     # Métriques
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("☀️ Niveau Jour", f"{stats['avg_db_day']:.1f} dB")
-    col2.metric("🌙 Niveau Nuit", f"{stats['avg_db_night']:.1f} dB")
+    col1.metric("☀️ Niveau Jour", f"{stats['avg_db_day']:.1f} dB" if stats["avg_db_day"] is not None else "N/A")
+    col2.metric("🌙 Niveau Nuit", f"{stats['avg_db_night']:.1f} dB" if stats["avg_db_night"] is not None else "N/A")
     col3.metric("📈 Maximum", f"{stats['max_db']:.1f} dB")
     col4.metric("📉 Minimum", f"{stats['min_db']:.1f} dB")
 
     st.divider()
 
+    # Nuits anormalement bruyantes par rapport à l'historique de la pièce
+    if data and "loud_nights" in data:
+        loud_nights = data["loud_nights"]
+        st.subheader("🌙 Nuits inhabituelles")
+        if not loud_nights["enough_history"]:
+            st.caption(
+                f"Historique de {loud_nights['history_days']} jour(s) : "
+                "au moins une semaine est nécessaire pour repérer les nuits inhabituelles. "
+                f"Ajoutez les captures de la pièce à l'historique : "
+                f"`python -m sonalyse_advisor.timeseries_store append --room \"{room}\" <capture>`."
+            )
+        elif not loud_nights["abnormal_nights"]:
+            st.caption("✅ Aucune nuit anormalement bruyante par rapport à l'historique de la pièce.")
+        else:
+            for night in loud_nights["abnormal_nights"]:
+                st.warning(
+                    f"Nuit du {night['date']} ({night['day_type']}) : {night['night_leq_dB']:.1f} dB, "
+                    f"soit +{night['excess_dB']:.1f} dB par rapport à une nuit habituelle "
+                    f"({night['baseline_night_leq_dB']:.1f} dB)."
+                )
+
+        st.divider()
+
+    # Indicateurs calculés localement et comparés aux valeurs guides de l'OMS
+    if data and "compliance" in data:
+        st.subheader("📏 Conformité OMS")
+        indicators = data["compliance"]["indicators"]
+        cols = st.columns(len(indicators))
+        for col, (indicator, value) in zip(cols, indicators.items()):
+            col.metric(indicator, "N/A" if value is None else f"{value:.1f} dB")
+        st.table([
+            {
+                "Source": check["environment"],
+                "Indicateur": check["indicator"],
+                "Seuil (dB)": check["limit_dB"],
+                "Mesuré (dB)": check["value_dB"],
+                "Conforme": {True: "✅", False: "❌", None: "—"}[check["compliant"]],
+                "Dépassement (min)": check["exceedance_minutes"],
+                "Jours en dépassement": f"{check['days_exceeding']}/{check['days_evaluated']}",
+            }
+            for check in data["compliance"]["checks"]
+        ])
+        st.caption("Valeurs guides OMS 2018 pour l'exposition extérieure : la comparaison avec une mesure intérieure est indicative.")
+
+        st.divider()
+
     # Répartition des bruits
     if data and "noise_percentage" in data:
         st.subheader("🔊 Répartition des sources de bruit")
@@ -374,488 +497,70 @@ with tab1:
 with tab2:
     st.header("📈 Visualisations Interactives D3.js")
     
-    if data:
-        # Préparer données dB par heure
-        db_min_max_peak_by_hourly = data.get("db_min_max_peak_by_hourly", {})
-
-        timeline_data = []
-        for hour in sorted(db_min_max_peak_by_hourly.keys()):
-            values = db_min_max_peak_by_hourly[hour]
-            timeline_data.append(
-                {
-                    "hour": hour,
-                    "value": values["average_dB"],
-                    "min": values["min_dB"],
-                    "max": values["max_dB"],
-                    "peak": values["peak_dB"],
-                }
-            )
-
-        pie_data = [
-            {'category': k, 'value': v}
-            for k, v in data['noise_percentage'].items()
-        ]
+    with stage("d3_payload"):
+        if data:
+            # Préparer données dB par heure
+            db_min_max_peak_by_hourly = data.get("db_min_max_peak_by_hourly", {})
+
+            timeline_data = []
+            for hour in sorted(db_min_max_peak_by_hourly.keys()):
+                values = db_min_max_peak_by_hourly[hour]
+                timeline_data.append(
+                    {
+                        "hour": hour,
+                        "value": values["average_dB"],
+                        "min": values["min_dB"],
+                        "max": values["max_dB"],
+                        "peak": values["peak_dB"],
+                        "coverage": values.get("coverage", 100.0),
+                    }
+                )
+
+            pie_data = [
+                {'category': k, 'value': v}
+                for k, v in data['noise_percentage'].items()
+            ]
         
-        # Préparation des données pour la heatmap (CORRIGÉ)
-        heatmap_rows = []
+            # Préparation des données pour la heatmap (CORRIGÉ)
+            heatmap_rows = []
         
-        # DEBUG  pour voir la structure de noise_by_hour
-        # st.write("🔍 Debug - Structure de noise_by_hour:")
+            # DEBUG  pour voir la structure de noise_types_by_hour
+            # st.write("🔍 Debug - Structure de noise_types_by_hour:")
       
         
-        if isinstance(data["noise_by_hour"], dict):
-            #st.write(f"Nombre d'heures: {len(data['noise_by_hour'])}")
+            if isinstance(data["noise_types_by_hour"], dict):
+                #st.write(f"Nombre d'heures: {len(data['noise_types_by_hour'])}")
             
-            # Afficher les premières heures
-            for hour_str, hour_data in list(data["noise_by_hour"].items())[:10]:
+                # Afficher les premières heures
+                for hour_str, hour_data in list(data["noise_types_by_hour"].items())[:10]:
                 
-                # Traitement pour la heatmap
-                hour = int(hour_str) if hour_str.isdigit() else 0
+                    # Traitement pour la heatmap
+                    hour = int(hour_str) if hour_str.isdigit() else 0
                 
-                if isinstance(hour_data, list):
-                    for item in hour_data:
-                        if isinstance(item, str):
+                    if isinstance(hour_data, list):
+                        # Une cellule par (heure, type) : les types sont déjà distincts
+                        for item in hour_data:
+                            if isinstance(item, str):
                             
-                            intensity = 29  # Valeur par défaut
+                                intensity = 29  # Valeur par défaut
                             
-                            hour_str_padded = str(hour).zfill(2)
-                            if hour_str_padded in data.get("noise_percentage_hourly", {}):
-                                noise_info = data["noise_percentage_hourly"][hour_str_padded]
-                                if noise_info.get("noise_type") == item:
-                                    intensity = noise_info.get("percentage", 50) * 0.8  # Convertir % en intensité
+                                hour_str_padded = str(hour).zfill(2)
+                                if hour_str_padded in data.get("noise_percentage_hourly", {}):
+                                    noise_info = data["noise_percentage_hourly"][hour_str_padded]
+                                    if noise_info.get("noise_type") == item:
+                                        intensity = noise_info.get("percentage", 50) * 0.8  # Convertir % en intensité
                             
-                            heatmap_rows.append({
-                                "hour": hour,
-                                "category": item,
-                                "value": intensity
-                            })
-        
-        heatmap_json = json.dumps(heatmap_rows)
+                                heatmap_rows.append({
+                                    "hour": hour,
+                                    "category": item,
+                                    "value": intensity
+                                })
         
-        # Convertir en JSON pour JavaScript
-        timeline_json = json.dumps(timeline_data)
-        pie_json = json.dumps(pie_data)
+        else:
+            timeline_data, pie_data, heatmap_rows = [], [], []
 
-    else:
-        timeline_json = "[]"
-        pie_json = "[]"
-        heatmap_json = "[]"
-
-    # HTML avec D3.js - AVEC HEATMAP
-    d3_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <script src="https://cdnjs.cloudflare.com/ajax/libs/d3/7.8.5/d3.min.js"></script>
-        <style>
-            body {{
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-                margin: 0;
-                padding: 20px;
-                background: #f8f9fa;
-            }}
-            .chart-container {{
-                background: white;
-                border-radius: 12px;
-                padding: 20px;
-                margin-bottom: 20px;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            }}
-            .chart-title {{
-                font-size: 1.3em;
-                font-weight: 600;
-                margin-bottom: 15px;
-                color: #333;
-            }}
-            .tooltip {{
-                position: absolute;
-                background: rgba(0, 0, 0, 0.9);
-                color: white;
-                padding: 10px;
-                border-radius: 6px;
-                pointer-events: none;
-                font-size: 13px;
-                opacity: 0;
-                transition: opacity 0.3s;
-            }}
-            svg {{
-                display: block;
-                margin: 0 auto;
-            }}
-            .heatmap-cell {{
-                cursor: pointer;
-            }}
-            .heatmap-cell:hover {{
-                stroke: #333;
-                stroke-width: 2px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="chart-container">
-            <div class="chart-title">📈 Évolution du Niveau Sonore (24h)</div>
-            <div id="timeline"></div>
-        </div>
-
-        <div class="chart-container">
-            <div class="chart-title">🎵 Radar des Sources de Bruit</div>
-            <div id="radar"></div>
-        </div>
-
-        <div class="chart-container">
-            <div class="chart-title">🔥 Heatmap des Bruits (Heure × Type)</div>
-            <div id="heatmap"></div>
-        </div>
-
-        <div class="tooltip" id="tooltip"></div>
-
-        <script>
-            // Données depuis Python
-            const timelineData = {timeline_json};
-            const pieData = {pie_json};
-            const heatmapData = {heatmap_json};
-
-            // Timeline Chart
-            function drawTimeline() {{
-                if (timelineData.length === 0) return;
-                
-                const margin = {{top: 40, right: 40, bottom: 60, left: 60}};
-                const width = 1000 - margin.left - margin.right;
-                const height = 350 - margin.top - margin.bottom;
-                
-                const svg = d3.select("#timeline")
-                    .append("svg")
-                    .attr("width", width + margin.left + margin.right)
-                    .attr("height", height + margin.top + margin.bottom)
-                    .append("g")
-                    .attr("transform", `translate(${{margin.left}},${{margin.top}})`);
-                
-                const x = d3.scaleLinear()
-                    .domain([0, 23])
-                    .range([0, width]);
-                
-                const y = d3.scaleLinear()
-                    .domain([0, Math.max(80, d3.max(timelineData, d => d.max))])
-                    .range([height, 0]);
-                
-                // Grid
-                svg.append("g")
-                    .attr("class", "grid")
-                    .style("stroke", "#e0e0e0")
-                    .style("stroke-dasharray", "2,2")
-                    .call(d3.axisLeft(y).tickSize(-width).tickFormat(""));
-                
-                // Area
-                if (timelineData.length > 0) {{
-                    const area = d3.area()
-                        .x(d => x(d.hour))
-                        .y0(d => y(d.min))
-                        .y1(d => y(d.max))
-                        .curve(d3.curveMonotoneX);
-                    
-                    svg.append("path")
-                        .datum(timelineData)
-                        .attr("fill", "rgba(102, 126, 234, 0.2)")
-                        .attr("d", area);
-                    
-                    // Line
-                    const line = d3.line()
-                        .x(d => x(d.hour))
-                        .y(d => y(d.value))
-                        .curve(d3.curveMonotoneX);
-                    
-                    svg.append("path")
-                        .datum(timelineData)
-                        .attr("fill", "none")
-                        .attr("stroke", "#667eea")
-                        .attr("stroke-width", 3)
-                        .attr("d", line);
-                }}
-                
-                // Threshold lines
-                svg.append("line")
-                    .attr("x1", 0).attr("x2", width)
-                    .attr("y1", y(30)).attr("y2", y(30))
-                    .attr("stroke", "#00AA00")
-                    .attr("stroke-width", 2)
-                    .attr("stroke-dasharray", "5,5");
-                
-                svg.append("text")
-                    .attr("x", width - 5).attr("y", y(30) - 5)
-                    .attr("text-anchor", "end")
-                    .style("fill", "#00AA00")
-                    .style("font-size", "12px")
-                    .text("Recommandé nuit (30 dB)");
-                
-                svg.append("line")
-                    .attr("x1", 0).attr("x2", width)
-                    .attr("y1", y(45)).attr("y2", y(45))
-                    .attr("stroke", "#FFAA00")
-                    .attr("stroke-width", 2)
-                    .attr("stroke-dasharray", "5,5");
-                
-                svg.append("text")
-                    .attr("x", width - 5).attr("y", y(45) - 5)
-                    .attr("text-anchor", "end")
-                    .style("fill", "#FFAA00")
-                    .style("font-size", "12px")
-                    .text("Recommandé jour (45 dB)");
-                
-                // Axes
-                svg.append("g")
-                    .attr("transform", `translate(0,${{height}})`);
-                
-                svg.append("g")
-                    .call(d3.axisLeft(y));
-                
-                svg.append("text")
-                    .attr("x", width / 2).attr("y", height + 45)
-                    .style("text-anchor", "middle")
-                    .style("font-weight", "600")
-                    .text("Heure de la journée");
-                
-                svg.append("text")
-                    .attr("transform", "rotate(-90)")
-                    .attr("x", -height / 2).attr("y", -45)
-                    .style("text-anchor", "middle")
-                    .style("font-weight", "600")
-                    .text("Niveau sonore (dB)");
-            }}
-
-            // Radar Chart
-            function drawRadar() {{
-                if (!pieData || pieData.length === 0) return;
-                
-                const margin = 60;
-                const width = 500;
-                const height = 400;
-                const centerX = width / 2;
-                const centerY = height / 2;
-                const radius = Math.min(width, height) / 2 - margin;
-                
-                const svg = d3.select("#radar")
-                    .append("svg")
-                    .attr("width", width)
-                    .attr("height", height)
-                    .append("g")
-                    .attr("transform", `translate(${{centerX}},${{centerY}})`);
-                
-                const angleSlice = Math.PI * 2 / pieData.length;
-                
-                // Grid circles
-                const levels = 5;
-                for (let i = 1; i <= levels; i++) {{
-                    svg.append("circle")
-                        .attr("r", radius / levels * i)
-                        .style("fill", "none")
-                        .style("stroke", "#ddd");
-                }}
-                
-                // Axes
-                pieData.forEach((d, i) => {{
-                    const angle = angleSlice * i - Math.PI / 2;
-                    const x = Math.cos(angle) * radius;
-                    const y = Math.sin(angle) * radius;
-                    
-                    svg.append("line")
-                        .attr("x1", 0).attr("y1", 0)
-                        .attr("x2", x).attr("y2", y)
-                        .style("stroke", "#ddd");
-                    
-                    const labelX = Math.cos(angle) * (radius + 40);
-                    const labelY = Math.sin(angle) * (radius + 40);
-                    
-                    svg.append("text")
-                        .attr("x", labelX).attr("y", labelY)
-                        .attr("text-anchor", "middle")
-                        .attr("dominant-baseline", "middle")
-                        .style("font-size", "13px")
-                        .style("font-weight", "600")
-                        .text(d.category);
-                }});
-                
-                // Data polygon
-                const radarLine = d3.lineRadial()
-                    .angle((d, i) => angleSlice * i)
-                    .radius(d => (d.value / 100) * radius)
-                    .curve(d3.curveLinearClosed);
-                
-                svg.append("path")
-                    .datum(pieData)
-                    .attr("d", radarLine)
-                    .style("fill", "rgba(102, 126, 234, 0.3)")
-                    .style("stroke", "#667eea")
-                    .style("stroke-width", "3px");
-                
-                // Points
-                const tooltip = d3.select("#tooltip");
-                pieData.forEach((d, i) => {{
-                    const angle = angleSlice * i - Math.PI / 2;
-                    const r = (d.value / 100) * radius;
-                    const x = Math.cos(angle) * r;
-                    const y = Math.sin(angle) * r;
-                    
-                    svg.append("circle")
-                        .attr("cx", x).attr("cy", y).attr("r", 6)
-                        .style("fill", "#667eea")
-                        .style("cursor", "pointer")
-                        .on("mouseover", function(event) {{
-                            tooltip
-                                .style("opacity", 1)
-                                .html(`<strong>${{d.category}}</strong><br/>Pourcentage: ${{d.value.toFixed(1)}}%`)
-                                .style("left", (event.pageX + 10) + "px")
-                                .style("top", (event.pageY - 30) + "px");
-                        }})
-                        .on("mouseout", () => tooltip.style("opacity", 0));
-                }});
-            }}
-
-            // Heatmap
-            function drawHeatmap() {{
-                if (heatmapData.length === 0) {{
-                    d3.select("#heatmap")
-                        .append("p")
-                        .text("Données insuffisantes pour afficher la heatmap");
-                    return;
-                }}
-                
-                const margin = {{top: 40, right: 80, bottom: 40, left: 80}};
-                const width = 800 - margin.left - margin.right;
-                const height = 400 - margin.top - margin.bottom;
-                
-                const svg = d3.select("#heatmap")
-                    .append("svg")
-                    .attr("width", width + margin.left + margin.right)
-                    .attr("height", height + margin.top + margin.bottom)
-                    .append("g")
-                    .attr("transform", `translate(${{margin.left}},${{margin.top}})`);
-                
-                // Extraire les catégories uniques et les heures
-                const categories = [...new Set(heatmapData.map(d => d.category))];
-                const hours = [...new Set(heatmapData.map(d => d.hour))].sort((a, b) => a - b);
-                
-                if (categories.length === 0 || hours.length === 0) return;
-                
-                // Échelles
-                const x = d3.scaleBand()
-                    .domain(hours)
-                    .range([0, width])
-                    .padding(0.05);
-                
-                const y = d3.scaleBand()
-                    .domain(categories)
-                    .range([0, height])
-                    .padding(0.05);
-                
-                // Échelle de couleur
-                const maxValue = d3.max(heatmapData, d => d.value);
-                const colorScale = d3.scaleSequential()
-                    .domain([0, maxValue])
-                    .interpolator(d3.interpolateYlOrRd);
-                
-                // Créer les cellules
-                svg.selectAll()
-                    .data(heatmapData)
-                    .enter()
-                    .append("rect")
-                    .attr("class", "heatmap-cell")
-                    .attr("x", d => x(d.hour))
-                    .attr("y", d => y(d.category))
-                    .attr("width", x.bandwidth())
-                    .attr("height", y.bandwidth())
-                    .attr("fill", d => colorScale(d.value))
-                    .attr("stroke", "#fff")
-                    .attr("stroke-width", 1)
-                    .on("mouseover", function(event, d) {{
-                        tooltip
-                            .style("opacity", 1)
-                            .html(`Heure: ${{d.hour}}h<br/>
-                                   Type: ${{d.category}}<br/>
-                                   Intensité: ${{d.value.toFixed(1)}}`)
-                            .style("left", (event.pageX + 10) + "px")
-                            .style("top", (event.pageY - 30) + "px");
-                    }})
-                    .on("mouseout", () => tooltip.style("opacity", 0));
-                
-                // Axes
-                svg.append("g")
-                    .attr("transform", `translate(0,${{height}})`)
-                    .call(d3.axisBottom(x).tickFormat(d => d + "h"));
-                
-                svg.append("g")
-                    .call(d3.axisLeft(y));
-                
-                // Labels
-                svg.append("text")
-                    .attr("x", width / 2)
-                    .attr("y", height + 35)
-                    .style("text-anchor", "middle")
-                    .text("Heure de la journée");
-                
-                svg.append("text")
-                    .attr("transform", "rotate(-90)")
-                    .attr("x", -height / 2)
-                    .attr("y", -50)
-                    .style("text-anchor", "middle")
-                    .text("Type de bruit");
-                
-                // Légende
-                const legendWidth = 200;
-                const legendHeight = 20;
-                
-                const legend = svg.append("g")
-                    .attr("transform", `translate(${{width - legendWidth - 10}}, -30)`);
-                
-                const defs = legend.append("defs");
-                const linearGradient = defs.append("linearGradient")
-                    .attr("id", "linear-gradient");
-                
-                linearGradient.selectAll("stop")
-                    .data(colorScale.range().map((color, i, arr) => ({{
-                        offset: `${{100 * i / (arr.length - 1)}}%`,
-                        color: color
-                    }})))
-                    .enter()
-                    .append("stop")
-                    .attr("offset", d => d.offset)
-                    .attr("stop-color", d => d.color);
-                
-                legend.append("rect")
-                    .attr("width", legendWidth)
-                    .attr("height", legendHeight)
-                    .style("fill", "url(#linear-gradient)");
-                
-                legend.append("text")
-                    .attr("x", 0)
-                    .attr("y", -5)
-                    .style("font-size", "12px")
-                    .text("Intensité du bruit");
-                
-                legend.append("text")
-                    .attr("x", 0)
-                    .attr("y", legendHeight + 15)
-                    .style("font-size", "10px")
-                    .text("Faible");
-                
-                legend.append("text")
-                    .attr("x", legendWidth)
-                    .attr("y", legendHeight + 15)
-                    .style("font-size", "10px")
-                    .style("text-anchor", "end")
-                    .text("Forte");
-            }}
-
-            // Initialiser toutes les visualisations
-            drawTimeline();
-            drawRadar();
-            drawHeatmap();
-        </script>
-    </body>
-    </html>
-    """
-
-    # Afficher D3.js
-    components.html(d3_html, height=1300, scrolling=True)
+        # Composant D3 : gabarit statique servi une fois, seules les données modifiées sont envoyées
+        render_d3_charts({"timeline": timeline_data, "radar": pie_data, "heatmap": heatmap_rows})
 
 # ========================================
 # TAB 3 — ANALYSE IA
@@ -864,17 +569,63 @@ with tab2:
 with tab3:
     st.header("🤖 Analyse IA")
 
-    try :
-        stream_response = interpret_json("sonalyse_advisor/dps_analysis_pi3_exemple.json", "sonalyse_advisor/context.txt","data/logement1.json")
+    from sonalyse_advisor.agent_backend import llm_available
+
+    if llm_available() and (st.button("🚀 Enrichir avec l'analyse IA") or profile_run):
+        st.session_state["ia_requested"] = True
+
+    ia_report = None
+    if st.session_state.get("ia_requested"):
+        try :
+            with stage("interpret_json"):
+                ia_report = get_ia_report(capture_path, room_type, room)
+        except Exception as e:
+            st.error(f"Une erreur s'est produite lors de l'analyse IA : {e}")
 
+    if ia_report is None:
+        # Diagnostic local instantané, sans appel au LLM
+        st.caption("⚡ Diagnostic local par règles. L'analyse IA reste disponible en complément.")
         try:
-            exec(stream_response)
+            ia_report = get_rule_report(pipeline, capture_path, room_type, room)
+        except Exception as e:
+            st.error(f"Une erreur s'est produite lors du diagnostic local : {e}")
+
+    if ia_report is not None:
+        try:
+            exec(ia_report["code"])
         except Exception as e:
             st.error(f"Une erreur s'est produite lors de l'exécution du code : {e}")
-    except Exception as e:
-        st.error(f"Une erreur s'est produite lors de l'analyse IA : {e}")
+
+    # Latence et coût de chaque route (modèle rapide / grand modèle / règles locales)
+    if st.session_state.get("ia_requested"):
+        from sonalyse_advisor.model_router import get_router
+
+        route_stats = get_router().stats()
+        if route_stats:
+            with st.expander("⏱️ Routage des modèles"):
+                st.table([
+                    {
+                        "Tâche": route,
+                        "Modèles": ", ".join(f"{model} ×{count}" for model, count in stats["models"].items()),
+                        "Replis": stats["fallbacks"],
+                        "Latence p50 (s)": stats["latency_p50_s"],
+                        "Latence p95 (s)": stats["latency_p95_s"],
+                        "Tokens": stats["prompt_tokens"] + stats["completion_tokens"],
+                        "Coût ($)": f"{stats['cost_usd']:.5f}",
+                    }
+                    for route, stats in route_stats.items()
+                ])
 
 
 # FOOTER
 st.divider()
 st.caption("🚀 Sonalyze Advisor v1.0 - Hackathon IA Boot2Code")
+
+if profile_run:
+    profile_paths = profile_run.finish()
+    st.sidebar.info(f"⏱️ Profil écrit : {profile_paths['speedscope']} (allocations : {profile_paths['stages']})")
+
+# Rafraîchissement du tableau de bord à partir des agrégats live
+if live_mode:
+    time.sleep(LIVE_REFRESH_SECONDS)
+    st.rerun()
@@ -0,0 +1,72 @@
+"""
+Simulateur de capteurs pour l'ingestion live.
+
+Ouvre N connexions vers ``sonalyse_advisor.live_ingest`` et envoie un segment
+par seconde et par capteur, puis affiche le débit effectivement envoyé.
+
+Usage:
+    python -m sonalyse_advisor.live_ingest --dir /tmp/live &
+    python benchmarks/ingest_bench.py --sensors 500 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+
+LABELS = ["Vehicle", "Speech", "Music", "Walk, footstep", "Bird", "Dog", "Silence"]
+
+
+def fake_segment(sensor_id: int) -> dict:
+    level = random.uniform(25, 75)
+    return {
+        "sensor_id": sensor_id,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "LAeq_segment_dB": round(level, 1),
+        "L50_dB": round(level - 2, 1),
+        "Lmin_dB": round(level - 10, 1),
+        "Lmax_dB": round(level + 8, 1),
+        "LPeak_dB": round(level + 15, 1),
+        "L90_dB": round(level - 6, 1),
+        "LAeq_rating": "ABCDEFG"[min(6, int((level - 25) / 7))],
+        "top_5_labels": random.sample(LABELS, 5),
+    }
+
+
+async def sensor(sensor_id: int, host: str, port: int, duration: float, sent: list):
+    _, writer = await asyncio.open_connection(host, port)
+    await asyncio.sleep(random.random())
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        writer.write((json.dumps(fake_segment(sensor_id)) + "\n").encode())
+        await writer.drain()
+        sent[0] += 1
+        await asyncio.sleep(1.0)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(args):
+    sent = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        sensor(i, args.host, args.port, args.duration, sent) for i in range(args.sensors)
+    ))
+    elapsed = time.perf_counter() - start
+    print(f"📡 {args.sensors} capteurs, {sent[0]} segments en {elapsed:.1f} s "
+          f"({sent[0] / elapsed:.0f} segments/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sensors", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=10.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
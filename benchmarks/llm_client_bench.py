@@ -0,0 +1,87 @@
+"""
+Latence de queue du client LLM, avec et sans hedging, contre le serveur simulé.
+
+Le serveur local répond en ``--latency`` secondes, sauf une fraction
+``--tail-ratio`` des requêtes qui prend ``--tail-latency`` secondes, et
+renvoie des 429 pour ``--rate-limit-ratio`` des requêtes.
+
+Usage:
+    python benchmarks/llm_client_bench.py --requests 200 --concurrency 16
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sonalyse_advisor.llm_client import LLMClientManager, MIN_HEDGE_SAMPLES  # noqa: E402
+from sonalyse_advisor.llm_stub import StubSettings, start_stub_server  # noqa: E402
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+def run(manager: LLMClientManager, requests: int, concurrency: int) -> dict:
+    messages = [{"role": "user", "content": "ping"}]
+
+    # Échauffement : remplit l'historique de latence utilisé pour le p95
+    for _ in range(MIN_HEDGE_SAMPLES):
+        manager.complete(messages, model="stub")
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            manager.complete(messages, model="stub")
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, error in results if error is None]
+    return {
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "failures": sum(error is not None for _, error in results),
+        "throughput": requests / elapsed,
+        **manager.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--tail-latency", type=float, default=2.0)
+    parser.add_argument("--tail-ratio", type=float, default=0.05)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    settings = StubSettings(latency=args.latency, jitter=args.latency / 5, tail_latency=args.tail_latency,
+                            tail_ratio=args.tail_ratio, rate_limit_ratio=args.rate_limit_ratio)
+    server, base_url = start_stub_server(settings=settings)
+    try:
+        for hedge in (False, True):
+            manager = LLMClientManager(api_key="stub", base_url=base_url, hedge=hedge)
+            report = run(manager, args.requests, args.concurrency)
+            print(f"hedging={'oui' if hedge else 'non'} : "
+                  f"p50 {report['p50'] * 1000:.0f} ms, p95 {report['p95'] * 1000:.0f} ms, "
+                  f"p99 {report['p99'] * 1000:.0f} ms, {report['throughput']:.1f} req/s, "
+                  f"échecs {report['failures']}, retries {report['retries']}, "
+                  f"hedges {report['hedges']} (gagnés {report['hedge_wins']})")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
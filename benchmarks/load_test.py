@@ -0,0 +1,215 @@
+"""
+Test de charge : N sessions simultanées contre un serveur ``streamlit run app.py``.
+
+Le harnais démarre le serveur simulé de l'API Groq (latence réglable) puis un
+vrai serveur Streamlit headless qui l'utilise, et ouvre N sessions websocket
+comme autant de navigateurs. Chaque session demande une exécution de la page
+et mesure le temps jusqu'à ``script_finished`` (page prête). Une fraction
+``--ia-ratio`` des sessions clique ensuite sur « Enrichir avec l'analyse IA ».
+La mémoire du serveur est relevée une fois toutes les sessions ouvertes.
+
+Usage:
+    python benchmarks/load_test.py --sessions 20 --llm-latency 1.5
+    python benchmarks/load_test.py --sessions 50 --ramp 10 --ia-ratio 0.2 --json load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sonalyse_advisor.llm_stub import StubSettings, start_stub_server  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IA_BUTTON_LABEL = "Enrichir avec l'analyse IA"
+STARTUP_TIMEOUT_SECONDS = 60
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))] if values else float("nan")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float:
+    """Resident memory (Mo) of a process, None when /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def start_app(port: int, base_url: str) -> subprocess.Popen:
+    """Start a headless Streamlit server whose LLM client targets the stub."""
+    env = dict(os.environ, GROQ_API_KEY="stub", GROQ_BASE_URL=base_url)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "app.py",
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Le serveur Streamlit n'a pas démarré")
+
+
+def rerun_message(widgets: list = ()) -> bytes:
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+
+    message = BackMsg()
+    message.rerun_script.query_string = ""
+    for widget_id in widgets:
+        state = message.rerun_script.widget_states.widgets.add()
+        state.id = widget_id
+        state.trigger_value = True
+    return message.SerializeToString()
+
+
+async def run_script(connection, widgets: list = ()) -> tuple:
+    """Request a script run and wait for its end.
+
+    Returns:
+        tuple : (duration in s, ids of the IA buttons seen, error or None).
+    """
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    start = time.perf_counter()
+    await connection.write_message(rerun_message(widgets), binary=True)
+    buttons, error = [], None
+    while True:
+        raw = await connection.read_message()
+        if raw is None:
+            return time.perf_counter() - start, buttons, "connexion fermée"
+        message = ForwardMsg()
+        message.ParseFromString(raw)
+        kind = message.WhichOneof("type")
+        if kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+            element = message.delta.new_element
+            if element.WhichOneof("type") == "button" and IA_BUTTON_LABEL in element.button.label:
+                buttons.append(element.button.id)
+            elif element.WhichOneof("type") == "exception" and error is None:
+                error = element.exception.message
+        elif kind == "script_finished":
+            return time.perf_counter() - start, buttons, error
+
+
+async def session(port: int, delay: float, with_ia: bool, all_open: asyncio.Event, opened: list, results: list):
+    from tornado.websocket import websocket_connect
+
+    await asyncio.sleep(delay)
+    connection = await websocket_connect(f"ws://127.0.0.1:{port}/_stcore/stream")
+    result = {"ia": None, "error": None}
+    try:
+        result["page"], buttons, result["error"] = await run_script(connection)
+        if with_ia and buttons:
+            result["ia"], _, error = await run_script(connection, buttons[:1])
+            result["error"] = result["error"] or error
+        results.append(result)
+        opened.append(1)
+        # Les sessions restent ouvertes jusqu'au relevé mémoire
+        await all_open.wait()
+    finally:
+        connection.close()
+
+
+async def drive(port: int, pid: int, sessions: int, ramp: float, ia_ratio: float) -> dict:
+    all_open, opened, results = asyncio.Event(), [], []
+    ia_sessions = round(sessions * ia_ratio)
+    start = time.perf_counter()
+    tasks = [
+        asyncio.ensure_future(session(port, ramp * i / max(1, sessions), i < ia_sessions, all_open, opened, results))
+        for i in range(sessions)
+    ]
+    while len(opened) < sessions and not any(task.done() and task.exception() for task in tasks):
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    memory = rss_mb(pid)
+    all_open.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {"results": results, "elapsed": elapsed, "rss_mb": memory}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions simultanées")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Durée (s) d'ouverture progressive des sessions")
+    parser.add_argument("--ia-ratio", type=float, default=0.0, help="Part des sessions qui demandent l'analyse IA")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Latence (s) du serveur LLM simulé")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--json", help="Écrire le rapport dans ce fichier")
+    args = parser.parse_args()
+
+    settings = StubSettings(latency=args.llm_latency, jitter=args.llm_jitter)
+    stub, base_url = start_stub_server(settings=settings)
+    port = free_port()
+    app = start_app(port, base_url)
+    try:
+        # Session témoin : caches chauds et mémoire de référence
+        warmup = asyncio.run(drive(port, app.pid, 1, 0.0, 0.0))
+        baseline_mb = rss_mb(app.pid)
+        run = asyncio.run(drive(port, app.pid, args.sessions, args.ramp, args.ia_ratio))
+    finally:
+        app.terminate()
+        app.wait()
+        stub.shutdown()
+
+    results = run["results"]
+    pages = [r["page"] for r in results]
+    ia = [r["ia"] for r in results if r["ia"] is not None]
+    report = {
+        "sessions": args.sessions,
+        "completed": len(results),
+        "errors": [r["error"] for r in results if r["error"]],
+        "cold_page_s": warmup["results"][0]["page"] if warmup["results"] else None,
+        "page_p50_s": percentile(pages, 0.50),
+        "page_p95_s": percentile(pages, 0.95),
+        "page_p99_s": percentile(pages, 0.99),
+        "ia_p50_s": percentile(ia, 0.50) if ia else None,
+        "ia_p99_s": percentile(ia, 0.99) if ia else None,
+        "throughput_sessions_per_s": len(results) / run["elapsed"] if run["elapsed"] else None,
+        "rss_baseline_mb": baseline_mb,
+        "rss_loaded_mb": run["rss_mb"],
+        "mb_per_session": (run["rss_mb"] - baseline_mb) / max(1, len(results))
+        if run["rss_mb"] is not None and baseline_mb is not None else None,
+        "llm_requests": settings.requests,
+    }
+
+    print(f"📊 {report['completed']}/{args.sessions} sessions, {len(report['errors'])} erreur(s)")
+    print(f"   page prête : p50 {report['page_p50_s']:.2f} s, p95 {report['page_p95_s']:.2f} s, "
+          f"p99 {report['page_p99_s']:.2f} s (à froid {report['cold_page_s']:.2f} s)")
+    if ia:
+        print(f"   analyse IA : p50 {report['ia_p50_s']:.2f} s, p99 {report['ia_p99_s']:.2f} s, "
+              f"{report['llm_requests']} requêtes LLM")
+    print(f"   débit : {report['throughput_sessions_per_s']:.2f} sessions/s")
+    if report["mb_per_session"] is not None:
+        print(f"   mémoire : {report['rss_baseline_mb']:.0f} Mo au repos, {report['rss_loaded_mb']:.0f} Mo chargé, "
+              f"{report['mb_per_session']:.1f} Mo par session")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
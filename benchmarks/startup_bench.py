@@ -0,0 +1,130 @@
+"""
+Benchmark de démarrage à froid (cold start) de Sonalyse Advisor.
+
+Lance chaque cible dans un interpréteur neuf avec ``python -X importtime``,
+agrège le rapport d'import et le compare au budget défini ci-dessous.
+
+Usage:
+    python benchmarks/startup_bench.py
+    python benchmarks/startup_bench.py --top 15 --history benchmarks/startup_history.jsonl
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget d'import (cumulé, en millisecondes) par cible, mesuré à froid (cache
+# du pipeline vide) avec une marge d'environ 20 % :
+# - json_utils : ~90-120 ms, dont ~90 ms pour numpy (colonnes et validation) ;
+# - agent_backend : ~90-125 ms, json_utils et python-dotenv ;
+# - app : ~1,2-1,5 s, dont ~0,8 s pour streamlit ; ~0,9 s quand le pipeline
+#   sert le tableau de bord et le rapport local depuis son cache.
+IMPORT_BUDGET_MS = {
+    "sonalyse_advisor.json_utils": 150,
+    "sonalyse_advisor.agent_backend": 175,
+    "app": 1800,
+}
+
+# Modules lourds qui ne doivent jamais être chargés au démarrage.
+FORBIDDEN_AT_STARTUP = ("matplotlib", "reportlab", "plotly", "groq")
+# Exceptions par cible : streamlit 1.29 importe plotly lui-même (streamlit.elements.plotly_chart).
+ALLOWED_AT_STARTUP = {"app": ("plotly",)}
+
+
+def run_importtime(target: str) -> tuple:
+    """Import ``target`` in a fresh interpreter with ``-X importtime``.
+
+    Args:
+        target : str : Module name to import.
+
+    Returns:
+        tuple : (wall time in ms, list of (module, self_us, cumulative_us)).
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    if proc.returncode != 0 and not rows:
+        raise RuntimeError(f"Import de {target} impossible :\n{proc.stderr[-2000:]}")
+
+    return wall_ms, rows
+
+
+def summarize(target: str, wall_ms: float, rows: list, top: int) -> dict:
+    """Build the report for one target."""
+    by_module = {name: cumulative for name, _, cumulative in rows}
+    target_ms = by_module.get(target, sum(s for _, s, _ in rows)) / 1000
+    heaviest = sorted(rows, key=lambda r: r[2], reverse=True)[:top]
+    loaded_roots = {name.split(".")[0] for name, _, _ in rows}
+
+    return {
+        "target": target,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(target_ms, 1),
+        "budget_ms": IMPORT_BUDGET_MS.get(target),
+        "modules_loaded": len(rows),
+        "forbidden_loaded": sorted(
+            loaded_roots.intersection(FORBIDDEN_AT_STARTUP).difference(ALLOWED_AT_STARTUP.get(target, ()))
+        ),
+        "top": [
+            {"module": name, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)}
+            for name, s, c in heaviest
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", default=list(IMPORT_BUDGET_MS))
+    parser.add_argument("--top", type=int, default=10, help="Nombre de modules les plus lents à afficher")
+    parser.add_argument("--history", help="Fichier JSONL auquel ajouter les résultats (suivi dans le temps)")
+    args = parser.parse_args()
+
+    failed = False
+    reports = []
+    for target in args.targets:
+        wall_ms, rows = run_importtime(target)
+        report = summarize(target, wall_ms, rows, args.top)
+        reports.append(report)
+
+        budget = report["budget_ms"]
+        over = budget is not None and report["import_ms"] > budget
+        status = "❌ HORS BUDGET" if over else "✅"
+        print(f"\n{status} {target}: import {report['import_ms']} ms "
+              f"(budget {budget} ms), processus {report['wall_ms']} ms, "
+              f"{report['modules_loaded']} modules")
+        if report["forbidden_loaded"]:
+            print(f"   ❌ modules lourds chargés au démarrage : {', '.join(report['forbidden_loaded'])}")
+        for row in report["top"]:
+            print(f"   {row['cumulative_ms']:>9.1f} ms  {row['self_ms']:>8.1f} ms  {row['module']}")
+        failed = failed or over or bool(report["forbidden_loaded"])
+
+    if args.history:
+        with open(args.history, "a") as file:
+            file.write(json.dumps({"timestamp": time.time(), "python": sys.version.split()[0],
+                                   "reports": reports}) + "\n")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
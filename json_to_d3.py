@@ -4,32 +4,45 @@ Utilise vos fonctions json_utils.py existantes
 """
 
 import json
+
+import numpy as np
+
 from sonalyse_advisor.json_utils import (
     load_json,
     json_extract_info,
-    get_average_rating,
     get_noise_type_by_hour,
     get_noise_type_percentage_hourly,
     get_noise_type_percentage_daily,
     
 )
+from sonalyse_advisor.columnar import hour_of_day
+from sonalyse_advisor.grading import grade_report
+from sonalyse_advisor.resampling import coverage_summary, hourly_profile, resample
+from sonalyse_advisor.validation import clean_capture
 
-def convert_to_d3_format(json_filename="data/dps_analysis_pi3_exemple.json"):
+def convert_to_d3_format(json_filename="data/dps_analysis_pi3_exemple.json", room_type=None, verbose=True):
     """
     Convertit les données JSON Sonalyze en format D3.js
     
+    Args:
+        json_filename : str : Capture à convertir.
+        room_type : str : ``pieces[].type`` de la pièce mesurée (seuils de la note).
+        verbose : bool : Affiche la progression (désactivé dans le pipeline et le service).
+
     Returns:
         dict: Données formatées pour D3.js avec:
             - timeline: données horaires
             - radar: pourcentages de bruits
             - heatmap: matrice jour x heure (si plusieurs jours)
     """
+    log = print if verbose else (lambda *args: None)
     
-    print(f"📁 Chargement de {json_filename}...")
+    log(f"📁 Chargement de {json_filename}...")
     
-    # Charger données avec votre fonction
+    # Charger données avec votre fonction, sans les segments invalides
     data = load_json(json_filename)
-    print(f"✅ {len(data)} mesures chargées")
+    data, columns, quarantine = clean_capture(data)
+    log(f"✅ {len(data)} mesures chargées ({quarantine['rejected']} rejetées)")
     
     # Extraire infos avec vos fonctions
     (
@@ -40,61 +53,34 @@ def convert_to_d3_format(json_filename="data/dps_analysis_pi3_exemple.json"):
         extracted_background_noise,
     ) = json_extract_info(data)
     
-    # Calculer stats
-    average_rating = get_average_rating(extracted_rating)
+    # Calculer stats sur la grille régulière
+    grid = resample(columns)
+    coverage = coverage_summary(grid)
+    coverage_by_hour = hourly_profile(grid)
+    average_rating = grade_report(grid, room_type)["grade"]
     noise_percentage = get_noise_type_percentage_daily(extracted_dominant_noise)
     noise_by_hour = get_noise_type_by_hour(extracted_dominant_noise)
     noise_percentage_hourly = get_noise_type_percentage_hourly(noise_by_hour)
     
-    print(f"📊 Note calculée: {average_rating}")
-    print(f"🔊 Types de bruits: {len(noise_percentage)}")
+    log(f"📊 Note calculée: {average_rating}")
+    log(f"🔊 Types de bruits: {len(noise_percentage)}")
     
     # FORMAT 1: Timeline (évolution par heure)
+    # Chaque créneau de la grille pèse autant : une rafale de segments ne
+    # compte pas plus qu'une heure mal couverte
     timeline_data = []
-    
-    # Agréger par heure
-    db_by_hour = {}
-    for item in extracted_average_median:
-        timestamp = item['timestamp']
-        # Parser l'heure depuis timestamp (format: "YYYY-MM-DD HH:MM:SS")
-        try:
-            hour = int(timestamp.split(' ')[1].split(':')[0])
-        except:
-            continue
-        
-        avg_db = item['average_dB']
-        
-        if hour not in db_by_hour:
-            db_by_hour[hour] = {'values': [], 'mins': [], 'maxs': []}
-        
-        db_by_hour[hour]['values'].append(avg_db)
-    
-    # Calculer min/max pour chaque heure
-    for item in extracted_min_max_peak:
-        timestamp = item['timestamp']
-        try:
-            hour = int(timestamp.split(' ')[1].split(':')[0])
-        except:
+    for hour, profile in sorted(coverage_by_hour.items()):
+        if not profile['coverage']:
             continue
-        
-        if hour in db_by_hour:
-            db_by_hour[hour]['mins'].append(item['min_dB'])
-            db_by_hour[hour]['maxs'].append(item['max_dB'])
-    
-    # Construire timeline
-    for hour in sorted(db_by_hour.keys()):
-        values = db_by_hour[hour]['values']
-        mins = db_by_hour[hour]['mins']
-        maxs = db_by_hour[hour]['maxs']
-        
         timeline_data.append({
-            'hour': hour,
-            'value': round(sum(values) / len(values), 1) if values else 0,
-            'min': round(min(mins), 1) if mins else 0,
-            'max': round(max(maxs), 1) if maxs else 0
+            'hour': int(hour),
+            'value': profile['average_dB'],
+            'min': profile['min_dB'] if profile['min_dB'] is not None else 0,
+            'max': profile['max_dB'] if profile['max_dB'] is not None else 0,
+            'coverage': profile['coverage']
         })
     
-    print(f"📈 Timeline: {len(timeline_data)} points horaires")
+    log(f"📈 Timeline: {len(timeline_data)} points horaires")
     
     # FORMAT 2: Radar (pourcentages de bruits)
     radar_data = []
@@ -104,45 +90,32 @@ def convert_to_d3_format(json_filename="data/dps_analysis_pi3_exemple.json"):
             'value': round(percentage, 1)
         })
     
-    print(f"🎵 Radar: {len(radar_data)} catégories")
+    log(f"🎵 Radar: {len(radar_data)} catégories")
     
     # FORMAT 3: Heatmap (jour x heure)
     # Note: nécessite plusieurs jours de données
     heatmap_data = []
     
-    # Extraire jour et heure de chaque mesure
-    day_hour_db = {}
-    for item in extracted_average_median:
-        timestamp = item['timestamp']
-        try:
-            date_part = timestamp.split(' ')[0]
-            hour = int(timestamp.split(' ')[1].split(':')[0])
-            avg_db = item['average_dB']
-            
-            # Utiliser date comme "jour"
-            if date_part not in day_hour_db:
-                day_hour_db[date_part] = {}
-            
-            if hour not in day_hour_db[date_part]:
-                day_hour_db[date_part][hour] = []
-            
-            day_hour_db[date_part][hour].append(avg_db)
-        except:
-            continue
+    # Moyenne des créneaux remplis de chaque jour x heure
+    filled = grid['segments'] > 0
+    days, day_index = np.unique(grid['timestamp'][filled].astype('datetime64[D]'), return_inverse=True)
+    hours = hour_of_day(grid['timestamp'][filled])
+    cells = day_index * 24 + hours
+    counts = np.bincount(cells, minlength=len(days) * 24)
+    sums = np.bincount(cells, weights=grid['average_dB'][filled], minlength=len(days) * 24)
     
     # Convertir en format heatmap
     day_names = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
-    for day_idx, (date, hours_data) in enumerate(day_hour_db.items()):
-        day_name = day_names[day_idx % 7]
-        for hour, values in hours_data.items():
-            heatmap_data.append({
-                'day': day_name,
-                'dayIndex': day_idx % 7,
-                'hour': hour,
-                'value': round(sum(values) / len(values), 1) if values else 0
-            })
-    
-    print(f"🗓️ Heatmap: {len(heatmap_data)} cellules")
+    for cell in np.flatnonzero(counts):
+        day_idx, hour = divmod(int(cell), 24)
+        heatmap_data.append({
+            'day': day_names[day_idx % 7],
+            'dayIndex': day_idx % 7,
+            'hour': hour,
+            'value': round(float(sums[cell] / counts[cell]), 1)
+        })
+    
+    log(f"🗓️ Heatmap: {len(heatmap_data)} cellules")
     
     # FORMAT COMPLET
     d3_format = {
@@ -152,8 +125,11 @@ def convert_to_d3_format(json_filename="data/dps_analysis_pi3_exemple.json"):
         'metadata': {
             'grade': average_rating,
             'total_measurements': len(data),
+            'rejected_measurements': quarantine['rejected'],
             'hours_covered': len(timeline_data),
-            'noise_types': len(radar_data)
+            'noise_types': len(radar_data),
+            'coverage_percentage': coverage['coverage_percentage'],
+            'gaps': coverage['longest_gaps']
         }
     }
     
@@ -1,51 +1,236 @@
 from dotenv import load_dotenv
-from groq import Groq
+import hashlib
 import os
 import json  # Add this import for JSON serialization
-from sonalyse_advisor.config import MODEL
-from sonalyse_advisor.json_utils import gather_all_extracted_data, load_json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sonalyse_advisor.baseline import loud_nights_summary
+from sonalyse_advisor.compliance import evaluate_compliance
+from sonalyse_advisor.guidance_index import documents_digest, guidance_paths, relevant_passages
+from sonalyse_advisor.json_utils import gather_extracted_data, load_json
+from sonalyse_advisor.validation import clean_capture
+from sonalyse_advisor.config import MODEL_ROUTES
+from sonalyse_advisor.model_router import get_router
+from sonalyse_advisor.single_flight import get_single_flight
 
 load_dotenv()
 
+# Part of the single-flight key of an analysis: bump it when the prompts change.
+PROMPT_VERSION = 2
+
+# (key, header, extra instruction) of each section of the report in context.txt.
+REPORT_SECTIONS = (
+    ("resume", "1. Résumé de l'analyse acoustique",
+     "Start with the st.title and the key indicator st.metric, then the section."),
+    ("faiblesses", "2. Faiblesses du logement", ""),
+    ("recommandations", "3. Recommandations",
+     "Keep the three subsections (low-cost, intermediate, heavy works) with their costs."),
+    ("a_retenir", "4. À retenir", "End with the final st.success."),
+)
+
+FULL_REPORT_PROMPT = (
+    "Generate Python Streamlit code for my diagnostic. Use Streamlit functions like st.markdown, st.write, st.metric, etc."
+)
+
+SECTION_PROMPT = (
+    "Generate only the Python Streamlit code of the section \"{title}\" of my diagnostic, "
+    "starting with st.header(\"{title}\"). Do not generate the other sections. {extra}"
+)
+
+
+def llm_available() -> bool:
+    """Whether an API key is configured for the remote model."""
+    return bool(os.environ.get("GROQ_API_KEY"))
+
 
 def read_context_file(file_path: str) -> str:
     with open(file_path, "r") as file:
         return file.read()
 
 
-def interpret_json(json_path: str, context_path: str,  accommodation_information_path : str) -> str:
+def prompt_data(json_data: list, room_type: str = None, oms_table: list = None, room: str = None,
+                cleaned: tuple = None) -> dict:
+    """Aggregated facts about a capture that are sent to the model.
+
+    The records are validated and converted to columns once; every aggregate
+    is computed from that.
+
+    Args:
+        oms_table : list : WHO guideline values (``compliance.load_oms_table``), the default guide when omitted.
+        room : str : Room name in the ``TimeSeriesStore``, whose history is the baseline of the loud nights.
+        cleaned : tuple : ``clean_capture(json_data)`` when the caller already has it.
+    """
+    cleaned = cleaned or clean_capture(json_data)
+    columns = cleaned[1]
+    all_data = gather_extracted_data(json_data, room_type, cleaned)
+    all_data["abnormal_nights"] = loud_nights_summary(columns, room)
+    # Compliance is computed locally: the model gets facts, not the guide text
+    all_data["oms_compliance"] = evaluate_compliance({"room": columns}, oms_table)["room"]
+    return all_data
+
+
+def format_system_prompt(context_content: str, accommodation: dict, all_data: dict, room_type: str = None) -> str:
+    """System prompt from the context text, the accommodation and ``prompt_data``.
+
+    Only the guidance passages relevant to the room are included (see
+    ``guidance_index``), so the prompt does not grow with the documents. The
+    reference levels and solution costs come from ``recommendations``, like
+    those of the local report.
+    """
+    from sonalyse_advisor.recommendations import catalogue_text
+
+    # Serialize JSON data to ensure proper formatting
+    accommodation_info = json.dumps(accommodation, ensure_ascii=False)
+    json_data = json.dumps(all_data, ensure_ascii=False)
+    guidance = "\n".join(
+        f"[{passage['source']} — {passage['title']}] {passage['text']}"
+        for passage in relevant_passages(all_data, room_type)
+    )
+    return f"System Prompt : {context_content}, \n\n, OMS Guideline : {guidance}\n\n Solutions catalogue : {catalogue_text(room_type)}\n\n Information on the accommodation : {accommodation_info}\n\n JSON Data: \n\n {json_data}"
+
+
+def _complete(route: str, system_prompt: str, user_prompt: str, local=None) -> str:
+    return get_router().complete(
+        route,
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        local,
+    )
+
+
+def local_report(all_data: dict, room_type: str = None):
+    """Return a callable building the rule-based report once, the local fallback of the routes."""
+    report = {}
+
+    def build() -> dict:
+        if not report:
+            from sonalyse_advisor.recommendations import build_report, render_streamlit_code
+
+            report.update(render_streamlit_code(build_report(all_data, room_type)))
+        return report
+    return build
+
+
+def analysis_key(json_path: str, context_path: str, accommodation_information_path: str,
+                 room_type: str = None, mode: str = "sections", room: str = None) -> str:
+    """Identify an analysis by its input files, guidance documents, prompt version and model routes.
+
+    Two requests with the same key produce the same prompts, so concurrent
+    ones can share a single computation (see ``single_flight``).
+    """
+    digest = hashlib.sha256(f"{PROMPT_VERSION}:{mode}:{room_type}:{room}".encode())
+    digest.update(json.dumps({route: spec["models"] for route, spec in MODEL_ROUTES.items()}).encode())
+    digest.update(documents_digest(guidance_paths()).encode())
+    for path in (json_path, context_path, accommodation_information_path):
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _report_inputs(json_path: str, context_path: str, accommodation_information_path: str, room_type: str = None,
+                   room: str = None) -> tuple:
+    """System prompt and local fallback of an analysis."""
+    all_data = prompt_data(load_json(json_path), room_type, room=room)
+    system_prompt = format_system_prompt(
+        read_context_file(context_path), load_json(accommodation_information_path), all_data, room_type
+    )
+    return system_prompt, local_report(all_data, room_type)
+
+
+def interpret_json(json_path: str, context_path: str,  accommodation_information_path : str, room_type: str = None,
+                   room: str = None) -> str:
     """Interpret the given JSON data using a language model with provided context.
 
+    Concurrent identical requests (threads or processes) share one computation.
+
     Args:
         json_path: The path to the JSON data to interpret.
         context_path: The path to the context file to provide to the model.
+        accommodation_information_path: The path to the accommodation JSON file.
+        room_type: The ``pieces[].type`` of the measured room, used for the grade.
+        room: The room name in the ``TimeSeriesStore``, used for the loud nights baseline.
 
     Returns:
         The full response from the model.
     """
-    client = Groq(api_key=os.environ["GROQ_API_KEY"])
+    key = analysis_key(json_path, context_path, accommodation_information_path, room_type, "report", room)
+    return get_single_flight().do(key, lambda: generate_report(
+        *_report_inputs(json_path, context_path, accommodation_information_path, room_type, room)
+    ))
 
-    # Serialize JSON data to ensure proper formatting
-    context_content = read_context_file(context_path)
-    accommodation_info = json.dumps(load_json(accommodation_information_path), ensure_ascii=False)
-    json_data = json.dumps(gather_all_extracted_data(json_path), ensure_ascii=False)
-
-    oms_guide = read_context_file("data/OMS_guide.txt")
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": f"System Prompt : {context_content}, \n\n, OMS Guideline : {oms_guide}\n\n Information on the accommodation : {accommodation_info}\n\n JSON Data: \n\n {json_data}",
-            },
-            {
-                "role": "user",
-                "content": "Generate Python Streamlit code for my diagnostic. Use Streamlit functions like st.markdown, st.write, st.metric, etc.",
-            },
-        ],
-        stream=False,  # Disable streaming to get the full result
-        model=MODEL,
+
+def generate_report(system_prompt: str, local=None) -> str:
+    """Generate the whole report in one request from an already built system prompt.
+
+    Args:
+        local : callable : Rule-based report (see ``local_report``), last fallback of the route.
+    """
+    fallback = (lambda: local()["code"]) if local else None
+    return _complete("report", system_prompt, FULL_REPORT_PROMPT, fallback)
+
+
+def interpret_json_sections(json_path: str, context_path: str, accommodation_information_path: str, room_type: str = None,
+                            room: str = None) -> dict:
+    """Generate the four report sections as parallel requests and merge them.
+
+    Every request shares the same system prompt (cached prefix) and only asks
+    for its own section, so the latency is that of the slowest section.
+    Concurrent identical requests (threads or processes) share one computation.
+
+    Returns:
+        dict : "sections" mapping each key of REPORT_SECTIONS to its Streamlit
+            code, and "code" the sections concatenated in report order.
+    """
+    key = analysis_key(json_path, context_path, accommodation_information_path, room_type, "sections", room)
+    return get_single_flight().do(key, lambda: generate_sections(
+        *_report_inputs(json_path, context_path, accommodation_information_path, room_type, room)
+    ))
+
+
+def iter_sections(system_prompt: str, local=None):
+    """Yield ``(key, code)`` of each report section as soon as its request completes.
+
+    Each section goes through its own route of MODEL_ROUTES: the summary and
+    the takeaways to the fast model, the recommendations to the large one.
+
+    Args:
+        local : callable : Rule-based report (see ``local_report``), last fallback of the routes.
+    """
+    with ThreadPoolExecutor(max_workers=len(REPORT_SECTIONS)) as executor:
+        futures = {
+            executor.submit(generate_section, system_prompt, key, local): key
+            for key, _, _ in REPORT_SECTIONS
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def generate_section(system_prompt: str, key: str, local=None) -> str:
+    """Streamlit code of the section ``key`` of REPORT_SECTIONS, through its route.
+
+    Args:
+        local : callable : Rule-based report (see ``local_report``), last fallback of the route.
+    """
+    title, extra = next((title, extra) for section, title, extra in REPORT_SECTIONS if section == key)
+    return _complete(
+        key, system_prompt, SECTION_PROMPT.format(title=title, extra=extra),
+        (lambda: local()["sections"][key]) if local else None,
     )
-    return chat_completion.choices[0].message.content  # Access attributes properly
+
+
+def generate_sections(system_prompt: str, local=None) -> dict:
+    """Generate the report sections from an already built system prompt.
+
+    Returns:
+        dict : Same shape as ``interpret_json_sections``.
+    """
+    sections = dict(iter_sections(system_prompt, local))
+    return {
+        "sections": sections,
+        "code": "\n\n".join(sections[key] for key, _, _ in REPORT_SECTIONS),
+    }
 
 
 def read_stream_response(stream_response: str) -> str:
@@ -0,0 +1,330 @@
+"""Mergeable aggregation state for captures split into several files.
+
+Sensors roll over to a new file every hour or day. Each shard is reduced to
+an ``AggregationState``: per grid slot segment counts, energy sums and
+min/max/peak, plus label counters per hour and per date. States merge
+associatively, serialize to JSON and are cached per shard (keyed by path,
+size and mtime), so a week of shards is reduced on all cores and a new shard
+only costs its own pass. ``to_aggregates`` returns the same dict as
+``json_utils.gather_extracted_data`` on the concatenated capture.
+
+Shards are validated independently: duplicate timestamps across two shards
+are not detected.
+
+Usage:
+    python -m sonalyse_advisor.aggregation data/shards/*.json --room-type Chambre --cache-dir .aggregation_cache
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sonalyse_advisor.columnar import hour_of_day
+from sonalyse_advisor.grading import grade_report
+from sonalyse_advisor.resampling import (
+    average_level,
+    coverage_summary,
+    hourly_profile,
+    infer_step,
+    resample,
+)
+from sonalyse_advisor.validation import clean_capture
+
+STATE_VERSION = 2
+LEVEL_FIELDS = ("min_dB", "max_dB", "peak_dB")
+
+
+def _ordered_counts(keys: np.ndarray, names) -> dict:
+    """Count keys in order of first occurrence, like the dict counters of json_utils."""
+    if not len(keys):
+        return {}
+    unique, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.argsort(first, kind="stable")
+    return {names(int(key)): int(count) for key, count in zip(unique[order], counts[order])}
+
+
+def _merge_counts(left: dict, right: dict) -> dict:
+    merged = dict(left)
+    for key, count in right.items():
+        merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+class AggregationState:
+    """Associative summary of the segments of one or more shards.
+
+    Args:
+        step_seconds : int : Grid step, shared by every state that is merged.
+    """
+
+    def __init__(self, step_seconds: int):
+        self.step_seconds = int(step_seconds)
+        self.slot = np.array([], dtype=np.int64)  # seconds since epoch // step
+        self.segments = np.array([], dtype=np.int64)
+        self.energy = np.array([], dtype=np.float64)
+        self.levels = {name: np.array([], dtype=np.float64) for name in LEVEL_FIELDS}
+        self.labels = {}
+        self.labels_by_hour = {}
+        self.labels_by_date = {}
+        self.total_segments = 0
+        self.rejected = {}
+        self.last_timestamp = None  # seconds since epoch of the last valid segment
+
+    @classmethod
+    def from_records(cls, json_data: list, step_seconds: int = None, after: int = None) -> "AggregationState":
+        """Validate and reduce segment records (one shard).
+
+        Args:
+            after : int : ``last_timestamp`` of the state of the previous
+                records when a capture is reduced batch by batch; records at
+                or before it are rejected as duplicates or out of order.
+        """
+        total = len(json_data)
+        after = None if after is None else np.datetime64(after, "s")
+        _, columns, quarantine = clean_capture(json_data, after=after)
+        state = cls(step_seconds or infer_step(columns["timestamp"]))
+        state.total_segments = total
+        state.rejected = dict(quarantine["counts"])
+        if len(columns["timestamp"]):
+            state.last_timestamp = int(columns["timestamp"].astype(np.int64).max())
+
+        grid = resample(columns, state.step_seconds)
+        filled = grid["segments"] > 0
+        average = grid["average_dB"][filled]
+        state.slot = grid["timestamp"][filled].astype(np.int64) // state.step_seconds
+        state.segments = grid["segments"][filled]
+        state.energy = state.segments * 10 ** (average / 10)
+        state.levels = {name: grid[name][filled] for name in LEVEL_FIELDS}
+
+        labels, codes = columns["labels"], columns["label"]
+        timestamps = columns["timestamp"]
+        hours = hour_of_day(timestamps)
+        days, day_index = np.unique(timestamps.astype("datetime64[D]"), return_inverse=True)
+        n_labels = max(len(labels), 1)
+
+        state.labels = _ordered_counts(codes, lambda code: labels[code])
+        for hour, counts in _split_counts(hours * n_labels + codes, n_labels).items():
+            state.labels_by_hour[f"{hour:02d}"] = {labels[code]: count for code, count in counts.items()}
+        for day, counts in _split_counts(day_index * n_labels + codes, n_labels).items():
+            state.labels_by_date[str(days[day])] = {labels[code]: count for code, count in counts.items()}
+        return state
+
+    @classmethod
+    def from_file(cls, json_path: str, step_seconds: int = None) -> "AggregationState":
+        from sonalyse_advisor.json_utils import load_json
+
+        return cls.from_records(load_json(json_path), step_seconds)
+
+    def merge(self, other: "AggregationState") -> "AggregationState":
+        """Return the state of both shards; merge in chronological order to keep label tie order."""
+        return merge_states([self, other])
+
+    def grid(self) -> dict:
+        """Dense grid in the format of ``resampling.resample``."""
+        if not len(self.slot):
+            return resample({"timestamp": np.array([], dtype="datetime64[s]"), "average_dB": np.array([])},
+                            self.step_seconds)
+        n_slots = int(self.slot[-1] - self.slot[0]) + 1
+        index = self.slot - self.slot[0]
+        segments = np.zeros(n_slots, dtype=np.int64)
+        segments[index] = self.segments
+        grid = {
+            "timestamp": ((self.slot[0] + np.arange(n_slots)) * self.step_seconds).astype("datetime64[s]"),
+            "segments": segments,
+            "step_seconds": self.step_seconds,
+        }
+        for name, values in [("average_dB", 10 * np.log10(self.energy / self.segments))] + list(self.levels.items()):
+            column = np.full(n_slots, np.nan)
+            column[index] = values
+            grid[name] = column
+        return grid
+
+    def to_aggregates(self, room_type: str = None) -> dict:
+        """Return the output of ``gather_extracted_data`` for the merged segments."""
+        grid = self.grid()
+        grades = grade_report(grid, room_type)
+
+        # Same rounding and tie order as get_noise_type_percentage_daily/_hourly
+        valid = sum(self.labels.values())
+        percentages = {label: round((count / valid) * 100, 1) for label, count in self.labels.items()}
+        noise_percentage = dict(sorted(percentages.items(), key=lambda x: x[1], reverse=True)[:5])
+        noise_percentage_hourly = {}
+        for hour, counts in self.labels_by_hour.items():
+            most_common = max(counts.items(), key=lambda x: x[1])[0]
+            noise_percentage_hourly[hour] = {
+                "noise_type": most_common,
+                "percentage": round((counts[most_common] / sum(counts.values())) * 100, 1),
+            }
+
+        return {
+            "daily": {
+                "average_daily_db": average_level(grid),
+                "average_daily_rating": grades["grade"],
+                "period_grades": grades["period_grades"],
+                "period_leq_dB": grades["leq_dB"],
+                "grade_distribution_per_period": grades["distribution"]["period"],
+                "grade_distribution_per_day": grades["distribution"]["daily"],
+                "noise_daily_percentage": noise_percentage,
+            },
+            "hourly": {
+                "noise_hourly_percentage": noise_percentage_hourly,
+                "db_min_max_peak_per_hour": hourly_profile(grid),
+                "grade_distribution_per_hour": grades["distribution"]["hourly"],
+            },
+            "coverage": coverage_summary(grid),
+            "quality": {
+                "segments": self.total_segments,
+                "rejected_segments": self.total_segments - valid,
+                "rejected_by_reason": {k: v for k, v in self.rejected.items() if v},
+            },
+        }
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form, see ``from_dict``."""
+        return {
+            "version": STATE_VERSION,
+            "step_seconds": self.step_seconds,
+            "slot": self.slot.tolist(),
+            "segments": self.segments.tolist(),
+            "energy": self.energy.tolist(),
+            "levels": {name: [None if np.isnan(v) else v for v in values.tolist()]
+                       for name, values in self.levels.items()},
+            "labels": self.labels,
+            "labels_by_hour": self.labels_by_hour,
+            "labels_by_date": self.labels_by_date,
+            "total_segments": self.total_segments,
+            "rejected": self.rejected,
+            "last_timestamp": self.last_timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "AggregationState":
+        if payload.get("version") != STATE_VERSION:
+            raise ValueError(f"Version d'état inconnue : {payload.get('version')}")
+        state = cls(payload["step_seconds"])
+        state.slot = np.array(payload["slot"], dtype=np.int64)
+        state.segments = np.array(payload["segments"], dtype=np.int64)
+        state.energy = np.array(payload["energy"], dtype=np.float64)
+        state.levels = {name: np.array(values, dtype=np.float64) for name, values in payload["levels"].items()}
+        state.labels = payload["labels"]
+        state.labels_by_hour = payload["labels_by_hour"]
+        state.labels_by_date = payload["labels_by_date"]
+        state.total_segments = payload["total_segments"]
+        state.rejected = payload["rejected"]
+        state.last_timestamp = payload["last_timestamp"]
+        return state
+
+
+def merge_states(states: list) -> AggregationState:
+    """Merge states in one pass; pass them in chronological order to keep label tie order."""
+    step_seconds = {state.step_seconds for state in states}
+    if len(step_seconds) != 1:
+        raise ValueError(f"Pas de grille différents : {sorted(step_seconds)} s")
+    merged = AggregationState(step_seconds.pop())
+
+    slot = np.concatenate([state.slot for state in states])
+    order = np.argsort(slot, kind="stable")
+    slot = slot[order]
+    if len(slot):
+        starts = np.flatnonzero(np.r_[True, slot[1:] != slot[:-1]])
+        merged.slot = slot[starts]
+        merged.segments = np.add.reduceat(np.concatenate([state.segments for state in states])[order], starts)
+        merged.energy = np.add.reduceat(np.concatenate([state.energy for state in states])[order], starts)
+        for name, ufunc in (("min_dB", np.fmin), ("max_dB", np.fmax), ("peak_dB", np.fmax)):
+            values = np.concatenate([state.levels[name] for state in states])[order]
+            merged.levels[name] = ufunc.reduceat(values, starts)
+
+    for state in states:
+        merged.labels = _merge_counts(merged.labels, state.labels)
+        merged.rejected = _merge_counts(merged.rejected, state.rejected)
+        for attribute in ("labels_by_hour", "labels_by_date"):
+            groups = getattr(merged, attribute)
+            for key, counts in getattr(state, attribute).items():
+                groups[key] = _merge_counts(groups.get(key, {}), counts)
+        merged.total_segments += state.total_segments
+        if state.last_timestamp is not None:
+            merged.last_timestamp = max(merged.last_timestamp or state.last_timestamp, state.last_timestamp)
+    return merged
+
+
+def _split_counts(keys: np.ndarray, n_labels: int) -> dict:
+    """Group combined ``group * n_labels + code`` keys into {group: {code: count}}."""
+    groups = {}
+    for key, count in _ordered_counts(keys, int).items():
+        group, code = divmod(key, n_labels)
+        groups.setdefault(group, {})[code] = count
+    return dict(sorted(groups.items()))
+
+
+def _cache_path(cache_dir: str, json_path: str, step_seconds: int) -> str:
+    from sonalyse_advisor.shared_store import capture_key
+
+    digest = hashlib.sha1(repr((capture_key(json_path), step_seconds, STATE_VERSION)).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def shard_state(json_path: str, step_seconds: int = None, cache_dir: str = None) -> AggregationState:
+    """State of one shard, read from or written to ``cache_dir`` when given."""
+    path = _cache_path(cache_dir, json_path, step_seconds) if cache_dir else None
+    if path and os.path.exists(path):
+        with open(path, "r") as file:
+            return AggregationState.from_dict(json.load(file))
+
+    state = AggregationState.from_file(json_path, step_seconds)
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(state.to_dict(), file)
+        os.replace(tmp_path, path)
+    return state
+
+
+def aggregate_shards(json_paths: list, step_seconds: int = None, cache_dir: str = None,
+                     workers: int = None) -> AggregationState:
+    """Reduce shards in parallel worker processes and merge them chronologically.
+
+    Args:
+        json_paths : list : Shard files of one room.
+        step_seconds : int : Grid step, inferred from the first shard when omitted.
+        cache_dir : str : Directory of cached shard states.
+        workers : int : Worker processes, one per core by default; 1 runs in-process.
+    """
+    if not json_paths:
+        raise ValueError("Aucun fichier de capture")
+    if step_seconds is None:
+        step_seconds = shard_state(json_paths[0], None, cache_dir).step_seconds
+
+    if workers == 1 or len(json_paths) == 1:
+        states = [shard_state(path, step_seconds, cache_dir) for path in json_paths]
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            states = list(executor.map(
+                shard_state, json_paths, [step_seconds] * len(json_paths), [cache_dir] * len(json_paths),
+                chunksize=max(1, len(json_paths) // (4 * workers)),
+            ))
+
+    states.sort(key=lambda state: state.slot[0] if len(state.slot) else np.iinfo(np.int64).max)
+    return merge_states(states)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégation parallèle de captures découpées en fichiers")
+    parser.add_argument("captures", nargs="+", help="Fichiers de capture d'une même pièce")
+    parser.add_argument("--room-type", help="pieces[].type de la pièce mesurée")
+    parser.add_argument("--cache-dir", help="Dossier du cache des états par fichier")
+    parser.add_argument("--step", type=int, help="Pas de la grille (s), déduit du premier fichier par défaut")
+    parser.add_argument("--workers", type=int, help="Processus de calcul (défaut : un par cœur)")
+    args = parser.parse_args()
+
+    state = aggregate_shards(args.captures, args.step, args.cache_dir, args.workers)
+    print(json.dumps(state.to_aggregates(args.room_type), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Per-room 24-hour baselines and detection of abnormally loud nights.
+
+The history of a room is reduced to a (days x 24) matrix of hourly Leq. For
+each weekday type (weekday / weekend) the baseline is the median and the MAD
+of every hour over the history; each day is then scored against it with a
+robust z-score, all in vectorized numpy passes so years of history stay cheap.
+
+Days start at DAY_START_HOUR so that a night (22 h - 6 h) belongs to a single
+row, labelled with the date of the evening.
+
+The history of a room comes from the long-term ``TimeSeriesStore``: the
+nights of a new capture are scored against the weeks stored before it, never
+against themselves.
+"""
+
+import warnings
+
+import numpy as np
+
+DAY_START_HOUR = 6
+NIGHT_HOURS = (22, 23, 0, 1, 2, 3, 4, 5)
+WEEKDAY, WEEKEND = 0, 1
+DAY_TYPE_NAMES = ("semaine", "week-end")
+
+# MAD -> standard deviation for normally distributed data.
+MAD_SCALE = 1.4826
+
+# A night is abnormal when its robust z-score and its excess both pass these.
+Z_THRESHOLD = 3.0
+MIN_EXCESS_DB = 3.0
+MIN_HISTORY_DAYS = 7
+# Days of stored history read before a capture to build its baseline.
+HISTORY_DAYS = 56
+
+# Column index (0-23) of each clock hour in the shifted day.
+HOUR_COLUMNS = (np.arange(24) - DAY_START_HOUR) % 24
+NIGHT_COLUMNS = np.sort(HOUR_COLUMNS[list(NIGHT_HOURS)])
+
+
+def energetic_mean(levels_db: np.ndarray, axis=None) -> np.ndarray:
+    """Energetic (Leq) mean of dB values, ignoring NaN."""
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return 10 * np.log10(np.nanmean(10 ** (levels_db / 10), axis=axis))
+
+
+def hourly_leq_matrix(columns: dict) -> tuple:
+    """Aggregate segment columns into a (days x 24) matrix of hourly Leq.
+
+    Args:
+        columns : dict : Columns from ``columnar.to_columns``.
+
+    Returns:
+        tuple : (days as datetime64[D], matrix of float64 with NaN where an
+            hour has no segment). Column ``c`` is clock hour ``(c + DAY_START_HOUR) % 24``.
+    """
+    timestamps = columns["timestamp"]
+    levels = columns["average_dB"]
+    valid = ~np.isnat(timestamps) & ~np.isnan(levels)
+    if not valid.any():
+        return np.array([], dtype="datetime64[D]"), np.empty((0, 24))
+
+    shifted = timestamps[valid] - np.timedelta64(DAY_START_HOUR, "h")
+    day = shifted.astype("datetime64[D]")
+    column = (shifted.astype("datetime64[h]") - day).astype(np.int64)
+
+    days, day_index = np.unique(day, return_inverse=True)
+    cell = day_index * 24 + column
+    energy = np.bincount(cell, weights=10 ** (levels[valid] / 10), minlength=len(days) * 24)
+    counts = np.bincount(cell, minlength=len(days) * 24)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = 10 * np.log10(energy / counts)
+    return days, matrix.reshape(len(days), 24)
+
+
+def day_types(days: np.ndarray) -> np.ndarray:
+    """Return WEEKDAY or WEEKEND for each datetime64[D] day."""
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    return (weekday >= 5).astype(np.int8)
+
+
+def build_baseline(days: np.ndarray, matrix: np.ndarray) -> dict:
+    """Build the median/MAD hourly profile of a room for each weekday type.
+
+    Returns:
+        dict : "median" and "mad" arrays of shape (2, 24) indexed by
+            [day type, column], and "days" the number of history days per type.
+    """
+    types = day_types(days)
+    median = np.full((2, 24), np.nan)
+    mad = np.full((2, 24), np.nan)
+    history = np.zeros(2, dtype=np.int64)
+
+    for day_type in (WEEKDAY, WEEKEND):
+        rows = matrix[types == day_type]
+        history[day_type] = len(rows)
+        if len(rows) == 0:
+            continue
+        with warnings.catch_warnings():
+            # Hours never measured give all-NaN slices: their baseline stays NaN.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median[day_type] = np.nanmedian(rows, axis=0)
+            mad[day_type] = np.nanmedian(np.abs(rows - median[day_type]), axis=0)
+
+    return {"median": median, "mad": mad, "days": history}
+
+
+def score_days(baseline: dict, days: np.ndarray, matrix: np.ndarray, min_mad_db: float = 1.0) -> dict:
+    """Score days against a baseline in one vectorized pass.
+
+    Args:
+        baseline : dict : Result of ``build_baseline``.
+        days : np.ndarray : Days to score (datetime64[D]).
+        matrix : np.ndarray : Their (days x 24) hourly Leq.
+        min_mad_db : float : Floor on the MAD so a very stable history does
+            not turn a 1 dB change into an anomaly.
+
+    Returns:
+        dict : "z" (days x 24 robust z-scores), "night_excess_dB" and
+            "night_z" per day, and "anomalous" boolean flags per day.
+    """
+    types = day_types(days)
+    median = baseline["median"][types]
+    spread = MAD_SCALE * np.maximum(baseline["mad"][types], min_mad_db)
+
+    excess = matrix - median
+    z = excess / spread
+
+    night_excess = energetic_mean(matrix[:, NIGHT_COLUMNS], axis=1) - energetic_mean(
+        median[:, NIGHT_COLUMNS], axis=1
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        night_z = np.nanmean(z[:, NIGHT_COLUMNS], axis=1)
+
+    enough_history = baseline["days"][types] >= MIN_HISTORY_DAYS
+    anomalous = enough_history & (night_z >= Z_THRESHOLD) & (night_excess >= MIN_EXCESS_DB)
+
+    return {"z": z, "night_z": night_z, "night_excess_dB": night_excess, "anomalous": anomalous}
+
+
+def detect_loud_nights(history_columns: dict, new_columns: dict = None) -> list:
+    """Flag nights louder than the room's own history.
+
+    Args:
+        history_columns : dict : Columns of the room history.
+        new_columns : dict : Columns of the days to score. Defaults to the
+            history itself, each day being scored against the whole history.
+
+    Returns:
+        list : One dict per abnormal night with "date", "day_type",
+            "night_leq_dB", "baseline_night_leq_dB", "excess_dB" and "z_score".
+    """
+    history_days, history_matrix = hourly_leq_matrix(history_columns)
+    baseline = build_baseline(history_days, history_matrix)
+
+    if new_columns is None:
+        days, matrix = history_days, history_matrix
+    else:
+        days, matrix = hourly_leq_matrix(new_columns)
+    scores = score_days(baseline, days, matrix)
+
+    types = day_types(days)
+    night_leq = energetic_mean(matrix[:, NIGHT_COLUMNS], axis=1)
+    nights = []
+    for i in np.flatnonzero(scores["anomalous"]):
+        nights.append({
+            "date": str(days[i]),
+            "day_type": DAY_TYPE_NAMES[types[i]],
+            "night_leq_dB": round(float(night_leq[i]), 1),
+            "baseline_night_leq_dB": round(float(night_leq[i] - scores["night_excess_dB"][i]), 1),
+            "excess_dB": round(float(scores["night_excess_dB"][i]), 1),
+            "z_score": round(float(scores["night_z"][i]), 1),
+        })
+    return nights
+
+
+def room_history(room: str, before: np.datetime64, store=None, days: int = HISTORY_DAYS) -> dict:
+    """Stored levels of a room over the ``days`` days before ``before``.
+
+    Args:
+        room : str : Room name in the ``TimeSeriesStore``.
+        store : TimeSeriesStore : Defaults to the store at its default root.
+
+    Returns:
+        dict : "timestamp" and "average_dB" columns, empty when the room has no history.
+    """
+    if store is None:
+        from sonalyse_advisor.timeseries_store import TimeSeriesStore
+
+        store = TimeSeriesStore()
+    start = before.astype("datetime64[D]") - np.timedelta64(days, "D")
+    history = store.read_segments(room, start, before, columns=["average_dB"])
+    if not len(history["timestamp"]):
+        return {"timestamp": np.array([], dtype="datetime64[s]"), "average_dB": np.array([])}
+    return history
+
+
+def loud_nights_summary(columns: dict, room: str = None, store=None) -> dict:
+    """Summary of abnormal nights for the dashboard and the LLM prompt.
+
+    The nights of the capture are scored against the stored history of the
+    room before it (see ``room_history``), so a run of loud nights does not
+    raise its own baseline; nights are only flagged once that history spans
+    MIN_HISTORY_DAYS days. A room without stored history, or no room, uses
+    the capture as its own history.
+
+    Args:
+        columns : dict : Validated columns of the capture (``validation.clean_capture``).
+        room : str : Room name in the ``TimeSeriesStore``.
+        store : TimeSeriesStore : Store of the history, the default one when omitted.
+    """
+    history = columns
+    timestamps = columns["timestamp"]
+    if room and len(timestamps):
+        stored = room_history(room, timestamps.min(), store)
+        if len(stored["timestamp"]):
+            history = stored
+    days, _ = hourly_leq_matrix(history)
+    return {
+        "history_days": int(len(days)),
+        "enough_history": bool(len(days) >= MIN_HISTORY_DAYS),
+        "abnormal_nights": detect_loud_nights(history, columns),
+    }
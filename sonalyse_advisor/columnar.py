@@ -0,0 +1,156 @@
+"""Columnar (numpy) representation of a capture.
+
+A capture is a list of segment records. ``to_columns`` turns it into one
+read-only numpy array per field so aggregations can run vectorized and the
+arrays can be shared between sessions without copies.
+"""
+
+import numpy as np
+
+# Column name -> field of the segment records.
+FLOAT_FIELDS = {
+    "average_dB": "LAeq_segment_dB",
+    "median_dB": "L50_dB",
+    "min_dB": "Lmin_dB",
+    "max_dB": "Lmax_dB",
+    "peak_dB": "LPeak_dB",
+    "background_noise_dB": "L90_dB",
+}
+
+RATING_LETTERS = "ABCDEFG"
+
+
+def dominant_label(item: dict):
+    """Return the first label of ``top_5_labels`` or None if there is none."""
+    labels = item.get("top_5_labels") or []
+    if not labels:
+        return None
+    label = labels[0]
+    return label.get("label") if isinstance(label, dict) else label
+
+
+def _parse_timestamp(value):
+    """Parse one timestamp: (datetime64[s], malformed). Missing values are NaT, not malformed."""
+    if value is None or value == "":
+        return np.datetime64("NaT", "s"), False
+    if not isinstance(value, str):
+        return np.datetime64("NaT", "s"), True
+    try:
+        return np.datetime64(value, "s"), False
+    except ValueError:
+        return np.datetime64("NaT", "s"), True
+
+
+def _parse_float(value):
+    """Parse one level: (float, malformed). Missing values are NaN, not malformed."""
+    if value is None:
+        return np.nan, False
+    if isinstance(value, bool):
+        return np.nan, True
+    try:
+        return float(value), False
+    except (TypeError, ValueError):
+        return np.nan, True
+
+
+def _timestamp_column(json_data: list, malformed: np.ndarray) -> np.ndarray:
+    values = [item.get("timestamp") or "NaT" for item in json_data]
+    try:
+        return np.array(values, dtype="datetime64[s]")
+    except (TypeError, ValueError):
+        pass
+    # One unparsable timestamp fails the whole array: parse field by field
+    column = np.empty(len(values), dtype="datetime64[s]")
+    for i, item in enumerate(json_data):
+        column[i], bad = _parse_timestamp(item.get("timestamp"))
+        malformed[i] |= bad
+    return column
+
+
+def _float_column(json_data: list, field: str, malformed: np.ndarray) -> np.ndarray:
+    values = [item.get(field) for item in json_data]
+    try:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    column = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        column[i], bad = _parse_float(value)
+        malformed[i] |= bad
+    return column
+
+
+def to_columns(json_data: list) -> dict:
+    """Convert segment records to read-only numpy columns.
+
+    Args:
+        json_data : list : List of segment records (``dps_analysis`` schema).
+
+    Returns:
+        dict : Mapping with keys
+            "timestamp" (datetime64[s], NaT when missing),
+            one float64 column per entry of FLOAT_FIELDS (NaN when missing),
+            "rating" (int8, 1-7 for A-G, 0 when missing),
+            "label" (int32 code of the dominant label, -1 when missing),
+            "labels" (tuple of label names indexed by the codes),
+            "malformed" (bool, True where a field could not be parsed; the
+            field is then NaT, NaN, 0 or -1 like a missing one).
+    """
+    malformed = np.array([not isinstance(item, dict) for item in json_data], dtype=bool)
+    if malformed.any():
+        json_data = [item if isinstance(item, dict) else {} for item in json_data]
+
+    columns = {"timestamp": _timestamp_column(json_data, malformed)}
+    for name, field in FLOAT_FIELDS.items():
+        columns[name] = _float_column(json_data, field, malformed)
+
+    ratings = np.zeros(len(json_data), dtype=np.int8)
+    for i, item in enumerate(json_data):
+        rating = item.get("LAeq_rating")
+        if isinstance(rating, str):
+            ratings[i] = RATING_LETTERS.find(rating) + 1
+        elif rating is not None:
+            malformed[i] = True
+    columns["rating"] = ratings
+
+    vocabulary = {}
+    codes = np.empty(len(json_data), dtype=np.int32)
+    for i, item in enumerate(json_data):
+        try:
+            label = dominant_label(item)
+        except (AttributeError, KeyError, TypeError):
+            label = None
+            malformed[i] = True
+        if label is not None and not isinstance(label, str):
+            label = None
+            malformed[i] = True
+        codes[i] = -1 if label is None else vocabulary.setdefault(label, len(vocabulary))
+    columns["label"] = codes
+    columns["malformed"] = malformed
+
+    for array in columns.values():
+        array.flags.writeable = False
+    columns["labels"] = tuple(vocabulary)
+
+    return columns
+
+
+def hour_of_day(timestamps: np.ndarray) -> np.ndarray:
+    """Return the hour (0-23) of datetime64 timestamps."""
+    return (timestamps.astype("datetime64[h]") - timestamps.astype("datetime64[D]")).astype(np.int64)
+
+
+def labels_by_hour(columns: dict) -> dict:
+    """Return the distinct dominant labels of each hour ("HH") of timestamped columns.
+
+    Hours and their labels are in order of first appearance, as in
+    ``json_utils.get_noise_type_by_hour``; a missing label is None.
+    """
+    hours = hour_of_day(columns["timestamp"])
+    names = columns["labels"] + (None,)
+    # One key per (hour, label) pair; code -1 (missing) maps to the trailing None
+    _, first = np.unique(hours * len(names) + columns["label"] + 1, return_index=True)
+    result = {}
+    for row in np.sort(first):
+        result.setdefault(f"{hours[row]:02d}", []).append(names[columns["label"][row]])
+    return result
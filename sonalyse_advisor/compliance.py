@@ -0,0 +1,210 @@
+"""Compliance of captures with the WHO environmental noise guidelines.
+
+``data/OMS_guide.txt`` is parsed once into a table of guideline values
+(environment, indicator, period, limit). ``evaluate_compliance`` then
+computes the indicators of every room (Lden, Lnight, LAeq,24h, LAmax) and
+the minutes spent above each limit, per clock hour, with a single pass of
+``np.bincount`` over all the segments of all the rooms.
+
+Lden and Lnight use the periods of the European noise directive: day
+07-19h, evening 19-23h (+5 dB) and night 23-07h (+10 dB). A night belongs to
+the date it starts on. The WHO values target outdoor exposure, so comparing
+them with indoor measurements is indicative.
+"""
+
+import functools
+import re
+
+import numpy as np
+
+from sonalyse_advisor.columnar import hour_of_day
+from sonalyse_advisor.resampling import infer_step
+
+OMS_GUIDE_PATH = "data/OMS_guide.txt"
+
+# Indicator -> period it is evaluated on.
+INDICATOR_PERIODS = {"Lden": "24h", "Lnight": "night", "LAeq,24h": "24h", "LAmax": "event"}
+INDICATORS = tuple(INDICATOR_PERIODS)
+
+# Day / evening / night period of each clock hour, with its penalty (dB) and weight (hours).
+DEN_PERIOD = np.array([2] * 7 + [0] * 12 + [1] * 4 + [2])
+DEN_PENALTY_DB = np.array([0.0, 5.0, 10.0])
+DEN_HOURS = np.array([12, 4, 8])
+NIGHT_PERIOD = 2
+NIGHT_END_HOUR = 7
+
+SECTION_PATTERN = re.compile(r"^Bruit dû (?:aux|au|à la|à l') ?(.+)$", re.MULTILINE)
+LIMIT_PATTERN = re.compile(r"à moins de (\d+(?:[.,]\d+)?) (?:décibels \(dB\)|dB) (Lden|Lnight|LAeq,24h|LAmax)")
+
+
+def parse_oms_guide(text: str) -> list:
+    """Extract the guideline values of the WHO guide text.
+
+    Returns:
+        list : [{"environment": "trafic routier", "indicator": "Lden",
+            "period": "24h", "limit_dB": 53.0}] in the order of the guide.
+    """
+    sections = list(SECTION_PATTERN.finditer(text))
+    table = []
+    for i, section in enumerate(sections):
+        end = sections[i + 1].start() if i + 1 < len(sections) else len(text)
+        body = " ".join(text[section.end():end].split())
+        for limit, indicator in LIMIT_PATTERN.findall(body):
+            table.append({
+                "environment": section.group(1).strip(),
+                "indicator": indicator,
+                "period": INDICATOR_PERIODS[indicator],
+                "limit_dB": float(limit.replace(",", ".")),
+            })
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _load_oms_table(path: str) -> tuple:
+    with open(path, "r") as file:
+        return tuple(parse_oms_guide(file.read()))
+
+
+def load_oms_table(path: str = OMS_GUIDE_PATH) -> list:
+    """Guideline table of the WHO guide, parsed once per process."""
+    return [dict(row) for row in _load_oms_table(path)]
+
+
+def _leq(energy: np.ndarray, count: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 0, 10 * np.log10(energy / count), np.nan)
+
+
+def _lden(energy: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """Lden from per-period energy sums and counts (last axis: day, evening, night)."""
+    period_leq = _leq(energy, count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lden = 10 * np.log10((DEN_HOURS * 10 ** ((period_leq + DEN_PENALTY_DB) / 10)).sum(axis=-1) / 24)
+    return np.where((count > 0).all(axis=-1), lden, np.nan)
+
+
+def _round(value):
+    return None if not np.isfinite(value) else round(float(value), 1)
+
+
+def evaluate_compliance(rooms: dict, table: list = None) -> dict:
+    """Evaluate every room against the guideline table.
+
+    Args:
+        rooms : dict : Room name -> columns from ``columnar.to_columns``.
+        table : list : Guideline rows from ``load_oms_table`` (default).
+
+    Returns:
+        dict : Room name -> {"indicators": {"Lden": 47.2, ...} over the whole
+            capture, "checks": [one per guideline row with "value_dB",
+            "compliant", "days_evaluated", "days_exceeding",
+            "exceedance_minutes" and "exceedance_by_hour" ("HH" -> minutes)]}.
+    """
+    table = load_oms_table() if table is None else table
+    names = list(rooms)
+    n_rooms, n_rows = len(names), len(table)
+
+    timestamps, levels, maxima, room_index, minutes = [], [], [], [], []
+    for i, name in enumerate(names):
+        columns = rooms[name]
+        valid = ~np.isnat(columns["timestamp"]) & ~np.isnan(columns["average_dB"])
+        timestamps.append(columns["timestamp"][valid])
+        levels.append(columns["average_dB"][valid])
+        maxima.append(columns["max_dB"][valid])
+        room_index.append(np.full(valid.sum(), i))
+        minutes.append(infer_step(columns["timestamp"]) / 60)
+    timestamps = np.concatenate(timestamps) if names else np.array([], dtype="datetime64[s]")
+    levels, maxima = np.concatenate(levels or [[]]), np.concatenate(maxima or [[]])
+    room_index = np.concatenate(room_index or [[]]).astype(np.int64)
+    segment_minutes = np.asarray(minutes)[room_index] if names else np.array([])
+
+    hours = hour_of_day(timestamps)
+    period = DEN_PERIOD[hours]
+    # Date of the day the night started on, so that 23h-07h stays one night.
+    days, day_index = np.unique((timestamps - np.timedelta64(NIGHT_END_HOUR, "h")).astype("datetime64[D]"),
+                                return_inverse=True)
+    n_days = len(days)
+    energy = 10 ** (levels / 10)
+
+    # Energy and count per (room, day, period), then per room and per room/day.
+    key = (room_index * n_days + day_index) * 3 + period
+    size = n_rooms * n_days * 3
+    energy_rdp = np.bincount(key, weights=energy, minlength=size).reshape(n_rooms, n_days, 3)
+    count_rdp = np.bincount(key, minlength=size).reshape(n_rooms, n_days, 3)
+    maxima_rd = np.full(n_rooms * n_days, -np.inf)
+    np.fmax.at(maxima_rd, room_index * n_days + day_index, maxima)
+    maxima_rd = maxima_rd.reshape(n_rooms, n_days)
+
+    daily = {
+        "Lden": _lden(energy_rdp, count_rdp),
+        "Lnight": _leq(energy_rdp[..., NIGHT_PERIOD], count_rdp[..., NIGHT_PERIOD]),
+        "LAeq,24h": _leq(energy_rdp.sum(axis=-1), count_rdp.sum(axis=-1)),
+        "LAmax": np.where(np.isfinite(maxima_rd), maxima_rd, np.nan),
+    }
+    overall = {
+        "Lden": _lden(energy_rdp.sum(axis=1), count_rdp.sum(axis=1)),
+        "Lnight": _leq(energy_rdp[..., NIGHT_PERIOD].sum(axis=1), count_rdp[..., NIGHT_PERIOD].sum(axis=1)),
+        "LAeq,24h": _leq(energy_rdp.sum(axis=(1, 2)), count_rdp.sum(axis=(1, 2))),
+        "LAmax": np.nanmax(np.where(np.isfinite(maxima_rd), maxima_rd, np.nan), axis=1, initial=-np.inf)
+        if n_days else np.full(n_rooms, np.nan),
+    }
+
+    # Segment value compared with the limit of each indicator, and where it applies.
+    segment_values = {
+        "Lden": levels + DEN_PENALTY_DB[period],
+        "Lnight": np.where(period == NIGHT_PERIOD, levels, np.nan),
+        "LAeq,24h": levels,
+        "LAmax": maxima,
+    }
+    indicator_index = np.array([INDICATORS.index(row["indicator"]) for row in table], dtype=np.int64)
+    limits = np.array([row["limit_dB"] for row in table])
+    values = np.stack([segment_values[name] for name in INDICATORS]) if len(timestamps) else np.empty((4, 0))
+    row, segment = np.nonzero(values[indicator_index] >= limits[:, None])
+    exceedance = np.bincount(
+        (row * n_rooms + room_index[segment]) * 24 + hours[segment],
+        weights=segment_minutes[segment],
+        minlength=n_rows * n_rooms * 24,
+    ).reshape(n_rows, n_rooms, 24)
+
+    report = {}
+    for r, name in enumerate(names):
+        checks = []
+        for k, guideline in enumerate(table):
+            indicator = guideline["indicator"]
+            value = overall[indicator][r]
+            per_day = daily[indicator][r]
+            evaluated = ~np.isnan(per_day)
+            checks.append({
+                **guideline,
+                "value_dB": _round(value),
+                "compliant": None if np.isnan(value) else bool(value < guideline["limit_dB"]),
+                "days_evaluated": int(evaluated.sum()),
+                "days_exceeding": int((per_day[evaluated] >= guideline["limit_dB"]).sum()),
+                "exceedance_minutes": round(float(exceedance[k, r].sum()), 1),
+                "exceedance_by_hour": {
+                    f"{hour:02d}": round(float(exceedance[k, r, hour]), 1)
+                    for hour in np.flatnonzero(exceedance[k, r])
+                },
+            })
+        report[name] = {
+            "indicators": {indicator: _round(overall[indicator][r]) for indicator in INDICATORS},
+            "checks": checks,
+        }
+    return report
+
+
+def compliance_summary(room_report: dict) -> list:
+    """One French sentence per guideline, for the PDF and the dashboard."""
+    sentences = []
+    for check in room_report["checks"]:
+        label = f"{check['indicator']} ({check['environment']}, seuil OMS {check['limit_dB']:.0f} dB)"
+        if check["compliant"] is None:
+            sentences.append(f"{label} : non évaluable sur cette capture.")
+            continue
+        status = "respecté" if check["compliant"] else "dépassé"
+        sentence = f"{label} : {check['value_dB']:.1f} dB, seuil {status}"
+        if check["exceedance_minutes"]:
+            sentence += (f" ; {check['exceedance_minutes']:.0f} min au-dessus du seuil, "
+                         f"{check['days_exceeding']}/{check['days_evaluated']} jour(s) en dépassement")
+        sentences.append(sentence + ".")
+    return sentences
@@ -1 +1,36 @@
-MODEL = "openai/gpt-oss-120b"
\ No newline at end of file
+MODEL = "openai/gpt-oss-120b"
+FAST_MODEL = "llama-3.1-8b-instant"
+LOCAL_MODEL = "local"  # rule-based report of recommendations.py, no request
+
+# Grade thresholds (see grading.py): JSON file shaped like grading.DEFAULT_THRESHOLDS,
+# None to use the built-in table.
+GRADE_THRESHOLDS_PATH = None
+
+# Generate the report as parallel per-section requests (see interpret_json_sections).
+SECTIONED_REPORT = True
+
+# Model routing (see model_router.py): each task tries its models in order
+# with its own timeout per request and retries. "deadline" bounds the time
+# spent on the remote models of the route (attempts, retries and backoff);
+# past it the route answers with the next local model. Short tasks go to the
+# fast model, the recommendations to the large one; LOCAL_MODEL ends every chain.
+MODEL_ROUTES = {
+    "resume": {"models": (FAST_MODEL, MODEL, LOCAL_MODEL), "timeout": 15, "retries": 1, "deadline": 25},
+    "faiblesses": {"models": (MODEL, FAST_MODEL, LOCAL_MODEL), "timeout": 45, "retries": 2, "deadline": 60},
+    "recommandations": {"models": (MODEL, LOCAL_MODEL), "timeout": 60, "retries": 3, "deadline": 90},
+    "a_retenir": {"models": (FAST_MODEL, MODEL, LOCAL_MODEL), "timeout": 15, "retries": 1, "deadline": 25},
+    "report": {"models": (MODEL, LOCAL_MODEL), "timeout": 60, "retries": 3, "deadline": 90},
+}
+
+# USD per million (prompt, completion) tokens, for the cost accounting.
+MODEL_PRICES_PER_MTOK = {
+    MODEL: (0.15, 0.75),
+    FAST_MODEL: (0.05, 0.08),
+}
+
+# LLM client (see llm_client.py)
+LLM_TIMEOUT_SECONDS = 60
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 20
+LLM_HEDGE = False  # send a second request when the first exceeds the p95 latency
@@ -0,0 +1,169 @@
+"""A-G acoustic grades computed directly from Leq.
+
+Grades come from a threshold table indexed by room type and period
+(day / night): each row lists the upper Leq bound of grades A to F, anything
+louder is G. Segments are graded in one ``np.searchsorted`` pass per period
+and the grades are counted per hour, per day and per period with
+``np.bincount``.
+
+The table can be replaced by a JSON file with the same structure, set as
+``config.GRADE_THRESHOLDS_PATH`` (see ``load_threshold_table``).
+"""
+
+import functools
+import json
+import unicodedata
+
+import numpy as np
+
+from sonalyse_advisor.baseline import NIGHT_HOURS, energetic_mean
+from sonalyse_advisor.columnar import hour_of_day
+
+GRADE_LETTERS = "ABCDEFG"
+PERIODS = ("day", "night")
+
+# Upper Leq bound (dB) of grades A to F for each room type and period.
+DEFAULT_THRESHOLDS = {
+    "chambre": {"day": [30, 35, 40, 45, 50, 55], "night": [25, 30, 35, 40, 45, 50]},
+    "salon": {"day": [35, 40, 45, 50, 55, 60], "night": [30, 35, 40, 45, 50, 55]},
+    "cuisine": {"day": [40, 45, 50, 55, 60, 65], "night": [35, 40, 45, 50, 55, 60]},
+    "salle de bain": {"day": [40, 45, 50, 55, 60, 65], "night": [35, 40, 45, 50, 55, 60]},
+    "toilettes": {"day": [40, 45, 50, 55, 60, 65], "night": [35, 40, 45, 50, 55, 60]},
+    "default": {"day": [35, 40, 45, 50, 55, 60], "night": [30, 35, 40, 45, 50, 55]},
+}
+
+
+def normalize_room_type(room_type) -> str:
+    """Normalize a ``pieces[].type`` value ("Chambre", "salle de bain", ...)."""
+    if not room_type:
+        return "default"
+    text = unicodedata.normalize("NFKD", str(room_type)).encode("ascii", "ignore").decode()
+    return " ".join(text.lower().split())
+
+
+def load_threshold_table(path: str) -> dict:
+    """Load a threshold table from a JSON file shaped like DEFAULT_THRESHOLDS."""
+    with open(path, "r") as file:
+        table = json.load(file)
+    for room_type, periods in table.items():
+        for period in PERIODS:
+            bounds = periods[period]
+            if len(bounds) != len(GRADE_LETTERS) - 1 or sorted(bounds) != list(bounds):
+                raise ValueError(f"Seuils invalides pour {room_type}/{period} : {bounds}")
+    table = {normalize_room_type(k): v for k, v in table.items()}
+    if "default" not in table:
+        raise ValueError("La table de seuils doit définir une entrée \"default\"")
+    return table
+
+
+@functools.lru_cache(maxsize=1)
+def _configured_table(path: str) -> dict:
+    return load_threshold_table(path) if path else DEFAULT_THRESHOLDS
+
+
+def configured_table() -> dict:
+    """Threshold table of ``config.GRADE_THRESHOLDS_PATH``, DEFAULT_THRESHOLDS when it is not set."""
+    from sonalyse_advisor.config import GRADE_THRESHOLDS_PATH
+
+    return _configured_table(GRADE_THRESHOLDS_PATH)
+
+
+def room_thresholds(room_type=None, table: dict = None) -> dict:
+    """Return the day/night bounds for a room type, falling back to "default".
+
+    Args:
+        table : dict : Threshold table, ``configured_table()`` when omitted.
+    """
+    table = table or configured_table()
+    return table.get(normalize_room_type(room_type), table["default"])
+
+
+def grade_levels(levels_db: np.ndarray, is_night: np.ndarray, room_type=None, table: dict = None) -> np.ndarray:
+    """Grade each Leq value.
+
+    Returns:
+        np.ndarray : int8 grade index (0 = A ... 6 = G), -1 where the level is NaN.
+    """
+    bounds = room_thresholds(room_type, table)
+    grades = np.empty(len(levels_db), dtype=np.int8)
+    for period, mask in (("day", ~is_night), ("night", is_night)):
+        grades[mask] = np.searchsorted(np.asarray(bounds[period], dtype=np.float64), levels_db[mask], side="left")
+    grades[np.isnan(levels_db)] = -1
+    return grades
+
+
+def grade_letter(level_db: float, period: str, room_type=None, table: dict = None) -> str:
+    """Letter grade of a single Leq for ``period`` ("day" or "night")."""
+    if level_db is None or np.isnan(level_db):
+        return "N/A"
+    bounds = room_thresholds(room_type, table)[period]
+    return GRADE_LETTERS[int(np.searchsorted(bounds, level_db, side="left"))]
+
+
+def overall_grade(period_grades: dict) -> str:
+    """The overall grade is the worst of the day and night grades."""
+    known = [g for g in period_grades.values() if g in GRADE_LETTERS]
+    return max(known, key=GRADE_LETTERS.index) if known else "N/A"
+
+
+def _distribution(index: np.ndarray, grades: np.ndarray, size: int) -> np.ndarray:
+    """Percentage of each grade per group, shape (size, 7)."""
+    counts = np.bincount(index * len(GRADE_LETTERS) + grades, minlength=size * len(GRADE_LETTERS))
+    counts = counts.reshape(size, len(GRADE_LETTERS))
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, counts / totals * 100, 0.0)
+
+
+def _as_dict(labels, percentages: np.ndarray) -> dict:
+    return {
+        label: {letter: round(float(p), 1) for letter, p in zip(GRADE_LETTERS, row)}
+        for label, row in zip(labels, percentages)
+    }
+
+
+def grade_report(columns: dict, room_type=None, table: dict = None) -> dict:
+    """Grade a capture and its grade distributions.
+
+    Args:
+        columns : dict : Columns from ``columnar.to_columns``.
+        room_type : str : ``pieces[].type`` of the measured room.
+        table : dict : Threshold table, ``configured_table()`` when omitted.
+
+    Returns:
+        dict : "grade" (worst of the period grades), "period_grades" and
+            "leq_dB" per period, and "distribution" with the percentage of
+            segments in each grade "hourly" ("HH"), "daily" ("YYYY-MM-DD")
+            and per "period".
+    """
+    timestamps = columns["timestamp"]
+    levels = columns["average_dB"]
+    valid = ~np.isnat(timestamps) & ~np.isnan(levels)
+    timestamps, levels = timestamps[valid], levels[valid]
+
+    hours = hour_of_day(timestamps)
+    is_night = np.isin(hours, NIGHT_HOURS)
+    grades = grade_levels(levels, is_night, room_type, table)
+
+    leq = {
+        "day": energetic_mean(levels[~is_night]) if (~is_night).any() else np.nan,
+        "night": energetic_mean(levels[is_night]) if is_night.any() else np.nan,
+    }
+    period_grades = {p: grade_letter(leq[p], p, room_type, table) for p in PERIODS}
+
+    days, day_index = np.unique(timestamps.astype("datetime64[D]"), return_inverse=True)
+    present_hours = np.unique(hours)
+
+    return {
+        "grade": overall_grade(period_grades),
+        "period_grades": period_grades,
+        "leq_dB": {p: None if np.isnan(v) else round(float(v), 1) for p, v in leq.items()},
+        "distribution": {
+            "hourly": _as_dict(
+                [f"{h:02d}" for h in present_hours],
+                _distribution(hours, grades, 24)[present_hours],
+            ),
+            "daily": _as_dict([str(d) for d in days], _distribution(day_index, grades, len(days))),
+            "period": _as_dict(PERIODS, _distribution(is_night.astype(np.int64), grades, 2)),
+        },
+    }
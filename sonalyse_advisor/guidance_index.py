@@ -0,0 +1,251 @@
+"""Offline BM25 index over the guidance documents sent to the model.
+
+The reference texts (``data/OMS_guide.txt`` and every ``data/guidance/*.txt``)
+are cut into passages: one paragraph each, prefixed with the heading of its
+section and split further when longer than ``CHUNK_CHARS``. The index
+(passages, document frequencies, postings) is built once and persisted in
+``.guidance_index/index.json``, keyed by a hash of the documents, and rebuilt
+only when a document changes.
+
+``relevant_passages`` turns the facts of a room (dominant source categories,
+night or day exceedances of the WHO values, room type) into a query and
+returns the best passages within a character budget, so the prompt stays the
+same size however many documents are indexed.
+
+Usage:
+    python -m sonalyse_advisor.guidance_index "trafic routier nuit sommeil"
+"""
+
+import argparse
+import functools
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+GUIDANCE_PATHS = ("data/OMS_guide.txt",)
+GUIDANCE_DIR = "data/guidance"
+INDEX_PATH = ".guidance_index/index.json"
+CHUNK_CHARS = 900
+MAX_PASSAGES = 4
+MAX_EXCERPT_CHARS = 2400
+BM25_K1 = 1.5
+BM25_B = 0.75
+INDEX_VERSION = 1
+
+STOPWORDS = frozenset(
+    "a au aux avec ce ces cette dans de des du elle en est et etre il ils la le les leur lui mais ne nous "
+    "on ou par pas plus pour qu que qui sa se ses son sont sur un une vous d l s n c y a car cet entre "
+    "aussi ainsi dont sous sans".split()
+)
+
+# Source category (see recommendations.CATEGORY_KEYWORDS) -> query terms.
+CATEGORY_TERMS = {
+    "circulation": "trafic routier ferroviaire aérien circulation",
+    "voix": "loisirs voisinage",
+    "musique": "loisirs musique sonorisée",
+    "pas et chocs": "voisinage",
+    "travaux": "chantier travaux",
+    "équipements": "éoliennes équipements",
+    "animaux": "",
+    "autres": "",
+}
+# WHO indicator exceeded -> query terms of its period.
+INDICATOR_TERMS = {
+    "Lnight": "nocturne nuit sommeil Lnight",
+    "Lden": "exposition moyenne Lden santé",
+    "LAeq,24h": "moyenne LAeq,24h",
+    "LAmax": "pics LAmax",
+}
+ROOM_TERMS = {"chambre": "sommeil nocturne"}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+SENTENCE_PATTERN = re.compile(r"(?<=[.;])\s+")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase, accent-free word stems without stopwords."""
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token in STOPWORDS:
+            continue
+        # Plural and feminine forms share the stem of the singular
+        if len(token) > 4 and token[-1] in "sx":
+            token = token[:-1]
+        if len(token) > 4 and token.endswith("e"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _is_heading(line: str) -> bool:
+    return 0 < len(line) <= 80 and line[-1] not in ".,;:" and not line.startswith("http")
+
+
+def chunk_document(text: str, source: str) -> list:
+    """Cut a document into passages.
+
+    Returns:
+        list : [{"source", "title", "text"}] in the order of the document.
+    """
+    passages, title = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in paragraph.strip().splitlines() if line.strip()]
+        if not lines or all(line.startswith("http") for line in lines):
+            continue
+        while lines and _is_heading(lines[0]):
+            # "Bruit dû au trafic routier" / "Recommandation" : only the first line names the section
+            if lines[0].startswith("Recommandation"):
+                lines = lines[1:]
+                continue
+            title = lines.pop(0)
+        body = " ".join(lines)
+        if not body:
+            continue
+        chunk = ""
+        for sentence in SENTENCE_PATTERN.split(body):
+            if chunk and len(chunk) + len(sentence) > CHUNK_CHARS:
+                passages.append({"source": source, "title": title, "text": chunk})
+                chunk = ""
+            chunk = f"{chunk} {sentence}".strip()
+        passages.append({"source": source, "title": title, "text": chunk})
+    return passages
+
+
+def guidance_paths() -> list:
+    return list(GUIDANCE_PATHS) + sorted(glob.glob(os.path.join(GUIDANCE_DIR, "*.txt")))
+
+
+def documents_digest(paths: list) -> str:
+    digest = hashlib.sha1(f"{INDEX_VERSION}:{CHUNK_CHARS}".encode())
+    for path in paths:
+        digest.update(path.encode())
+        with open(path, "rb") as file:
+            digest.update(hashlib.sha1(file.read()).digest())
+    return digest.hexdigest()
+
+
+def build_index(paths: list) -> dict:
+    """BM25 index of the passages of ``paths``.
+
+    Returns:
+        dict : "passages", "lengths" (tokens per passage), "postings"
+            (term -> [[passage, term frequency]]) and "average_length".
+    """
+    passages = []
+    for path in paths:
+        with open(path, "r") as file:
+            passages += chunk_document(file.read(), os.path.basename(path))
+
+    postings, lengths = {}, []
+    for i, passage in enumerate(passages):
+        # The section title counts in the passage: it names the source of noise
+        counts = Counter(tokenize(f"{passage['title']} {passage['text']}"))
+        lengths.append(sum(counts.values()))
+        for term, count in counts.items():
+            postings.setdefault(term, []).append([i, count])
+    return {
+        "passages": passages,
+        "lengths": lengths,
+        "postings": postings,
+        "average_length": sum(lengths) / len(lengths) if lengths else 0.0,
+    }
+
+
+@functools.lru_cache(maxsize=4)
+def _load_index(index_path: str, digest: str, paths: tuple) -> dict:
+    if os.path.exists(index_path):
+        with open(index_path, "r") as file:
+            index = json.load(file)
+        if index.get("digest") == digest:
+            return index
+    index = dict(build_index(list(paths)), digest=digest)
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    # Unique temporary name: several processes may rebuild the index at once (see service.py)
+    tmp_path = f"{index_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(index, file, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+    return index
+
+
+def load_index(paths: list = None, index_path: str = INDEX_PATH) -> dict:
+    """Persisted index of the guidance documents, rebuilt when one of them changes."""
+    paths = tuple(paths or guidance_paths())
+    return _load_index(index_path, documents_digest(paths), paths)
+
+
+def search(query: str, index: dict = None, limit: int = MAX_PASSAGES) -> list:
+    """Best passages for ``query`` by BM25 score.
+
+    Returns:
+        list : [(score, passage)] by decreasing score, positive scores only.
+    """
+    index = index or load_index()
+    n_passages = len(index["passages"])
+    scores = Counter()
+    for term in set(tokenize(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n_passages - len(postings) + 0.5) / (len(postings) + 0.5))
+        for i, frequency in postings:
+            norm = 1 - BM25_B + BM25_B * index["lengths"][i] / index["average_length"]
+            scores[i] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+    return [(round(score, 3), index["passages"][i]) for i, score in scores.most_common(limit)]
+
+
+def room_query(all_data: dict, room_type: str = None) -> str:
+    """Query describing the situation of a room: sources, exceeded indicators and room type."""
+    from sonalyse_advisor.grading import normalize_room_type
+    from sonalyse_advisor.recommendations import category_shares
+
+    terms = ["recommandation"]
+    for category in list(category_shares(all_data["daily"]["noise_daily_percentage"]))[:2]:
+        terms.append(CATEGORY_TERMS.get(category, ""))
+    exceeded = {check["indicator"] for check in all_data.get("oms_compliance", {}).get("checks", [])
+                if check["compliant"] is False}
+    terms += [INDICATOR_TERMS[indicator] for indicator in INDICATOR_TERMS if indicator in exceeded]
+    terms.append(ROOM_TERMS.get(normalize_room_type(room_type), ""))
+    return " ".join(term for term in terms if term)
+
+
+def relevant_passages(all_data: dict, room_type: str = None, max_chars: int = MAX_EXCERPT_CHARS,
+                      index: dict = None) -> list:
+    """Passages of the guidance documents relevant to a room, within ``max_chars``.
+
+    Args:
+        all_data : dict : Output of ``agent_backend.prompt_data``.
+
+    Returns:
+        list : [{"source", "title", "text"}] by decreasing relevance.
+    """
+    selected, size = [], 0
+    for _, passage in search(room_query(all_data, room_type), index, limit=MAX_PASSAGES):
+        if size + len(passage["text"]) > max_chars:
+            break
+        selected.append(passage)
+        size += len(passage["text"])
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche dans les documents de référence (BM25)")
+    parser.add_argument("query")
+    parser.add_argument("--limit", type=int, default=MAX_PASSAGES)
+    args = parser.parse_args()
+
+    index = load_index()
+    print(f"📚 {len(index['passages'])} passages indexés ({', '.join(guidance_paths())})")
+    for score, passage in search(args.query, index, args.limit):
+        print(f"\n[{score}] {passage['source']} — {passage['title']}\n{passage['text']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,132 @@
+import io
 import json
 
+from sonalyse_advisor.columnar import dominant_label
+from sonalyse_advisor.grading import grade_report
+from sonalyse_advisor.resampling import average_level, coverage_summary, hourly_profile, resample
+from sonalyse_advisor.validation import clean_capture
+
+
+# Leading bytes of the compressed formats accepted by load_json.
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+CHUNK_CHARS = 1 << 20
+
+
+def detect_compression(json_filename: str):
+    """Return "gzip", "xz" or "zstd" from the magic bytes of a file, None if plain."""
+    with open(json_filename, "rb") as file:
+        head = file.read(6)
+    return next((name for magic, name in COMPRESSION_MAGIC.items() if head.startswith(magic)), None)
+
+
+def open_json_stream(json_filename: str):
+    """Open a plain or compressed JSON file as a text stream, decompressing on the fly."""
+    compression = detect_compression(json_filename)
+    if compression is None:
+        return open(json_filename, "r")
+    if compression == "gzip":
+        import gzip
+
+        return gzip.open(json_filename, "rt")
+    if compression == "xz":
+        import lzma
+
+        return lzma.open(json_filename, "rt")
+
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(f"{json_filename} est compressé en zstd : installez le paquet zstandard") from e
+    raw = open(json_filename, "rb")
+    return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+
+
+def open_json_bytes(raw):
+    """Open a binary stream (e.g. an upload) as text, decompressing it on the fly.
+
+    The compression is detected from the first bytes like ``detect_compression``.
+    """
+    raw = raw if hasattr(raw, "peek") else io.BufferedReader(raw)
+    head = raw.peek(6)[:6]
+    compression = next((name for magic, name in COMPRESSION_MAGIC.items() if head.startswith(magic)), None)
+    if compression == "gzip":
+        import gzip
+
+        raw = gzip.GzipFile(fileobj=raw)
+    elif compression == "xz":
+        import lzma
+
+        raw = lzma.LZMAFile(raw)
+    elif compression == "zstd":
+        import zstandard
+
+        raw = zstandard.ZstdDecompressor().stream_reader(raw)
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def iter_json_array(stream, chunk_chars: int = CHUNK_CHARS, buffer: str = None):
+    """Yield the elements of a top-level JSON array read from a text stream.
+
+    Only about ``chunk_chars`` characters of text are held at a time, so a
+    compressed capture is never fully decompressed in memory.
+
+    Args:
+        stream : text stream : Positioned at the start of the array.
+        chunk_chars : int : Characters read per chunk.
+        buffer : str : Text already read from the stream, if any.
+    """
+    # Share key strings between elements, as json.load does within one document
+    keys = {}
+    decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {keys.setdefault(k, k): v for k, v in pairs})
+    buffer = (stream.read(chunk_chars) if buffer is None else buffer).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Le fichier ne contient pas un tableau JSON")
+    position = 1
+    eof = False
+    while True:
+        # Skip whitespace and separators before the next element
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+            # Only trust an element followed by a delimiter: a number cut by
+            # the end of the chunk (e.g. "2." of "2.5") would parse too early
+            if eof or (end < len(buffer) and buffer[end] in " \t\r\n,]"):
+                yield element
+                position = end
+                continue
+        except json.JSONDecodeError:
+            if eof:
+                raise
+        chunk = stream.read(chunk_chars)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
 
 def load_json(json_filename: str) -> dict:
-    """Load a JSON file and return its content as a Python object."""
+    """Load a JSON file and return its content as a Python object.
+
+    gzip, xz and zstd files are detected by their magic bytes and decompressed
+    as a stream; top-level arrays (captures) are parsed element by element.
+    """
+
+    if detect_compression(json_filename) is None:
+        with open(json_filename, "r") as file:
+            data = json.load(file)
+        return data
 
-    with open(json_filename, "r") as file:
-        data = json.load(file)
+    with open_json_stream(json_filename) as stream:
+        buffer = stream.read(CHUNK_CHARS)
+        if not buffer.lstrip().startswith("["):
+            return json.loads(buffer + stream.read())
+        data = list(iter_json_array(stream, buffer=buffer))
 
     return data
 
@@ -46,7 +167,7 @@ def json_extract_info(json_data: list) -> tuple:
         }
         dominant_noise = {
             "timestamp": item.get("timestamp"),
-            "dominant_noise_type": item.get("top_5_labels")[0],
+            "dominant_noise_type": dominant_label(item),
         }
         extracted_rating.append(rating)
         extracted_average_median.append(average_median)
@@ -63,31 +184,6 @@ def json_extract_info(json_data: list) -> tuple:
     )
 
 
-def get_average_rating(ratings: list) -> str:
-    """Calculate the average rating from the JSON data.
-
-    Args:
-        ratings : list : List of ratings extracted from JSON data.
-
-    Returns:
-        str : Average rating as a letter (A-G).
-    """
-    rating_values = {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7}
-
-    numeric_ratings = []
-    for rating in ratings:
-        if rating["rating"] in rating_values:
-            numeric_ratings.append(rating_values[rating["rating"]])
-
-    if not numeric_ratings:
-        return "N/A"
-
-    avg_numeric = sum(numeric_ratings) / len(numeric_ratings)
-
-    reverse_ratings = {1: "A", 2: "B", 3: "C", 4: "D", 5: "E", 6: "F", 7: "G"}
-    return reverse_ratings.get(round(avg_numeric), "N/A")
-
-
 def get_noise_type_by_hour(extracted_dominant_noise: list) -> dict:
     """Get noise types grouped by hour.
 
@@ -181,97 +277,35 @@ def get_noise_type_percentage_daily(extracted_dominant_noise: list) -> dict:
     return top_5
 
 
-def get_average_db(extracted_average_median: list) -> float:
-    """Calculate the average dB from the JSON data.
+def gather_all_extracted_data(json_path, room_type: str = None):
+    """Aggregate a capture file, or a list of shard files of the same room.
 
-    Args:
-        extracted_average_median : list : List of average and median dB values extracted from JSON
-    Returns:
-        float : Average dB value.
+    Shards are reduced in parallel and merged (see ``aggregation.aggregate_shards``);
+    the result is the same as for a single file holding all the segments.
     """
-    total_db = 0
-    count = 0
+    if isinstance(json_path, (list, tuple)):
+        from sonalyse_advisor.aggregation import aggregate_shards
 
-    for item in extracted_average_median:
-        avg_db = item.get("average_dB")
-        if avg_db is not None:
-            total_db += avg_db
-            count += 1
+        return aggregate_shards(list(json_path)).to_aggregates(room_type)
+    return gather_extracted_data(load_json(json_path), room_type)
 
-    if count == 0:
-        return 0
 
-    return round(total_db / count, 1)
+def gather_extracted_data(data: list, room_type: str = None, cleaned: tuple = None) -> dict:
+    """Compute the daily and hourly aggregates of already loaded segment records.
 
-def get_db_min_max_peak_by_hour(extracted_average_median: list, extracted_min_max_peak: list) -> dict:
-    """Compute per-hour average, min, max and peak dB from the provided extracts.
+    Invalid segments (see ``validation.clean_capture``) are left out and
+    counted under "quality". Levels, grades and hourly values are computed on
+    the regular time grid of ``resampling.resample`` so that dense bursts and
+    sensor drop-outs do not skew them; the coverage of each hour is reported.
 
     Args:
-        extracted_average_median (list): list of dicts with "timestamp" and "average_dB".
-        extracted_min_max_peak (list): list of dicts with "timestamp", "min_dB", "max_dB", "peak_dB".
-
-    Returns:
-        dict: Mapping hour ("HH") to dict with keys:
-            "average_dB" (float), "min_dB" (float or None), "max_dB" (float or None), "peak_dB" (float or None).
-        Averages are rounded to 1 decimal place; missing values are returned as None.
+        data : list : Segment records.
+        room_type : str : ``pieces[].type`` of the measured room, used by the grade thresholds.
+        cleaned : tuple : ``clean_capture(data)`` when the caller already has it, so the
+            records are validated and converted to columns only once.
     """
-    db_by_hour = {}
-    count_by_hour = {}
-    min_max_peak_by_hour = {}
-
-    for item in extracted_average_median:
-        timestamp = item.get("timestamp")
-        hour = timestamp.split(" ")[1].split(":")[0]
-        avg_db = item.get("average_dB")
+    data, columns, quarantine = cleaned or clean_capture(data)
 
-        if hour not in db_by_hour:
-            db_by_hour[hour] = 0
-            count_by_hour[hour] = 0
-
-        if avg_db is not None:
-            db_by_hour[hour] += avg_db
-            count_by_hour[hour] += 1
-
-    for item in extracted_min_max_peak:
-        timestamp = item.get("timestamp")
-        hour = timestamp.split(" ")[1].split(":")[0]
-        min_dB = item.get("min_dB")
-        max_dB = item.get("max_dB")
-        peak_dB = item.get("peak_dB")
-
-        if hour not in min_max_peak_by_hour:
-            min_max_peak_by_hour[hour] = {
-                "min_dB": None,
-                "max_dB": None,
-                "peak_dB": None,
-            }
-
-        if min_dB is not None:
-            if min_max_peak_by_hour[hour]["min_dB"] is None or min_dB < min_max_peak_by_hour[hour]["min_dB"]:
-                min_max_peak_by_hour[hour]["min_dB"] = min_dB
-
-        if max_dB is not None:
-            if min_max_peak_by_hour[hour]["max_dB"] is None or max_dB > min_max_peak_by_hour[hour]["max_dB"]:
-                min_max_peak_by_hour[hour]["max_dB"] = max_dB
-
-        if peak_dB is not None:
-            if min_max_peak_by_hour[hour]["peak_dB"] is None or peak_dB > min_max_peak_by_hour[hour]["peak_dB"]:
-                min_max_peak_by_hour[hour]["peak_dB"] = peak_dB
-
-    combined_data_by_hour = {}
-    for hour in db_by_hour:
-        average_db = round(db_by_hour[hour] / count_by_hour[hour], 1) if count_by_hour[hour] > 0 else 0
-        combined_data_by_hour[hour] = {
-            "average_dB": average_db,
-            "min_dB": min_max_peak_by_hour.get(hour, {}).get("min_dB"),
-            "max_dB": min_max_peak_by_hour.get(hour, {}).get("max_dB"),
-            "peak_dB": min_max_peak_by_hour.get(hour, {}).get("peak_dB"),
-        }
-
-    return combined_data_by_hour
-
-def gather_all_extracted_data(json_path: str):
-    data = load_json(json_path)
     (
         extracted_rating,
         extracted_dominant_noise,
@@ -280,14 +314,15 @@ def gather_all_extracted_data(json_path: str):
         extracted_background_noise,
     ) = json_extract_info(data)
 
-    average_db = get_average_db(extracted_average_median)
+    grid = resample(columns)
+    average_db = average_level(grid)
     #print("Average dB per day:", average_db)
 
-    average_rating = get_average_rating(extracted_rating)
-    #print("Average Rating daily:", average_rating)
+    grades = grade_report(grid, room_type)
+    #print("Grade daily:", grades["grade"])
 
 
-    get_min_max_peak_hourly = get_db_min_max_peak_by_hour(extracted_average_median, extracted_min_max_peak)
+    get_min_max_peak_hourly = hourly_profile(grid)
 
     noise_percentage = get_noise_type_percentage_daily(extracted_dominant_noise)
     #print("Noise Type daily Percentage :", noise_percentage)
@@ -300,14 +335,24 @@ def gather_all_extracted_data(json_path: str):
     all_data = {
         "daily": {
             "average_daily_db": average_db,
-            "average_daily_rating": average_rating,
+            "average_daily_rating": grades["grade"],
+            "period_grades": grades["period_grades"],
+            "period_leq_dB": grades["leq_dB"],
+            "grade_distribution_per_period": grades["distribution"]["period"],
+            "grade_distribution_per_day": grades["distribution"]["daily"],
             "noise_daily_percentage": noise_percentage,  # Already top 5
         },
         "hourly": {
             "noise_hourly_percentage": noise_percentage_hourly,
             "db_min_max_peak_per_hour": get_min_max_peak_hourly,
+            "grade_distribution_per_hour": grades["distribution"]["hourly"],
+        },
+        "coverage": coverage_summary(grid),
+        "quality": {
+            "segments": quarantine["total"],
+            "rejected_segments": quarantine["rejected"],
+            "rejected_by_reason": quarantine["counts"],
         },
-
     }
     return all_data
 
@@ -0,0 +1,489 @@
+"""Live ingestion of sensor segments.
+
+Sensors push segment records in the ``dps_analysis`` schema (one JSON object
+per line) to a local asyncio TCP endpoint. Each record is appended to an
+on-disk log and folded into running hourly aggregates, one set per source
+(``room`` or ``sensor_id`` of the record) and per day, which are periodically
+written to a snapshot file that the Streamlit dashboard reads directly.
+
+Once the log exceeds ``LOG_MAX_BYTES``, the aggregates are checkpointed and a
+new, empty log is started, so a restart only replays the segments received
+since the last checkpoint.
+
+A record is fully validated before any aggregate changes; a bad record is
+counted by reason and dropped without closing the sensor connection.
+
+Run with:
+    python -m sonalyse_advisor.live_ingest --port 8765 --dir data/live --room-type Chambre
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+from sonalyse_advisor.baseline import NIGHT_HOURS
+from sonalyse_advisor.columnar import FLOAT_FIELDS, dominant_label
+from sonalyse_advisor.grading import grade_letter, overall_grade
+from sonalyse_advisor.validation import DB_RANGES
+
+# Segment log of one checkpoint generation
+LOG_FILENAME = "segments-{}.jsonl"
+LOG_PATTERN = re.compile(r"segments-(\d+)\.jsonl")
+CHECKPOINT_FILENAME = "checkpoint.json"
+SNAPSHOT_FILENAME = "aggregates.json"
+# Log size above which the aggregates are checkpointed and the log restarted.
+LOG_MAX_BYTES = 16 * 1024 * 1024
+# Days of aggregates kept in memory (and in the snapshot) per source.
+KEEP_DAYS = 7
+
+
+def parse_record(item) -> dict:
+    """Check and convert one segment record before it touches any aggregate.
+
+    Returns:
+        dict : "source" (``room`` or ``sensor_id`` of the record, "default"
+            without either), "day" ("YYYY-MM-DD"), "hour" (int), "timestamp",
+            one float or None per column of FLOAT_FIELDS and "label".
+
+    Raises:
+        ValueError : The record is not an object, has no valid timestamp or
+            holds a level that is not a number within DB_RANGES.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("not_an_object")
+    timestamp = item.get("timestamp")
+    if not isinstance(timestamp, str):
+        raise ValueError("missing_timestamp")
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise ValueError("malformed_timestamp") from None
+
+    record = {
+        "source": str(next((item[key] for key in ("room", "sensor_id") if item.get(key) is not None), "default")),
+        "day": moment.strftime("%Y-%m-%d"),
+        "hour": moment.hour,
+        "timestamp": timestamp,
+    }
+    for name, field in FLOAT_FIELDS.items():
+        value = item.get(field)
+        if value is not None:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError("malformed_level")
+            low, high = DB_RANGES[name]
+            if not low <= value <= high:
+                raise ValueError("out_of_range_level")
+            value = float(value)
+        record[name] = value
+
+    try:
+        label = dominant_label(item)
+    except (AttributeError, KeyError, TypeError):
+        raise ValueError("malformed_label") from None
+    if label is not None and not isinstance(label, str):
+        raise ValueError("malformed_label")
+    record["label"] = label
+    return record
+
+
+class HourlyAggregates:
+    """Running per-hour aggregates of one source and one day.
+
+    Buckets are keyed by "HH" like ``resampling.hourly_profile`` so the
+    snapshot of a day has the same shape as ``gather_all_extracted_data``.
+    """
+
+    def __init__(self, room_type: str = None):
+        self.room_type = room_type
+        self.hours = {}
+        self.labels = {}
+        self.segments = 0
+        self.last_timestamp = None
+
+    def _bucket(self, hour: str) -> dict:
+        if hour not in self.hours:
+            self.hours[hour] = {
+                "count": 0,
+                "db_sum": 0.0,
+                "energy_sum": 0.0,
+                "db_count": 0,
+                "min_dB": None,
+                "max_dB": None,
+                "peak_dB": None,
+                "labels": {},
+            }
+        return self.hours[hour]
+
+    def state(self) -> dict:
+        """Running sums of the aggregates, as stored in a checkpoint."""
+        return {"hours": self.hours, "labels": self.labels, "segments": self.segments,
+                "last_timestamp": self.last_timestamp}
+
+    @classmethod
+    def from_state(cls, state: dict, room_type: str = None):
+        aggregates = cls(room_type)
+        aggregates.hours = state["hours"]
+        aggregates.labels = state["labels"]
+        aggregates.segments = state["segments"]
+        aggregates.last_timestamp = state["last_timestamp"]
+        return aggregates
+
+    def update(self, record: dict):
+        """Fold one record of ``parse_record`` into the aggregates."""
+        bucket = self._bucket(f"{record['hour']:02d}")
+        bucket["count"] += 1
+        self.segments += 1
+        self.last_timestamp = max(self.last_timestamp or record["timestamp"], record["timestamp"])
+
+        avg_db = record["average_dB"]
+        if avg_db is not None:
+            bucket["db_sum"] += avg_db
+            bucket["energy_sum"] += 10 ** (avg_db / 10)
+            bucket["db_count"] += 1
+
+        for key, better in (("min_dB", min), ("max_dB", max), ("peak_dB", max)):
+            value = record[key]
+            if value is not None:
+                bucket[key] = value if bucket[key] is None else better(bucket[key], value)
+
+        label = record["label"]
+        if label is not None:
+            bucket["labels"][label] = bucket["labels"].get(label, 0) + 1
+            self.labels[label] = self.labels.get(label, 0) + 1
+
+    def to_dict(self) -> dict:
+        """Return a snapshot shaped like ``gather_all_extracted_data``."""
+        db_sum = sum(b["db_sum"] for b in self.hours.values())
+        db_count = sum(b["db_count"] for b in self.hours.values())
+        average_db = round(db_sum / db_count, 1) if db_count else 0
+
+        period_grades = {}
+        period_leq = {}
+        for period, night in (("day", False), ("night", True)):
+            buckets = [b for h, b in self.hours.items() if (int(h) in NIGHT_HOURS) == night and b["db_count"]]
+            energy = sum(b["energy_sum"] for b in buckets)
+            count = sum(b["db_count"] for b in buckets)
+            leq = 10 * math.log10(energy / count) if count else None
+            period_grades[period] = grade_letter(leq, period, self.room_type)
+            period_leq[period] = None if leq is None else round(leq, 1)
+
+        total_labels = sum(self.labels.values())
+        noise_percentage = {
+            label: round(count / total_labels * 100, 1)
+            for label, count in sorted(self.labels.items(), key=lambda x: x[1], reverse=True)[:5]
+        }
+
+        db_per_hour = {}
+        noise_hourly = {}
+        labels_by_hour = {}
+        for hour in sorted(self.hours):
+            bucket = self.hours[hour]
+            db_per_hour[hour] = {
+                "average_dB": round(bucket["db_sum"] / bucket["db_count"], 1) if bucket["db_count"] else 0,
+                "min_dB": bucket["min_dB"],
+                "max_dB": bucket["max_dB"],
+                "peak_dB": bucket["peak_dB"],
+            }
+            if bucket["labels"]:
+                ranked = sorted(bucket["labels"].items(), key=lambda x: x[1], reverse=True)
+                hour_total = sum(bucket["labels"].values())
+                noise_hourly[hour] = {
+                    "noise_type": ranked[0][0],
+                    "percentage": round(ranked[0][1] / hour_total * 100, 1),
+                }
+                labels_by_hour[hour] = [label for label, _ in ranked]
+
+        return {
+            "segments": self.segments,
+            "last_timestamp": self.last_timestamp,
+            "daily": {
+                "average_daily_db": average_db,
+                "average_daily_rating": overall_grade(period_grades),
+                "period_grades": period_grades,
+                "period_leq_dB": period_leq,
+                "noise_daily_percentage": noise_percentage,
+            },
+            "hourly": {
+                "noise_hourly_percentage": noise_hourly,
+                "db_min_max_peak_per_hour": db_per_hour,
+                "labels_by_hour": labels_by_hour,
+            },
+        }
+
+
+class LiveAggregates:
+    """Hourly aggregates of every source (room or sensor), one set per day.
+
+    Only the last ``keep_days`` days of each source are kept in memory.
+    """
+
+    def __init__(self, room_type: str = None, keep_days: int = KEEP_DAYS):
+        self.room_type = room_type
+        self.keep_days = keep_days
+        self.sources = {}
+        self.segments = 0
+
+    def update(self, item) -> dict:
+        """Validate a record, then fold it into the aggregates of its source and day.
+
+        Raises:
+            ValueError : See ``parse_record``; nothing is updated then.
+        """
+        record = parse_record(item)
+        days = self.sources.setdefault(record["source"], {})
+        if record["day"] not in days:
+            if len(days) >= self.keep_days and record["day"] < min(days):
+                raise ValueError("expired_day")
+            days[record["day"]] = HourlyAggregates(self.room_type)
+            for day in sorted(days)[:-self.keep_days]:
+                del days[day]
+        days[record["day"]].update(record)
+        self.segments += 1
+        return record
+
+    def state(self) -> dict:
+        """Running sums of every source and day, as stored in a checkpoint."""
+        return {
+            "segments": self.segments,
+            "sources": {source: {day: aggregates.state() for day, aggregates in days.items()}
+                        for source, days in self.sources.items()},
+        }
+
+    def load_state(self, state: dict):
+        """Restore the running sums of ``state``."""
+        self.segments = state["segments"]
+        self.sources = {
+            source: {day: HourlyAggregates.from_state(day_state, self.room_type) for day, day_state in days.items()}
+            for source, days in state["sources"].items()
+        }
+
+    def to_dict(self) -> dict:
+        """Snapshot: "segments" and, per source and day, the aggregates of ``HourlyAggregates.to_dict``."""
+        return {
+            "segments": self.segments,
+            "sources": {
+                source: {day: days[day].to_dict() for day in sorted(days)}
+                for source, days in sorted(self.sources.items())
+            },
+        }
+
+
+class LiveIngestServer:
+    """Asyncio NDJSON endpoint appending segments to a log and aggregating them.
+
+    Args:
+        directory : str : Folder holding the segment log, the checkpoint and the aggregates snapshot.
+        room_type : str : ``pieces[].type`` whose thresholds grade the live aggregates.
+        snapshot_interval : float : Seconds between two snapshot writes.
+        flush_interval : float : Seconds between two flushes of the segment log.
+        log_max_bytes : int : Log size above which it is restarted after a checkpoint.
+    """
+
+    def __init__(self, directory: str, room_type: str = None, snapshot_interval: float = 1.0,
+                 flush_interval: float = 0.5, log_max_bytes: int = LOG_MAX_BYTES):
+        self.directory = directory
+        self.checkpoint_path = os.path.join(directory, CHECKPOINT_FILENAME)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILENAME)
+        self.room_type = room_type
+        self.snapshot_interval = snapshot_interval
+        self.flush_interval = flush_interval
+        self.log_max_bytes = log_max_bytes
+        self.aggregates = LiveAggregates(room_type)
+        self.rejected = Counter()
+        self.generation = 0
+        self._pending = []
+        self._dirty = False
+        self._log = None
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, LOG_FILENAME.format(self.generation))
+
+    def restore(self):
+        """Rebuild the aggregates after a restart: the checkpoint, then the log written since."""
+        checkpoint = _read_json(self.checkpoint_path)
+        if checkpoint is not None:
+            self.generation = checkpoint["generation"]
+            self.aggregates.load_state(checkpoint["aggregates"])
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r") as file:
+                for line in file:
+                    try:
+                        self.aggregates.update(json.loads(line))
+                    except ValueError:
+                        continue
+        # Logs of another generation are left over from an interrupted rotation
+        for name in os.listdir(self.directory):
+            match = LOG_PATTERN.fullmatch(name)
+            if match and int(match.group(1)) != self.generation:
+                os.remove(os.path.join(self.directory, name))
+        self._dirty = True
+
+    def rotate_log(self):
+        """Checkpoint the aggregates and start a new, empty segment log.
+
+        The checkpoint names the log to replay on top of it, so whatever step
+        a crash interrupts, a restart finds either the old checkpoint and the
+        full old log, or the new checkpoint and the new log.
+        """
+        self.flush_log()
+        self._log.close()
+        old_path = self.log_path
+        self.generation += 1
+        self._log = open(self.log_path, "a")
+        _replace_json(self.checkpoint_path, {"generation": self.generation, "aggregates": self.aggregates.state()})
+        os.remove(old_path)
+
+    def ingest_line(self, line: bytes) -> bool:
+        """Parse, aggregate and queue one NDJSON record for the log."""
+        try:
+            item = json.loads(line)
+        except ValueError:
+            self.rejected["malformed_json"] += 1
+            return False
+        try:
+            self.aggregates.update(item)
+        except ValueError as error:
+            self.rejected[str(error)] += 1
+            return False
+        self._pending.append(json.dumps(item, ensure_ascii=False))
+        self._dirty = True
+        return True
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    self.ingest_line(line)
+                except Exception as error:
+                    # A record must never cost the sensor its connection
+                    self.rejected["error"] += 1
+                    print(f"⚠️ Segment ignoré ({type(error).__name__}: {error}) : {line[:200]!r}")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def flush_log(self):
+        if not self._pending:
+            return
+        self._log.write("\n".join(self._pending) + "\n")
+        self._log.flush()
+        self._pending = []
+
+    def write_snapshot(self):
+        """Atomically replace the aggregates snapshot read by the dashboard."""
+        snapshot = self.aggregates.to_dict()
+        snapshot["rejected"] = sum(self.rejected.values())
+        snapshot["rejected_reasons"] = dict(self.rejected)
+        snapshot["updated_at"] = time.time()
+        _replace_json(self.snapshot_path, snapshot)
+        self._dirty = False
+
+    def checkpoint(self):
+        """Write the snapshot if anything changed, then restart the log once it is too large."""
+        if not self._dirty:
+            return
+        self.write_snapshot()
+        self.flush_log()
+        if self._log.tell() > self.log_max_bytes:
+            self.rotate_log()
+
+    async def _periodic(self, interval: float, action):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                action()
+            except Exception as error:
+                print(f"⚠️ Tâche périodique en échec ({type(error).__name__}: {error})")
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        os.makedirs(self.directory, exist_ok=True)
+        self.restore()
+        self._log = open(self.log_path, "a")
+        server = await asyncio.start_server(self.handle_client, host, port)
+        tasks = [
+            asyncio.create_task(self._periodic(self.flush_interval, self.flush_log)),
+            asyncio.create_task(self._periodic(self.snapshot_interval, self.checkpoint)),
+        ]
+        print(f"📡 Ingestion live sur {host}:{port} -> {self.directory}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.write_snapshot()
+            self.rotate_log()
+            self._log.close()
+
+
+def _replace_json(path: str, data: dict):
+    """Atomically replace a JSON file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def load_snapshot(directory: str):
+    """Return the latest aggregates snapshot of a live directory, or None."""
+    return _read_json(os.path.join(directory, SNAPSHOT_FILENAME))
+
+
+def latest_day(snapshot: dict, source: str = None) -> tuple:
+    """Aggregates of the most recent day of a source of a snapshot.
+
+    Args:
+        snapshot : dict : Output of ``load_snapshot``, None when there is none.
+        source : str : Source to read, the one with the most recent segment by default.
+
+    Returns:
+        tuple : (source, day, aggregates of ``HourlyAggregates.to_dict``), all None without data.
+    """
+    sources = (snapshot or {}).get("sources") or {}
+    if source not in sources:
+        if not sources:
+            return None, None, None
+        source = max(sources, key=lambda s: max(d["last_timestamp"] or "" for d in sources[s].values()))
+    day = max(sources[source])
+    return source, day, sources[source][day]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint d'ingestion live des segments Sonalyze")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dir", default="data/live", help="Dossier du log et des agrégats")
+    parser.add_argument("--room-type", default=None, help="pieces[].type de la pièce mesurée")
+    parser.add_argument("--snapshot-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = LiveIngestServer(args.dir, room_type=args.room_type, snapshot_interval=args.snapshot_interval)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
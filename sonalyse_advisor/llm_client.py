@@ -0,0 +1,175 @@
+"""Long-lived LLM client with timeouts, retries with backoff and hedging.
+
+One Groq client (and its HTTP connection pool) is shared by every call of the
+process. Each call has a timeout. Rate limits, timeouts, connection errors
+and 5xx responses are retried with exponential backoff and jitter, honouring
+``Retry-After``. With hedging enabled, a second identical request is sent
+when the first one exceeds the p95 of recent latencies, and the first answer
+wins.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from sonalyse_advisor.config import (
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_HEDGE,
+    LLM_MAX_RETRIES,
+    LLM_TIMEOUT_SECONDS,
+)
+
+# Latency samples needed before the p95 deadline is trusted for hedging.
+MIN_HEDGE_SAMPLES = 20
+
+
+class LLMClientManager:
+    """Process-wide wrapper around a single Groq client.
+
+    Args:
+        api_key : str : API key, defaults to GROQ_API_KEY.
+        base_url : str : API base URL, defaults to GROQ_BASE_URL (used by the local stub).
+        timeout : float : Per-request timeout in seconds.
+        max_retries : int : Retries after the first attempt.
+        hedge : bool : Send a hedged request after the p95 deadline.
+        max_workers : int : Threads available for hedged requests.
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge: bool = LLM_HEDGE,
+        max_workers: int = 64,
+    ):
+        import groq  # imported lazily: the SDK is heavy and only needed here
+
+        self._errors = groq
+        # Errors a request may end with once its retries are exhausted
+        self.api_errors = (groq.APIError, TimeoutError)
+        self.client = groq.Groq(
+            api_key=api_key or os.environ.get("GROQ_API_KEY"),
+            base_url=base_url or os.environ.get("GROQ_BASE_URL"),
+            timeout=timeout,
+            max_retries=0,  # retries are handled here, with our own backoff
+        )
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def p95_latency(self):
+        """p95 of recent successful request latencies, None until enough samples."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def _request(self, messages: list, model: str, timeout: float):
+        start = time.perf_counter()
+        chat_completion = self.client.chat.completions.create(
+            messages=messages, model=model, stream=False, timeout=timeout
+        )
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return chat_completion
+
+    def _hedged_request(self, messages: list, model: str, timeout: float):
+        deadline = self.p95_latency()
+        if not self.hedge or deadline is None:
+            return self._request(messages, model, timeout)
+
+        primary = self._executor.submit(self._request, messages, model, timeout)
+        done, _ = wait([primary], timeout=deadline)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedge = self._executor.submit(self._request, messages, model, timeout)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+        delay = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def complete(self, messages: list, model: str, timeout: float = None) -> str:
+        """Return the content of a chat completion, retrying transient errors."""
+        return self.create(messages, model, timeout).choices[0].message.content
+
+    def create(self, messages: list, model: str, timeout: float = None, max_retries: int = None,
+               deadline: float = None):
+        """Return the chat completion (content and token usage), retrying transient errors.
+
+        Args:
+            timeout : float : Per-request timeout, the manager's by default.
+            max_retries : int : Retries after the first attempt, the manager's by default.
+            deadline : float : ``time.perf_counter()`` value after which no request or retry
+                is started; requests are cut to the time left. TimeoutError once it is reached.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        timeout = timeout or self.timeout
+        self._count("calls")
+        retryable = (
+            self._errors.RateLimitError,
+            self._errors.APITimeoutError,
+            self._errors.APIConnectionError,
+            self._errors.InternalServerError,
+        )
+        for attempt in range(max_retries + 1):
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                self._count("failures")
+                raise TimeoutError(f"Délai dépassé pour {model}")
+            try:
+                return self._hedged_request(messages, model, timeout if remaining is None else min(timeout, remaining))
+            except retryable as error:
+                delay = self._retry_delay(attempt, error)
+                if attempt == max_retries or (deadline is not None and time.perf_counter() + delay >= deadline):
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_client_manager() -> LLMClientManager:
+    """Return the process-wide client manager, creating it on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = LLMClientManager()
+        return _manager
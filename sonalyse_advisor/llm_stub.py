@@ -0,0 +1,135 @@
+"""Local stand-in for the Groq chat completions API.
+
+Serves ``POST /openai/v1/chat/completions`` with configurable latency, tail
+latency and rate limiting, so the client, the app and the load tests can run
+without a key or network. Point the Groq SDK at it with
+``GROQ_BASE_URL=http://127.0.0.1:8808`` and any ``GROQ_API_KEY``.
+
+Usage:
+    python -m sonalyse_advisor.llm_stub --port 8808 --latency 0.5 --tail-latency 5 --tail-ratio 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONTENT = 'st.markdown("Réponse simulée du modèle local.")'
+
+
+class StubSettings:
+    """Behaviour of the stub server, shared by its handler threads."""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, tail_latency: float = 0.0,
+                 tail_ratio: float = 0.0, rate_limit_ratio: float = 0.0, content: str = DEFAULT_CONTENT,
+                 model_latency: dict = None):
+        self.latency = latency
+        # Base latency of specific models (e.g. a fast one), ``latency`` for the others
+        self.model_latency = model_latency or {}
+        self.jitter = jitter
+        self.tail_latency = tail_latency
+        self.tail_ratio = tail_ratio
+        self.rate_limit_ratio = rate_limit_ratio
+        self.content = content
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def delay(self, model: str = None) -> float:
+        if random.random() < self.tail_ratio:
+            return self.tail_latency
+        latency = self.model_latency.get(model, self.latency)
+        return max(0.0, latency + random.uniform(-self.jitter, self.jitter))
+
+
+def make_handler(settings: StubSettings):
+    class ChatCompletionsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            with settings.lock:
+                settings.requests += 1
+
+            if random.random() < settings.rate_limit_ratio:
+                self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}}, {"retry-after": "0.1"})
+                return
+
+            time.sleep(settings.delay(request.get("model")))
+            content = settings.content(request) if callable(settings.content) else settings.content
+            # ~4 characters per token, enough for the cost accounting
+            prompt_tokens = sum(len(message.get("content") or "") for message in request.get("messages", [])) // 4
+            completion_tokens = len(content) // 4
+            self._send(200, {
+                "id": f"stub-{settings.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+    return ChatCompletionsHandler
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, settings: StubSettings = None) -> tuple:
+    """Start the stub in a background thread.
+
+    Returns:
+        tuple : (server, base_url). Call ``server.shutdown()`` to stop it.
+    """
+    settings = settings or StubSettings()
+    server = ThreadingHTTPServer((host, port), make_handler(settings))
+    server.daemon_threads = True
+    server.settings = settings
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur LLM local simulé (API Groq)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=0.0)
+    parser.add_argument("--tail-ratio", type=float, default=0.0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.jitter, args.tail_latency, args.tail_ratio, args.rate_limit_ratio)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(settings))
+    print(f"🤖 LLM simulé sur http://{args.host}:{args.port} (GROQ_BASE_URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
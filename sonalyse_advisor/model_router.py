@@ -0,0 +1,174 @@
+"""Routing of the report tasks between a fast model, a large one and the local rules.
+
+Each route of ``MODEL_ROUTES`` lists the models to try in order, with its own
+timeout and retries, and a deadline for all its requests. A model that fails
+(timeout, rate limit after retries, API error) hands the task to the next one;
+once the deadline has passed, the remote models left are skipped.
+``LOCAL_MODEL`` answers with the matching part of the rule-based report,
+without any request. Latency, tokens, cost and the model that finally
+answered are accounted per route.
+
+Usage:
+    python -m sonalyse_advisor.model_router --capture data/dps_analysis_pi3_exemple.json \\
+        --accommodation data/logement1.json --room-type Chambre
+"""
+
+import argparse
+import threading
+import time
+from collections import Counter, deque
+
+from sonalyse_advisor.config import LOCAL_MODEL, MODEL_PRICES_PER_MTOK, MODEL_ROUTES
+from sonalyse_advisor.llm_client import get_client_manager
+
+LATENCY_SAMPLES = 200
+
+
+def _percentile(samples: list, q: float):
+    samples = sorted(samples)
+    return round(samples[int(q * (len(samples) - 1))], 3) if samples else None
+
+
+def request_cost(model: str, usage) -> float:
+    """Cost in USD of a completion, 0 for models without a price."""
+    if usage is None:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES_PER_MTOK.get(model, (0.0, 0.0))
+    return (usage.prompt_tokens * prompt_price + usage.completion_tokens * completion_price) / 1e6
+
+
+class ModelRouter:
+    """Send each task to the models of its route, with fallback and accounting.
+
+    Args:
+        routes : dict : Route name -> {"models", "timeout", "retries", "deadline"}, MODEL_ROUTES by default.
+        client : LLMClientManager : Defaults to the process-wide manager, created on first request.
+    """
+
+    def __init__(self, routes: dict = None, client=None):
+        self.routes = routes or MODEL_ROUTES
+        self._client = client
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client_manager()
+        return self._client
+
+    def _record(self, route: str, model: str, seconds: float, usage=None, fallbacks: int = 0):
+        with self._lock:
+            stats = self._stats.setdefault(route, {
+                "calls": 0, "fallbacks": 0, "failures": 0, "models": Counter(),
+                "latencies": deque(maxlen=LATENCY_SAMPLES),
+                "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            })
+            stats["calls"] += 1
+            stats["fallbacks"] += fallbacks
+            if model is None:
+                stats["failures"] += 1
+                return
+            stats["models"][model] += 1
+            stats["latencies"].append(seconds)
+            if usage is not None:
+                stats["prompt_tokens"] += usage.prompt_tokens
+                stats["completion_tokens"] += usage.completion_tokens
+                stats["cost_usd"] += request_cost(model, usage)
+
+    def complete(self, route: str, messages: list, local=None) -> str:
+        """Answer ``messages`` with the first model of ``route`` that succeeds.
+
+        Args:
+            route : str : Key of the routes.
+            messages : list : Chat messages.
+            local : callable : Returns the local answer; LOCAL_MODEL is skipped without it.
+
+        Returns:
+            str : Content of the answer.
+        """
+        spec = self.routes[route]
+        start = time.perf_counter()
+        deadline = start + spec.get("deadline", spec["timeout"] * (spec["retries"] + 1))
+        client, error = None, None
+        if any(model != LOCAL_MODEL for model in spec["models"]):
+            try:
+                client = self.client
+            except Exception as exception:
+                # SDK missing or no API key: every remote model fails like an unreachable one
+                error = exception
+        for attempt, model in enumerate(spec["models"]):
+            if model == LOCAL_MODEL:
+                if local is None:
+                    continue
+                content, usage = local(), None
+            else:
+                if client is None:
+                    continue
+                if time.perf_counter() >= deadline:
+                    error = error or TimeoutError(f"Délai de la route {route} dépassé")
+                    continue
+                try:
+                    completion = client.create(messages, model, spec["timeout"], spec["retries"], deadline)
+                except client.api_errors as exception:
+                    error = exception
+                    continue
+                content, usage = completion.choices[0].message.content, completion.usage
+            self._record(route, model, time.perf_counter() - start, usage, attempt)
+            return content
+        self._record(route, None, time.perf_counter() - start, fallbacks=len(spec["models"]) - 1)
+        raise error or RuntimeError(f"Aucun modèle disponible pour la route {route}")
+
+    def stats(self) -> dict:
+        """Per route: calls, fallbacks, failures, answering models, latency p50/p95, tokens and cost."""
+        with self._lock:
+            return {
+                route: {
+                    "calls": stats["calls"],
+                    "fallbacks": stats["fallbacks"],
+                    "failures": stats["failures"],
+                    "models": dict(stats["models"]),
+                    "latency_p50_s": _percentile(stats["latencies"], 0.50),
+                    "latency_p95_s": _percentile(stats["latencies"], 0.95),
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "cost_usd": round(stats["cost_usd"], 6),
+                }
+                for route, stats in self._stats.items()
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Return the process-wide router, creating it on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
+
+
+def main():
+    from sonalyse_advisor.agent_backend import interpret_json_sections
+
+    parser = argparse.ArgumentParser(description="Rapport par sections routé entre les modèles, avec leur coût")
+    parser.add_argument("--capture", required=True)
+    parser.add_argument("--accommodation", required=True, help="Fichier logement JSON")
+    parser.add_argument("--context", default="sonalyse_advisor/context.txt")
+    parser.add_argument("--room-type", help="pieces[].type de la pièce mesurée")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    interpret_json_sections(args.capture, args.context, args.accommodation, room_type=args.room_type)
+    print(f"✅ Rapport généré en {time.perf_counter() - start:.2f} s")
+    for route, stats in get_router().stats().items():
+        models = ", ".join(f"{model} ×{count}" for model, count in stats["models"].items()) or "aucun"
+        print(f"   {route:<16} {stats['latency_p50_s']} s, {stats['prompt_tokens']}+{stats['completion_tokens']} "
+              f"tokens, {stats['cost_usd']:.5f} $ ({models}, {stats['fallbacks']} repli(s))")
+
+
+if __name__ == "__main__":
+    main()
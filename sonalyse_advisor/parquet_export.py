@@ -0,0 +1,174 @@
+"""Columnar export of captures for the data team.
+
+Writes the validated segment columns and the per-day hourly and daily
+aggregates of ``json_utils`` as Hive-partitioned Parquet (or Arrow IPC)
+datasets, one directory per ``room=`` and ``date=``. Labels and grades are
+dictionary-encoded. Analysts then filter on the partitions and read only
+the columns they need instead of parsing whole JSON captures.
+
+Layout:
+    <out>/segments/room=<room>/date=<YYYY-MM-DD>/part-0.parquet
+    <out>/hourly/room=<room>/date=<YYYY-MM-DD>/part-0.parquet
+    <out>/daily/room=<room>/date=<YYYY-MM-DD>/part-0.parquet
+
+Usage:
+    python -m sonalyse_advisor.parquet_export capture.json --out export --room "Chambre principale"
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from sonalyse_advisor.columnar import FLOAT_FIELDS, RATING_LETTERS
+from sonalyse_advisor.json_utils import gather_extracted_data, load_json
+from sonalyse_advisor.validation import clean_capture
+
+PARTITIONS = ["room", "date"]
+FORMATS = ("parquet", "ipc")
+
+
+def _dictionary(codes: np.ndarray, values) -> "pyarrow.DictionaryArray":
+    """Dictionary array from integer codes, null where the code is negative."""
+    import pyarrow as pa
+
+    indices = pa.array(codes.astype(np.int32), mask=codes < 0)
+    return pa.DictionaryArray.from_arrays(indices, pa.array(list(values), type=pa.string()))
+
+
+def segments_table(columns: dict, room: str) -> "pyarrow.Table":
+    """Arrow table of the segment columns of one room.
+
+    Args:
+        columns : dict : Columns from ``columnar.to_columns`` (validated).
+        room : str : Room name, stored as a partition column.
+    """
+    import pyarrow as pa
+
+    timestamps = columns["timestamp"]
+    days, day_codes = np.unique(timestamps.astype("datetime64[D]"), return_inverse=True)
+    arrays = {
+        "room": pa.array(np.full(len(timestamps), room, dtype=object), type=pa.string()),
+        "date": _dictionary(day_codes, (str(day) for day in days)),
+        "timestamp": pa.array(timestamps, type=pa.timestamp("s")),
+    }
+    for name in FLOAT_FIELDS:
+        arrays[name] = pa.array(columns[name], from_pandas=True)
+    arrays["rating"] = _dictionary(columns["rating"].astype(np.int32) - 1, RATING_LETTERS)
+    arrays["label"] = _dictionary(columns["label"], columns["labels"])
+    return pa.table(arrays)
+
+
+def aggregate_tables(all_data: dict, room: str, date: str) -> tuple:
+    """Arrow tables (hourly, daily) of the aggregates of one room and day.
+
+    Args:
+        all_data : dict : Output of ``gather_extracted_data`` for the day.
+    """
+    import pyarrow as pa
+
+    daily, hourly = all_data["daily"], all_data["hourly"]
+    levels = hourly["db_min_max_peak_per_hour"]
+    noise = hourly["noise_hourly_percentage"]
+    hours = sorted(levels)
+    hourly_table = pa.table({
+        "room": pa.array([room] * len(hours), type=pa.string()),
+        "date": pa.array([date] * len(hours), type=pa.string()),
+        "hour": pa.array([int(hour) for hour in hours], type=pa.int8()),
+        **{
+            name: pa.array([levels[hour].get(name) for hour in hours], type=pa.float64())
+            for name in ("average_dB", "min_dB", "max_dB", "peak_dB", "coverage")
+        },
+        "dominant_noise": pa.array(
+            [noise.get(hour, {}).get("noise_type") for hour in hours], type=pa.string()
+        ).dictionary_encode(),
+        "dominant_noise_percentage": pa.array(
+            [noise.get(hour, {}).get("percentage") for hour in hours], type=pa.float64()
+        ),
+    })
+
+    period_grades, period_leq = daily["period_grades"], daily["period_leq_dB"]
+    daily_table = pa.table({
+        "room": pa.array([room], type=pa.string()),
+        "date": pa.array([date], type=pa.string()),
+        "average_db": pa.array([daily["average_daily_db"]], type=pa.float64()),
+        "grade": pa.array([daily["average_daily_rating"]]).dictionary_encode(),
+        "day_grade": pa.array([period_grades["day"]]).dictionary_encode(),
+        "night_grade": pa.array([period_grades["night"]]).dictionary_encode(),
+        "day_leq_db": pa.array([period_leq["day"]], type=pa.float64()),
+        "night_leq_db": pa.array([period_leq["night"]], type=pa.float64()),
+        "dominant_noise": pa.array([next(iter(daily["noise_daily_percentage"]), None)], type=pa.string()),
+        "coverage_percentage": pa.array([all_data["coverage"]["coverage_percentage"]], type=pa.float64()),
+        "segments": pa.array([all_data["quality"]["segments"]], type=pa.int64()),
+    })
+    return hourly_table, daily_table
+
+
+def write_dataset(table: "pyarrow.Table", directory: str, file_format: str = "parquet"):
+    """Write a table as a Hive-partitioned dataset, replacing its partitions."""
+    import pyarrow.dataset as ds
+
+    ds.write_dataset(
+        table,
+        directory,
+        format=file_format,
+        partitioning=PARTITIONS,
+        partitioning_flavor="hive",
+        existing_data_behavior="delete_matching",
+    )
+
+
+def export_capture(json_path: str, out_dir: str, room: str = None, room_type: str = None,
+                   file_format: str = "parquet") -> dict:
+    """Export a capture and its per-day aggregates.
+
+    Args:
+        json_path : str : Capture JSON.
+        out_dir : str : Root of the segments/, hourly/ and daily/ datasets.
+        room : str : Room name, defaults to the capture file name.
+        room_type : str : ``pieces[].type`` of the room, for the grades.
+        file_format : str : "parquet" or "ipc" (Arrow/Feather).
+
+    Returns:
+        dict : Number of rows written per dataset.
+    """
+    import pyarrow as pa
+
+    room = room or os.path.splitext(os.path.basename(json_path))[0]
+    records, columns, _ = clean_capture(load_json(json_path))
+    segments = segments_table(columns, room)
+
+    day_of_record = columns["timestamp"].astype("datetime64[D]")
+    hourly_tables, daily_tables = [], []
+    for day in np.unique(day_of_record):
+        day_records = [records[i] for i in np.flatnonzero(day_of_record == day)]
+        hourly, daily = aggregate_tables(gather_extracted_data(day_records, room_type), room, str(day))
+        hourly_tables.append(hourly)
+        daily_tables.append(daily)
+
+    written = {"segments": segments.num_rows}
+    write_dataset(segments, os.path.join(out_dir, "segments"), file_format)
+    for name, tables in (("hourly", hourly_tables), ("daily", daily_tables)):
+        if tables:
+            table = pa.concat_tables(tables)
+            write_dataset(table, os.path.join(out_dir, name), file_format)
+            written[name] = table.num_rows
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Parquet/Arrow des segments et agrégats")
+    parser.add_argument("captures", nargs="+", help="Captures JSON à exporter")
+    parser.add_argument("--out", default="export", help="Dossier racine des jeux de données")
+    parser.add_argument("--room", help="nom_de_la_piece (défaut : nom du fichier de capture)")
+    parser.add_argument("--room-type", help="pieces[].type de la pièce mesurée")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    args = parser.parse_args()
+
+    for capture in args.captures:
+        written = export_capture(capture, args.out, args.room, args.room_type, args.format)
+        print(f"✅ {capture} : " + ", ".join(f"{name} {rows} lignes" for name, rows in written.items()))
+
+
+if __name__ == "__main__":
+    main()
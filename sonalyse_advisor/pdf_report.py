@@ -0,0 +1,205 @@
+"""PDF diagnostic report: matplotlib charts laid out with reportlab.
+
+``chart_images`` draws the charts as PNG bytes and ``build_pdf`` assembles
+the report, so the charts can be cached as artifacts of their own (see
+``pipeline``). Both take the dashboard data of ``app.build_dashboard_data``
+(or ``pipeline.dashboard_data``). matplotlib and reportlab are imported on
+call to keep the app's cold start fast.
+"""
+
+import io
+import re
+
+from sonalyse_advisor.compliance import compliance_summary
+
+GRADE_COLORS = {
+    "A": "#00AA00",
+    "B": "#55CC00",
+    "C": "#AADD00",
+    "D": "#FFEE00",
+    "E": "#FFAA00",
+    "F": "#FF5500",
+    "G": "#DD0000",
+}
+
+
+def extract_recommendations(ia_report: dict) -> str:
+    """Return the "3. Recommandations" section as reportlab-ready text."""
+    recommendations_text = ia_report["sections"].get("recommandations")
+    if recommendations_text is None:
+        # Extraire uniquement la partie "3. Recommandations"
+        match = re.search(r"3\. Recommandations\s*(.*?)(?:\n\d+\..*|$)", ia_report["code"], re.DOTALL)
+        recommendations_text = match.group(1) if match else "Aucune recommandation disponible."
+    recommendations_text = recommendations_text.strip()
+
+    # Enlever caractères spéciaux et bouts de code
+    recommendations_text = re.sub(r"[^\w\s\-\.,:]", "", recommendations_text)
+    return recommendations_text.replace("\n", "<br/>")
+
+
+def fig_to_png(fig) -> bytes:
+    import matplotlib.pyplot as plt
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches='tight', dpi=150)
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def chart_images(data: dict) -> dict:
+    """Draw the report charts.
+
+    Returns:
+        dict : PNG bytes of the "timeline", "radar" and "heatmap" charts.
+    """
+    import matplotlib
+    matplotlib.use("Agg")#juuste pour éviter un bug avec streamlit si t'as macos
+    import matplotlib.pyplot as plt
+
+    # =====================
+    # 📊 GRAPHE : Timeline
+    # =====================
+    timeline_data = data["db_min_max_peak_by_hourly"]
+
+    fig, ax = plt.subplots(figsize=(8, 3))
+    hours = sorted(timeline_data.keys())
+    values = [timeline_data[h]["average_dB"] for h in hours]
+    ax.plot(hours, values)
+    ax.set_title("Évolution du niveau sonore (24h)")
+    ax.set_xlabel("Heure")
+    ax.set_ylabel("dB")
+    images = {"timeline": fig_to_png(fig)}
+
+    # ======================
+    # 🌐 GRAPHE RADAR : Sources de bruit
+    # ======================
+    labels = list(data["noise_percentage"].keys())
+    values = list(data["noise_percentage"].values())
+
+    # fermer le radar (dernier = premier)
+    values += values[:1]
+    angles = [n / float(len(labels)) * 2 * 3.1415926 for n in range(len(labels))]
+    angles += angles[:1]
+
+    fig = plt.figure(figsize=(4, 4))
+    ax = plt.subplot(111, polar=True)
+
+    # Tracé
+    ax.plot(angles, values, linewidth=2)
+    ax.fill(angles, values, alpha=0.3)
+
+    # Label des axes
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(labels)
+
+    # Valeurs numériques
+    for i, v in enumerate(values[:-1]):
+        ax.text(angles[i], v + 3, f"{v:.1f}%", fontsize=9, ha='center')
+
+    ax.set_title("Radar des sources de bruit (en %)")
+    images["radar"] = fig_to_png(fig)
+
+    # =====================
+    # 🔥 GRAPHE : Heatmap
+    # =====================
+    heatmap = data["noise_percentage_hourly"]
+
+    fig, ax = plt.subplots(figsize=(8, 3))
+
+    # Construire la matrice
+    matrix = [v["percentage"] for v in heatmap.values()]
+
+    # Heatmap
+    cax = ax.imshow([matrix], aspect="auto", cmap="viridis")
+
+    ax.set_title("Heatmap des bruits (simplifiée)")
+
+    # Ajouter une vraie barre de couleur (légende)
+    cbar = fig.colorbar(cax)
+    cbar.set_label("Intensité du bruit (%)", fontsize=8)
+    images["heatmap"] = fig_to_png(fig)
+
+    return images
+
+
+def build_pdf(data: dict, charts: dict, recommendations_text: str) -> bytes:
+    """Assemble the PDF report.
+
+    Args:
+        data : dict : Dashboard data.
+        charts : dict : Output of ``chart_images``.
+        recommendations_text : str : Output of ``extract_recommendations``.
+
+    Returns:
+        bytes : The PDF document.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Image, Paragraph, Spacer
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # TITRE
+    elements.append(Paragraph("<b>Diagnostic Sonalyze - Rapport</b>", styles["Title"]))
+    elements.append(Spacer(1, 20))
+
+    grade = data["grade"]
+    grade_color = GRADE_COLORS.get(grade, "#AADD00")
+
+    elements.append(Paragraph(
+        f"<para alignment='center'><font size=22><b>Note de performance : "
+        f"<font color='{grade_color}'>{grade}</font></b></font></para>",
+        styles["Title"]
+    ))
+    elements.append(Spacer(1, 20))
+
+    elements.append(Image(io.BytesIO(charts["timeline"]), width=450, height=200))
+    elements.append(Spacer(1, 20))
+
+    elements.append(Image(io.BytesIO(charts["radar"]), width=300, height=300))
+    elements.append(Spacer(1, 12))
+
+    legend_text = "<br/>".join(
+        [f"<b>{k.title()}</b> : {v:.1f}% du temps" for k, v in data["noise_percentage"].items()]
+    )
+    elements.append(Paragraph(f"<b>Légende des sources de bruit :</b><br/>{legend_text}", styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    elements.append(Image(io.BytesIO(charts["heatmap"]), width=450, height=150))
+    elements.append(Spacer(1, 12))
+
+    # Explication pour l'utilisateur final
+    legend_text = """
+    <b>Légende des couleurs :</b><br/>
+    • <b>Bleu</b> : très faible pourcentage de bruit.<br/>
+    • <b>Vert</b> : bruit modéré.<br/>
+    • <b>Jaune</b> : bruit notable / zones actives.<br/>
+    • <b>Blanc</b> : pics importants de bruit.<br/><br/>
+    <b>Utilité :</b> La heatmap permet de voir rapidement quelles heures présentent les taux
+    de bruit les plus élevés. Plus la couleur est claire, plus l'environnement sonore a été perturbé.
+    """
+
+    elements.append(Paragraph(legend_text, styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    # =====================
+    # 📏 Conformité OMS
+    # =====================
+    if data.get("compliance"):
+        elements.append(Paragraph("<b>Conformité aux valeurs guides de l'OMS :</b>", styles["Heading2"]))
+        elements.append(Spacer(1, 8))
+        elements.append(Paragraph("<br/>".join(compliance_summary(data["compliance"])), styles["Normal"]))
+        elements.append(Spacer(1, 20))
+
+    elements.append(Paragraph("<b>Recommandations :</b>", styles["Heading2"]))
+    elements.append(Spacer(1, 8))
+    elements.append(Paragraph(recommendations_text, styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+
+    # BUILD PDF
+    doc.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,429 @@
+"""Incremental pipeline of the artifacts derived from a capture.
+
+Each artifact declares the artifacts or source files it is built from, the
+modules its code depends on and the parameters it reads. Its fingerprint
+hashes the content of its inputs, the source of those modules and of its
+build function, and its parameters. An artifact whose fingerprint is already
+in the cache is loaded instead of rebuilt:
+
+    capture ─ segments ─ aggregates ─┬─ dashboard ─┬─ charts ─┐
+            └ d3_data    oms_guide ┘ │             └──────────┼─ pdf
+    accommodation, context ──────────┴─ prompt ─ report ──────┘
+
+Changing only the accommodation file re-runs prompt, report and pdf; changing
+the capture re-runs everything. The cache is pruned when artifacts are
+written: files unused for ``CACHE_MAX_AGE_DAYS`` go first, then the least
+recently used ones until it fits in ``CACHE_MAX_BYTES``.
+
+Usage:
+    python -m sonalyse_advisor.pipeline --capture data/dps_analysis_pi3_exemple.json \\
+        --accommodation data/logement1.json --room-type Chambre --out rapport/
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import threading
+import time
+
+DEFAULT_CACHE_DIR = ".pipeline_cache"
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+CACHE_MAX_AGE_DAYS = 30
+DEFAULT_CONTEXT_PATH = "sonalyse_advisor/context.txt"
+SOURCES = ("capture", "accommodation", "context", "oms_guide")
+# Sources that do not have to be given to ``Pipeline``.
+DEFAULT_SOURCES = {"context": DEFAULT_CONTEXT_PATH, "oms_guide": "data/OMS_guide.txt"}
+
+# Artifact name -> declaration, in dependency order.
+ARTIFACTS = {}
+
+# Storage of each kind of artifact: (file extension, dump, load).
+STORAGE = {
+    "json": (".json", lambda value: json.dumps(value, ensure_ascii=False).encode(), lambda raw: json.loads(raw)),
+    "text": (".txt", lambda value: value.encode(), lambda raw: raw.decode()),
+    "bytes": (".bin", lambda value: value, lambda raw: raw),
+    "pickle": (".pkl", pickle.dumps, pickle.loads),
+}
+
+
+def artifact(name: str, inputs: tuple, kind: str, code: tuple = (), params: tuple = (), persist=None):
+    """Declare the decorated function as the builder of artifact ``name``.
+
+    Args:
+        inputs : tuple : Names of the artifacts or SOURCES passed to the function, in order.
+        kind : str : Key of STORAGE.
+        code : tuple : Modules the build depends on, hashed into the fingerprint.
+        params : tuple : Pipeline parameters passed as keyword arguments.
+        persist : callable : Whether a built value may be cached, every value by default.
+            A value that is not cached is rebuilt next time, and so is everything built from it.
+    """
+    def register(build):
+        for name_in in inputs:
+            if name_in not in SOURCES and name_in not in ARTIFACTS:
+                raise ValueError(f"{name} dépend de {name_in}, qui n'est pas déclaré avant")
+        ARTIFACTS[name] = {"build": build, "inputs": inputs, "kind": kind, "code": code, "params": params,
+                           "persist": persist}
+        return build
+    return register
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prune_cache(cache_dir: str, max_bytes: int = CACHE_MAX_BYTES, max_age_days: float = CACHE_MAX_AGE_DAYS) -> int:
+    """Delete the cached artifacts unused for ``max_age_days``, then the least recently used ones beyond ``max_bytes``.
+
+    A cached artifact counts as used when it is loaded (see ``Pipeline.get``).
+
+    Returns:
+        int : Number of files deleted.
+    """
+    files = []
+    for directory, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((info.st_mtime, info.st_size, path))
+
+    oldest = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for mtime, size, path in sorted(files):
+        if mtime >= oldest and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return deleted
+
+
+def code_digest(name: str) -> str:
+    """Hash of the build function of ``name`` and of the sources of its modules."""
+    spec = ARTIFACTS[name]
+    digest = hashlib.sha1(inspect.getsource(spec["build"]).encode())
+    for module in spec["code"]:
+        digest.update(_file_digest(importlib.util.find_spec(module).origin).encode())
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """Artifacts of one capture, rebuilt only when their fingerprint changes.
+
+    Args:
+        sources : dict : Path of each of SOURCES, DEFAULT_SOURCES when omitted.
+        params : dict : Parameters ("room_type", ...) read by the artifacts.
+        cache_dir : str : Directory of the cached artifacts, None to build everything without caching.
+    """
+
+    def __init__(self, sources: dict, params: dict = None, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.sources = dict(DEFAULT_SOURCES, **sources)
+        self.params = params or {}
+        self.cache_dir = cache_dir
+        self._fingerprints = {}
+        self._values = {}
+        # Artifacts built in this run that must not be cached (see ``artifact``)
+        self._transient = set()
+        self._pruned = False
+        # (artifact, "cache", "built" or "transient", seconds) in evaluation order.
+        self.log = []
+
+    def fingerprint(self, name: str) -> str:
+        if name not in self._fingerprints:
+            if name in SOURCES:
+                self._fingerprints[name] = _file_digest(self.sources[name])
+            else:
+                spec = ARTIFACTS[name]
+                key = json.dumps([
+                    name,
+                    code_digest(name),
+                    [self.fingerprint(input_name) for input_name in spec["inputs"]],
+                    {param: self.params.get(param) for param in spec["params"]},
+                ], sort_keys=True)
+                self._fingerprints[name] = hashlib.sha1(key.encode()).hexdigest()
+        return self._fingerprints[name]
+
+    def _path(self, name: str) -> str:
+        extension = STORAGE[ARTIFACTS[name]["kind"]][0]
+        return os.path.join(self.cache_dir, name, self.fingerprint(name) + extension)
+
+    def get(self, name: str):
+        """Value of an artifact (or the path of a source), loaded from the cache when up to date."""
+        if name in SOURCES:
+            return self.sources[name]
+        if name in self._values:
+            return self._values[name]
+
+        spec = ARTIFACTS[name]
+        start = time.perf_counter()
+        value = self._load(name)
+        if value is not None:
+            status = "cache"
+        else:
+            inputs = [self.get(input_name) for input_name in spec["inputs"]]
+            start = time.perf_counter()
+            value = spec["build"](*inputs, **{param: self.params.get(param) for param in spec["params"]})
+            status = self._store(name, value)
+        self.log.append((name, status, time.perf_counter() - start))
+        self._values[name] = value
+        return value
+
+    def put(self, name: str, value):
+        """Use ``value``, computed by the caller, as artifact ``name`` (e.g. the segments parsed during an upload).
+
+        It is cached like a built value, so the artifacts built from it do not read its inputs again.
+        """
+        self.log.append((name, self._store(name, value), 0.0))
+        self._values[name] = value
+
+    def _load(self, name: str):
+        """Cached value of an artifact, None when it is not cached."""
+        if self.cache_dir is None:
+            return None
+        path = self._path(name)
+        try:
+            with open(path, "rb") as file:
+                raw = file.read()
+            # Loaded artifacts are the recently used ones kept by ``prune_cache``
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return STORAGE[ARTIFACTS[name]["kind"]][2](raw)
+
+    def _store(self, name: str, value) -> str:
+        """Cache a built value unless it must not be, and return its status for the log."""
+        spec = ARTIFACTS[name]
+        if (spec["persist"] and not spec["persist"](value)) or self._transient.intersection(spec["inputs"]):
+            self._transient.add(name)
+            return "transient"
+        if self.cache_dir is None:
+            return "built"
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique temporary name: several processes may build the same artifact (see service.py)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(STORAGE[spec["kind"]][1](value))
+        os.replace(tmp_path, path)
+        if not self._pruned:
+            self._pruned = True
+            prune_cache(self.cache_dir)
+        return "built"
+
+    def run(self, targets=None) -> dict:
+        """Evaluate ``targets`` (every artifact by default) and return their values."""
+        return {name: self.get(name) for name in (targets or ARTIFACTS)}
+
+
+# ========================================
+# Artifacts
+# ========================================
+
+@artifact("segments", ("capture",), "pickle",
+          code=("sonalyse_advisor.validation", "sonalyse_advisor.json_utils", "sonalyse_advisor.columnar"))
+def build_segments(capture_path):
+    """``clean_capture`` of the capture: valid segments, their columns and the quarantine report.
+
+    The rejected rows are written to the quarantine report of the capture (``validation.quarantine_path_for``).
+    """
+    from sonalyse_advisor.json_utils import load_json
+    from sonalyse_advisor.validation import clean_capture, quarantine_path_for
+
+    return clean_capture(load_json(capture_path), quarantine_path_for(capture_path))
+
+
+@artifact("aggregates", ("segments", "oms_guide"), "json", params=("room_type", "room", "thresholds", "history"),
+          code=("sonalyse_advisor.agent_backend", "sonalyse_advisor.json_utils", "sonalyse_advisor.resampling",
+                "sonalyse_advisor.grading", "sonalyse_advisor.baseline", "sonalyse_advisor.compliance"))
+def build_aggregates(segments, oms_guide_path, room_type=None, room=None, thresholds=None, history=None):
+    """``thresholds`` (digest of the grade thresholds file) and ``history`` (version of the
+    room's stored segments, the baseline of the loud nights) are only read by the fingerprint."""
+    from sonalyse_advisor.agent_backend import prompt_data
+    from sonalyse_advisor.compliance import load_oms_table
+
+    return prompt_data(segments[0], room_type, load_oms_table(oms_guide_path), room, cleaned=segments)
+
+
+@artifact("dashboard", ("segments", "aggregates"), "json", code=("sonalyse_advisor.columnar",))
+def build_dashboard(segments, aggregates):
+    """Data of the app's dashboard (statistics, grades, charts, loud nights, WHO compliance)."""
+    from sonalyse_advisor.columnar import labels_by_hour
+
+    records, columns, quarantine = segments
+    daily, hourly = aggregates["daily"], aggregates["hourly"]
+    return {
+        "stats": {
+            "avg_db": daily["average_daily_db"],
+            # Leq of the grade periods (day 6h-22h, night 22h-6h)
+            "avg_db_day": daily["period_leq_dB"]["day"],
+            "avg_db_night": daily["period_leq_dB"]["night"],
+            "max_db": float(columns["max_dB"].max()) if len(records) else 0,
+            "min_db": float(columns["min_dB"].min()) if len(records) else 0,
+        },
+        "grade": daily["average_daily_rating"],
+        "period_grades": daily["period_grades"],
+        "grade_distribution": {
+            "hourly": hourly["grade_distribution_per_hour"],
+            "daily": daily["grade_distribution_per_day"],
+            "period": daily["grade_distribution_per_period"],
+        },
+        "measurements": len(records),
+        "rejected": quarantine["rejected"],
+        "coverage": aggregates["coverage"],
+        # Only the distinct types of each hour are used (heatmap)
+        "noise_types_by_hour": labels_by_hour(columns),
+        "noise_percentage": daily["noise_daily_percentage"],
+        "noise_percentage_hourly": hourly["noise_hourly_percentage"],
+        "db_min_max_peak_by_hourly": hourly["db_min_max_peak_per_hour"],
+        "loud_nights": aggregates["abnormal_nights"],
+        "compliance": aggregates["oms_compliance"],
+    }
+
+
+@artifact("d3_data", ("capture",), "json", params=("room_type", "thresholds"),
+          code=("json_to_d3", "sonalyse_advisor.json_utils", "sonalyse_advisor.validation", "sonalyse_advisor.columnar",
+                "sonalyse_advisor.resampling", "sonalyse_advisor.grading", "sonalyse_advisor.baseline"))
+def build_d3_data(capture_path, room_type=None, thresholds=None):
+    from json_to_d3 import convert_to_d3_format
+
+    return convert_to_d3_format(capture_path, room_type, verbose=False)
+
+
+@artifact("charts", ("dashboard",), "pickle", code=("sonalyse_advisor.pdf_report",))
+def build_charts(dashboard):
+    from sonalyse_advisor.pdf_report import chart_images
+
+    return chart_images(dashboard)
+
+
+@artifact("prompt", ("aggregates", "accommodation", "context"), "text", params=("room_type", "guidance"),
+          code=("sonalyse_advisor.agent_backend", "sonalyse_advisor.guidance_index", "sonalyse_advisor.recommendations"))
+def build_prompt(aggregates, accommodation_path, context_path, room_type=None, guidance=None):
+    """``guidance`` (digest of the guidance documents) is only read by the fingerprint."""
+    from sonalyse_advisor.agent_backend import format_system_prompt, read_context_file
+    from sonalyse_advisor.json_utils import load_json
+
+    return format_system_prompt(read_context_file(context_path), load_json(accommodation_path), aggregates, room_type)
+
+
+@artifact("report", ("prompt", "aggregates"), "json", params=("room_type", "use_llm", "model", "sectioned"),
+          code=("sonalyse_advisor.agent_backend", "sonalyse_advisor.model_router", "sonalyse_advisor.recommendations"),
+          persist=lambda report: not report.get("local_fallback"))
+def build_report(prompt, aggregates, room_type=None, use_llm=False, model=None, sectioned=True):
+    """LLM report, or the local rule-based report when the LLM is not used.
+
+    When the LLM fails and a part of the report falls back to the local rules,
+    the report is marked "local_fallback" and not cached: the next run asks the
+    model again instead of serving the rules under the LLM fingerprint.
+    """
+    if not use_llm:
+        from sonalyse_advisor.recommendations import build_report as build_rule_report, render_streamlit_code
+
+        return render_streamlit_code(build_rule_report(aggregates, room_type))
+
+    from sonalyse_advisor.agent_backend import generate_report, generate_sections, local_report
+
+    local_build, fallbacks = local_report(aggregates, room_type), []
+
+    def local():
+        fallbacks.append(True)
+        return local_build()
+
+    if sectioned:
+        report = generate_sections(prompt, local)
+    else:
+        report = {"code": generate_report(prompt, local), "sections": {}}
+    report["local_fallback"] = bool(fallbacks)
+    return report
+
+
+@artifact("pdf", ("dashboard", "charts", "report"), "bytes", code=("sonalyse_advisor.pdf_report",))
+def build_pdf(dashboard, charts, report):
+    from sonalyse_advisor.pdf_report import build_pdf as render_pdf, extract_recommendations
+
+    return render_pdf(dashboard, charts, extract_recommendations(report))
+
+
+# Files written by ``export``: artifact -> file name.
+EXPORTS = {"d3_data": "d3_data.json", "prompt": "prompt.txt", "report": "rapport_ia.json", "pdf": "rapport_dps.pdf"}
+
+
+def export(pipeline: Pipeline, out_dir: str) -> list:
+    """Write the exported artifacts and the chart PNGs into ``out_dir``."""
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, filename in EXPORTS.items():
+        value = pipeline.get(name)
+        path = os.path.join(out_dir, filename)
+        with open(path, "wb") as file:
+            file.write(STORAGE[ARTIFACTS[name]["kind"]][1](value))
+        written.append(path)
+    for chart, png in pipeline.get("charts").items():
+        path = os.path.join(out_dir, f"{chart}.png")
+        with open(path, "wb") as file:
+            file.write(png)
+        written.append(path)
+    return written
+
+
+def default_params(room_type: str = None, use_llm: bool = False, room: str = None) -> dict:
+    """Pipeline parameters with the current configuration (model routes, guidance documents, grade
+    thresholds) and, for a ``room`` of the ``TimeSeriesStore``, the version of its history."""
+    from sonalyse_advisor.config import GRADE_THRESHOLDS_PATH, MODEL_ROUTES, SECTIONED_REPORT
+    from sonalyse_advisor.guidance_index import documents_digest, guidance_paths
+    from sonalyse_advisor.timeseries_store import TimeSeriesStore
+
+    return {
+        "room_type": room_type,
+        "room": room,
+        "history": TimeSeriesStore().segments_version(room) if room else None,
+        "use_llm": use_llm,
+        "model": {route: spec["models"] for route, spec in MODEL_ROUTES.items()},
+        "sectioned": SECTIONED_REPORT,
+        "guidance": documents_digest(guidance_paths()),
+        "thresholds": _file_digest(GRADE_THRESHOLDS_PATH) if GRADE_THRESHOLDS_PATH else None,
+    }
+
+
+def main():
+    from sonalyse_advisor.agent_backend import llm_available
+
+    parser = argparse.ArgumentParser(description="Pipeline incrémental des artefacts d'une capture")
+    parser.add_argument("--capture", required=True)
+    parser.add_argument("--accommodation", required=True, help="Fichier logement JSON")
+    parser.add_argument("--context", default=DEFAULT_CONTEXT_PATH)
+    parser.add_argument("--room-type", help="pieces[].type de la pièce mesurée")
+    parser.add_argument("--room", help="Nom de la pièce dans le TimeSeriesStore (référence des nuits anormales)")
+    parser.add_argument("--out", default="rapport", help="Dossier des fichiers produits")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-llm", action="store_true", help="Diagnostic local par règles, sans LLM")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(
+        {"capture": args.capture, "accommodation": args.accommodation, "context": args.context},
+        default_params(args.room_type, llm_available() and not args.no_llm, args.room),
+        args.cache_dir,
+    )
+    written = export(pipeline, args.out)
+    for name, status, seconds in pipeline.log:
+        label = {"cache": "cache", "built": "calculé", "transient": "calculé, non mis en cache"}[status]
+        print(f"{'♻️ ' if status == 'cache' else '⚙️ '} {name:<10} {label} ({seconds:.2f} s)")
+    print(f"✅ {len(written)} fichiers écrits dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
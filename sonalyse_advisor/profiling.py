@@ -0,0 +1,200 @@
+"""On-demand profiling of a full app run.
+
+Enabled with the ``SONALYSE_PROFILE=1`` environment variable or the
+``?profile=1`` query parameter. A ``ProfileRun`` samples the stack of the
+thread running the script every ``interval`` seconds and records, for each
+stage wrapped in ``stage(name)``, its duration and the allocations still
+alive at its end, by line (tracemalloc). tracemalloc only runs inside the
+stages so the rest of the run is not slowed down. ``finish`` writes:
+
+    <dir>/<run>.speedscope.json   flame graph, open it on https://www.speedscope.app
+    <dir>/<run>.folded.txt        collapsed stacks for flamegraph.pl
+    <dir>/<run>.stages.json       duration, memory peak and top allocators per stage
+
+When no run is active, ``stage`` returns a shared no-op context manager and
+nothing else is executed.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILE_ENV = "SONALYSE_PROFILE"
+PROFILE_DIR_ENV = "SONALYSE_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL_SECONDS = 0.002
+TOP_ALLOCATORS = 10
+# Allocations of the profiler itself are left out of the summaries.
+IGNORED_FILES = (tracemalloc.__file__, __file__)
+
+_NO_PROFILE = contextlib.nullcontext()
+# Active run of each thread: Streamlit runs every session's script in its own thread.
+_local = threading.local()
+
+
+def profiling_requested(query_params: dict = None) -> bool:
+    """Whether profiling is enabled by the environment or a ``profile`` query parameter."""
+    if os.environ.get(PROFILE_ENV, "") not in ("", "0"):
+        return True
+    value = (query_params or {}).get("profile")
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return value not in (None, "", "0")
+
+
+class ProfileRun:
+    """Sampling profiler and per-stage allocation summary of one run.
+
+    Args:
+        name : str : Run name, used in the output file names.
+        out_dir : str : Output directory, SONALYSE_PROFILE_DIR or "profiles" by default.
+        interval : float : Sampling period (s).
+    """
+
+    def __init__(self, name: str = "run", out_dir: str = None, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.name = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        self.out_dir = out_dir or os.environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR)
+        self.interval = interval
+        # Stack -> seconds, each sample weighing the time since the previous one.
+        self.stacks = Counter()
+        self.stages = []
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="sonalyse-profiler", daemon=True)
+        self._sampler.start()
+        _local.run = self
+        return self
+
+    def _sample(self):
+        previous = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, previous = now - previous, now
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += elapsed
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        # A stage nested in another one is only timed, its allocations go to the outer stage.
+        nested = tracemalloc.is_tracing()
+        if not nested:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"stage": name, "seconds": round(time.perf_counter() - start, 4)}
+            if not nested:
+                current, peak = tracemalloc.get_traced_memory()
+                # Filtering the grouped statistics is much cheaper than Snapshot.filter_traces
+                statistics = [
+                    stat for stat in tracemalloc.take_snapshot().statistics("lineno")
+                    if stat.traceback[0].filename not in IGNORED_FILES
+                ]
+                tracemalloc.stop()
+                record.update({
+                    "allocated_kb": round(current / 1024, 1),
+                    "peak_kb": round(peak / 1024, 1),
+                    "top_allocators": [
+                        {
+                            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                            "size_kb": round(stat.size / 1024, 1),
+                            "count": stat.count,
+                        }
+                        for stat in statistics[:TOP_ALLOCATORS]
+                    ],
+                })
+            self.stages.append(record)
+
+    def speedscope(self) -> dict:
+        """Sampled profile in the speedscope file format."""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, seconds in self.stacks.items():
+            sample = []
+            for name, filename, line in stack:
+                key = (name, filename, line)
+                if key not in index:
+                    index[key] = len(frames)
+                    frames.append({"name": name, "file": filename, "line": line})
+                sample.append(index[key])
+            samples.append(sample)
+            weights.append(seconds)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": self.name,
+            "exporter": "sonalyse_advisor.profiling",
+        }
+
+    def folded(self) -> str:
+        """Collapsed stacks ("frame;frame;frame microseconds"), one line per stack."""
+        return "\n".join(
+            ";".join(f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack)
+            + f" {round(seconds * 1e6)}"
+            for stack, seconds in self.stacks.most_common()
+        )
+
+    def finish(self) -> dict:
+        """Stop profiling and write the output files.
+
+        Returns:
+            dict : Paths of the "speedscope", "folded" and "stages" files.
+        """
+        self._stop.set()
+        self._sampler.join()
+        total = time.perf_counter() - self._started
+        _local.run = None
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, self.name)
+        paths = {
+            "speedscope": f"{base}.speedscope.json",
+            "folded": f"{base}.folded.txt",
+            "stages": f"{base}.stages.json",
+        }
+        with open(paths["speedscope"], "w") as file:
+            json.dump(self.speedscope(), file)
+        with open(paths["folded"], "w") as file:
+            file.write(self.folded())
+        with open(paths["stages"], "w") as file:
+            json.dump({"run": self.name, "seconds": round(total, 4), "stages": self.stages}, file, indent=2)
+        return paths
+
+
+def start_profile(name: str = "run", out_dir: str = None) -> ProfileRun:
+    """Start a run and make it the target of ``stage``."""
+    return ProfileRun(name, out_dir).start()
+
+
+def stage(name: str):
+    """Context manager recording a stage of the active run, a no-op otherwise."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return _NO_PROFILE
+    return run.stage(name)
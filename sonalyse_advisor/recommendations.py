@@ -0,0 +1,304 @@
+"""Deterministic, rule-based diagnostic report.
+
+Maps the aggregated data of a room (dominant noise sources, day/night Leq,
+room type) onto the recommendation tiers of ``context.txt`` without any
+remote call. The reference levels (``indoor_limits``, taken from the grade
+thresholds) and the cost ranges of ``SOLUTIONS`` are also given to the model
+(see ``catalogue_text``). It runs in well under a millisecond per room, so it
+covers batch runs and LLM outages; the LLM report becomes optional
+enrichment.
+
+Usage:
+    python -m sonalyse_advisor.recommendations capture.json --room-type Chambre
+"""
+
+import argparse
+import json
+import re
+from functools import lru_cache
+
+from sonalyse_advisor.grading import GRADE_LETTERS, PERIODS, normalize_room_type, room_thresholds
+
+# Source category -> words of the AST labels (lowercase), matched as whole
+# words: "car" matches "Car alarm" but not "Scary music". A plural "s" is allowed.
+CATEGORY_KEYWORDS = {
+    "circulation": ("vehicle", "car", "truck", "bus", "motorcycle", "traffic", "engine", "horn",
+                    "train", "rail transport", "railroad car", "aircraft", "airplane", "helicopter", "siren",
+                    "tire squeal"),
+    "voix": ("speech", "conversation", "shout", "yell", "child", "children", "laugh", "laughter", "laughing",
+             "cry", "crying", "babbling", "whispering", "screaming", "narration", "humming"),
+    "musique": ("music", "musical", "singing", "song", "guitar", "piano", "drum", "bass", "rapping", "choir"),
+    # "Run" is the AudioSet class of running footsteps (human locomotion)
+    "pas et chocs": ("walk", "footsteps", "run", "shuffle", "door", "knock", "slam", "thump", "bang"),
+    "travaux": ("drill", "hammer", "jackhammer", "chainsaw", "sawing", "power tool", "construction", "sanding"),
+    "équipements": ("air conditioning", "fan", "vacuum cleaner", "washing machine", "dishwasher",
+                    "mechanical fan", "mechanisms", "hum", "buzz", "refrigerator", "toilet flush", "water"),
+    "animaux": ("dog", "bark", "cat", "caterwaul", "cattle", "meow", "bird", "chirp", "rooster", "animal"),
+}
+CATEGORY_PATTERNS = {
+    category: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")s?\b")
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+OTHER_CATEGORY = "autres"
+
+# Grade whose upper bound is the indoor reference level of a room. In the
+# default threshold table, the bounds of grade B in a bedroom are the WHO
+# community noise guideline values (35 dB by day, 30 dB at night).
+REFERENCE_GRADE = "B"
+
+# Solutions per source category and tier, with cost ranges in EUR.
+SOLUTIONS = {
+    "circulation": {
+        "low_cost": [("Joints ou baguettes aluminium pour fenêtres et portes", 20, 50),
+                     ("Rideaux épais thermiques ou phoniques", 30, 80)],
+        "intermediate": [("Survitrage (film acoustique) sur les vitrages existants", 200, 400),
+                         ("Stores occultants et isolants", 250, 500)],
+        "heavy": [("Remplacement des fenêtres par du double ou triple vitrage", 1200, 3000)],
+    },
+    "voix": {
+        "low_cost": [("Bas de porte et joints d'étanchéité", 15, 40),
+                     ("Tapis épais ou sous-couche absorbante", 20, 70)],
+        "intermediate": [("Panneaux acoustiques muraux (2 à 4 panneaux)", 300, 800)],
+        "heavy": [("Renforcement des cloisons avec isolation phonique", 900, 2500)],
+    },
+    "musique": {
+        "low_cost": [("Tapis épais ou sous-couche absorbante", 20, 70),
+                     ("Rideaux épais sur les murs mitoyens", 30, 80)],
+        "intermediate": [("Panneaux acoustiques muraux (2 à 4 panneaux)", 300, 800)],
+        "heavy": [("Renforcement des cloisons avec isolation phonique", 900, 2500)],
+    },
+    "pas et chocs": {
+        "low_cost": [("Tapis épais ou sous-couche absorbante", 20, 70),
+                     ("Butées et amortisseurs de porte", 10, 30)],
+        "intermediate": [("Plafond suspendu léger avec isolation", 400, 800)],
+        "heavy": [("Isolation complète du plafond et du sol", 1500, 3000)],
+    },
+    "travaux": {
+        "low_cost": [("Joints ou baguettes aluminium pour fenêtres et portes", 20, 50)],
+        "intermediate": [("Survitrage (film acoustique) sur les vitrages existants", 200, 400)],
+        "heavy": [("Intervention d'un acousticien si la gêne dure", 900, 3000)],
+    },
+    "équipements": {
+        "low_cost": [("Plots anti-vibration sous les appareils", 10, 40)],
+        "intermediate": [("Coffrage acoustique ou déplacement de l'équipement", 200, 600)],
+        "heavy": [("Intervention d'un acousticien pour traiter la source", 900, 3000)],
+    },
+    OTHER_CATEGORY: {
+        "low_cost": [("Joints d'étanchéité et rideaux épais", 30, 100)],
+        "intermediate": [("Panneaux acoustiques muraux", 150, 300)],
+        "heavy": [("Intervention d'un acousticien pour un cas complexe", 900, 3000)],
+    },
+}
+SOLUTIONS["animaux"] = SOLUTIONS["circulation"]
+
+WEAKNESSES = {
+    "circulation": "Fenêtres : le bruit de la rue entre encore, signe que les fenêtres laissent passer le son extérieur.",
+    "voix": "Cloisons : les voix traversent, l'isolation des murs mitoyens semble modérée.",
+    "musique": "Cloisons et plafond : la musique se propage, l'isolation des parois semble modérée.",
+    "pas et chocs": "Sol et plafond : les bruits de pas et de chocs se transmettent par la structure.",
+    "travaux": "Façade : les bruits de chantier extérieurs sont bien audibles à l'intérieur.",
+    "équipements": "Équipements : un appareil ou une installation génère un bruit de fond continu.",
+    "animaux": "Fenêtres : les bruits extérieurs restent perceptibles à l'intérieur.",
+    OTHER_CATEGORY: "Isolation générale : plusieurs sources de bruit se mêlent, l'isolation peut être renforcée.",
+}
+
+TIERS = (
+    ("low_cost", "Solutions low-cost"),
+    ("intermediate", "Solutions intermédiaires"),
+    ("heavy", "Travaux lourds"),
+)
+
+# Excess over the reference level (dB) from which each tier is proposed.
+TIER_MIN_EXCESS_DB = {"low_cost": float("-inf"), "intermediate": 5.0, "heavy": 10.0}
+
+
+@lru_cache(maxsize=4096)
+def label_category(label: str) -> str:
+    """Map an AST label to a source category."""
+    text = label.lower().replace("_", " ")
+    for category, pattern in CATEGORY_PATTERNS.items():
+        if pattern.search(text):
+            return category
+    return OTHER_CATEGORY
+
+
+def category_shares(noise_percentage: dict) -> dict:
+    """Sum label percentages into source category percentages, largest first."""
+    shares = {}
+    for label, percentage in noise_percentage.items():
+        category = label_category(label)
+        shares[category] = shares.get(category, 0.0) + percentage
+    return dict(sorted(((k, round(v, 1)) for k, v in shares.items()), key=lambda x: x[1], reverse=True))
+
+
+def indoor_limits(room_type: str = None) -> dict:
+    """Indoor reference level (dB) of a room per period: the upper bound of REFERENCE_GRADE.
+
+    Read from the configured grade thresholds (``grading.room_thresholds``), so
+    a room exceeds its reference exactly when it is graded below REFERENCE_GRADE.
+    """
+    bounds = room_thresholds(room_type)
+    index = GRADE_LETTERS.index(REFERENCE_GRADE)
+    return {period: bounds[period][index] for period in PERIODS}
+
+
+def catalogue_text(room_type: str = None) -> str:
+    """Reference levels of the room and solutions with their cost ranges, as given to the model.
+
+    The LLM report quotes the same levels and costs as the local one.
+    """
+    limits = indoor_limits(room_type)
+    lines = [f"Repères OMS pour la pièce : {limits['day']} dB le jour, {limits['night']} dB la nuit."]
+    for category, tiers in SOLUTIONS.items():
+        lines.append(f"{category} :")
+        for tier, label in TIERS:
+            lines += [f"- {label} : {solution} : {low}-{high} EUR" for solution, low, high in tiers[tier]]
+    return "\n".join(lines)
+
+
+def _format_db(value) -> str:
+    return "n/d" if value is None else f"{value:.1f}".replace(".", ",") + " dB"
+
+
+def build_report(all_data: dict, room_type: str = None) -> dict:
+    """Build a structured diagnostic report from the aggregated data of a room.
+
+    Args:
+        all_data : dict : Output of ``gather_extracted_data``.
+        room_type : str : ``pieces[].type`` of the measured room.
+
+    Returns:
+        dict : "grade", "room_type", "dominant_category", "categories",
+            "levels" (per period: leq, limit, excess, compliant),
+            "weaknesses", "recommendations" (per tier: solution and cost
+            range) and "takeaways".
+    """
+    daily = all_data["daily"]
+    room = normalize_room_type(room_type)
+    limits = indoor_limits(room_type)
+    period_leq = daily.get("period_leq_dB") or {"day": daily["average_daily_db"], "night": None}
+
+    levels = {}
+    for period in ("day", "night"):
+        leq = period_leq.get(period)
+        excess = None if leq is None else round(leq - limits[period], 1)
+        levels[period] = {
+            "leq_dB": leq,
+            "limit_dB": limits[period],
+            "excess_dB": excess,
+            "compliant": excess is None or excess <= 0,
+        }
+    excesses = [lv["excess_dB"] for lv in levels.values() if lv["excess_dB"] is not None]
+    worst_excess = max(excesses) if excesses else 0.0
+
+    categories = category_shares(daily["noise_daily_percentage"])
+    dominant = next(iter(categories), OTHER_CATEGORY)
+    secondary = [c for c in categories if c != dominant][:1]
+
+    recommendations = {}
+    for tier, _ in TIERS:
+        recommendations[tier] = []
+        if worst_excess < TIER_MIN_EXCESS_DB[tier]:
+            continue
+        seen = set()
+        for category in [dominant] + secondary:
+            for solution, low, high in SOLUTIONS[category][tier]:
+                if solution not in seen:
+                    seen.add(solution)
+                    recommendations[tier].append({"solution": solution, "cost_eur": [low, high]})
+
+    takeaways = [
+        f"Note {daily['average_daily_rating']}, niveau jour {_format_db(levels['day']['leq_dB'])}, "
+        f"nuit {_format_db(levels['night']['leq_dB'])}.",
+        f"Source principale : {dominant} ({categories.get(dominant, 0):.0f} % du temps)."
+        if categories else "Source principale : non identifiée.",
+    ]
+    if not levels["night"]["compliant"]:
+        takeaways.append(
+            f"La nuit dépasse de {_format_db(levels['night']['excess_dB'])} le niveau recommandé par l'OMS "
+            f"({limits['night']} dB) : priorité au calme nocturne."
+        )
+    takeaways.append(f"Premiers pas : {recommendations['low_cost'][0]['solution'].lower()}.")
+
+    return {
+        "grade": daily["average_daily_rating"],
+        "room_type": room,
+        "dominant_category": dominant,
+        "categories": categories,
+        "levels": levels,
+        "weaknesses": [WEAKNESSES[c] for c in [dominant] + secondary],
+        "recommendations": recommendations,
+        "takeaways": takeaways,
+    }
+
+
+def _markdown(lines: list) -> str:
+    return f"st.markdown({chr(10).join(lines)!r})"
+
+
+def render_streamlit_code(report: dict) -> dict:
+    """Render a report as Streamlit code following the structure of context.txt.
+
+    Returns:
+        dict : Same shape as ``interpret_json_sections``: "sections" per key
+            and the merged "code".
+    """
+    period_names = {"day": "Le jour", "night": "La nuit"}
+    summary = []
+    for period, level in report["levels"].items():
+        sentence = f"- {period_names[period]} : **{_format_db(level['leq_dB'])}** (repère : {level['limit_dB']} dB)"
+        if not level["compliant"]:
+            sentence += f", soit **{_format_db(level['excess_dB'])}** au-dessus"
+        summary.append(sentence + ".")
+    summary.append("")
+    summary.append("**Sources de bruit principales** :")
+    summary += [f"- **{c.capitalize()}** : ~ {v:.0f} % du temps." for c, v in report["categories"].items()]
+
+    recommendations = ['st.header("3. Recommandations")']
+    for tier, label in TIERS:
+        solutions = report["recommendations"][tier]
+        if not solutions:
+            continue
+        recommendations.append(f"st.subheader({label!r})")
+        recommendations.append(_markdown([
+            f"- {s['solution']} : {s['cost_eur'][0]}-{s['cost_eur'][1]} EUR" for s in solutions
+        ]))
+
+    sections = {
+        "resume": "\n".join([
+            'st.title("Rapport d\'Analyse Acoustique")',
+            f'st.metric(label="Note acoustique", value={report["grade"]!r})',
+            'st.header("1. Résumé de l\'analyse acoustique")',
+            _markdown(summary),
+        ]),
+        "faiblesses": "\n".join([
+            'st.header("2. Faiblesses du logement")',
+            _markdown([f"- {w}" for w in report["weaknesses"]]),
+        ]),
+        "recommandations": "\n".join(recommendations),
+        "a_retenir": "\n".join([
+            'st.header("4. À retenir")',
+            _markdown([f"- {t}" for t in report["takeaways"]]),
+            'st.success("Ces actions simples et progressives vous aideront à rendre votre logement plus calme.")',
+        ]),
+    }
+    return {"sections": sections, "code": "\n\n".join(sections.values())}
+
+
+def main():
+    from sonalyse_advisor.json_utils import gather_all_extracted_data
+
+    parser = argparse.ArgumentParser(description="Diagnostic local par règles (sans LLM)")
+    parser.add_argument("captures", nargs="+", help="Captures JSON à diagnostiquer")
+    parser.add_argument("--room-type", help="pieces[].type de la pièce mesurée")
+    args = parser.parse_args()
+
+    reports = {
+        path: build_report(gather_all_extracted_data(path, args.room_type), args.room_type)
+        for path in args.captures
+    }
+    print(json.dumps(reports, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
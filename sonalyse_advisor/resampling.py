@@ -0,0 +1,185 @@
+"""Regular time grid for captures, with gap detection and coverage.
+
+Segments are placed on a grid of ``step`` seconds with integer index
+arithmetic: slot ``i`` holds the energetic mean of the segments that fall in
+it. Empty slots are gaps. Aggregating over slots rather than over segments
+gives every period of time the same weight, and the share of filled slots
+per hour (its coverage) tells how much of that hour the sensor actually
+heard.
+
+The grid spans the capture from its first to its last segment, so its size
+grows with that span: past ``MAX_SLOTS`` slots the step is widened instead of
+allocating an unbounded grid. Implausible timestamps are rejected upstream by
+``validation.clean_capture``.
+"""
+
+import numpy as np
+
+from sonalyse_advisor.columnar import hour_of_day
+
+DEFAULT_STEP_SECONDS = 10
+# Runs of empty slots at least this long are reported as gaps.
+MIN_GAP_SECONDS = 300
+# Hours below this coverage (%) are flagged as unreliable.
+LOW_COVERAGE_PERCENT = 50.0
+MAX_REPORTED_GAPS = 20
+# Upper bound of the grid size (about 115 days at 10 s); longer spans get a wider step.
+MAX_SLOTS = 1_000_000
+
+
+def infer_step(timestamps: np.ndarray) -> int:
+    """Return the usual spacing (s) between segments, DEFAULT_STEP_SECONDS if unknown."""
+    seconds = np.unique(timestamps[~np.isnat(timestamps)].astype(np.int64))
+    steps = np.diff(seconds)
+    if not len(steps):
+        return DEFAULT_STEP_SECONDS
+    return int(np.median(steps))
+
+
+def grid_step(span_seconds: int, step: int, max_slots: int = MAX_SLOTS) -> int:
+    """Smallest multiple of ``step`` covering ``span_seconds`` in at most ``max_slots`` slots."""
+    slots = span_seconds // step + 1
+    if slots <= max_slots:
+        return step
+    return step * -(-slots // max_slots)
+
+
+def _reduce_by_slot(slots: np.ndarray, values: np.ndarray, ufunc, n_slots: int) -> np.ndarray:
+    """Apply ``ufunc.reduceat`` per slot on sorted slots, NaN for empty slots."""
+    result = np.full(n_slots, np.nan)
+    if not len(slots):
+        return result
+    starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+    result[slots[starts]] = ufunc.reduceat(values, starts)
+    return result
+
+
+def resample(columns: dict, step_seconds: int = None) -> dict:
+    """Put the segments of a capture on a regular grid.
+
+    Args:
+        columns : dict : Columns from ``columnar.to_columns``.
+        step_seconds : int : Grid step, inferred from the segment spacing when omitted.
+            Widened to a multiple of itself when the capture would need more than MAX_SLOTS slots.
+
+    Returns:
+        dict : "timestamp" (datetime64[s] start of each slot), "average_dB"
+            (energetic mean of the slot), "min_dB", "max_dB", "peak_dB"
+            (NaN in empty slots), "segments" (segments per slot) and
+            "step_seconds" (the step actually used). The level columns can be
+            passed to the functions expecting ``to_columns`` output.
+    """
+    timestamps = columns["timestamp"]
+    step = step_seconds or infer_step(timestamps)
+    valid = ~np.isnat(timestamps) & ~np.isnan(columns["average_dB"])
+    seconds = timestamps[valid].astype(np.int64)
+    if not len(seconds):
+        empty = np.array([], dtype=np.float64)
+        return {
+            "timestamp": np.array([], dtype="datetime64[s]"),
+            "average_dB": empty, "min_dB": empty, "max_dB": empty, "peak_dB": empty,
+            "segments": np.array([], dtype=np.int64),
+            "step_seconds": step,
+        }
+
+    step = grid_step(int(seconds.max() - seconds.min()), step)
+    origin = seconds.min() // step * step
+    slots = (seconds - origin) // step
+    n_slots = int(slots.max()) + 1
+    order = np.argsort(slots, kind="stable")
+    slots = slots[order]
+
+    segments = np.bincount(slots, minlength=n_slots)
+    energy = np.bincount(slots, weights=10 ** (columns["average_dB"][valid][order] / 10), minlength=n_slots)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = np.where(segments > 0, 10 * np.log10(energy / segments), np.nan)
+
+    return {
+        "timestamp": (origin + np.arange(n_slots) * step).astype("datetime64[s]"),
+        "average_dB": average,
+        "min_dB": _reduce_by_slot(slots, columns["min_dB"][valid][order], np.fmin, n_slots),
+        "max_dB": _reduce_by_slot(slots, columns["max_dB"][valid][order], np.fmax, n_slots),
+        "peak_dB": _reduce_by_slot(slots, columns["peak_dB"][valid][order], np.fmax, n_slots),
+        "segments": segments,
+        "step_seconds": step,
+    }
+
+
+def average_level(grid: dict) -> float:
+    """Mean level (dB) of the filled slots."""
+    filled = grid["segments"] > 0
+    if not filled.any():
+        return 0
+    return round(float(grid["average_dB"][filled].mean()), 1)
+
+
+def find_gaps(grid: dict, min_gap_seconds: int = MIN_GAP_SECONDS) -> list:
+    """Return the runs of empty slots lasting at least ``min_gap_seconds``.
+
+    Returns:
+        list : [{"start": "YYYY-MM-DD HH:MM:SS", "end": ..., "duration_minutes": float}]
+            sorted by start.
+    """
+    empty = np.r_[False, grid["segments"] == 0, False].astype(np.int8)
+    edges = np.diff(empty)
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    step = grid["step_seconds"]
+    long_enough = (ends - starts) * step >= min_gap_seconds
+
+    timestamps = grid["timestamp"]
+    return [
+        {
+            "start": str(timestamps[start]).replace("T", " "),
+            "end": str(timestamps[end - 1] + np.timedelta64(step, "s")).replace("T", " "),
+            "duration_minutes": round(float((end - start) * step / 60), 1),
+        }
+        for start, end in zip(starts[long_enough], ends[long_enough])
+    ]
+
+
+def hourly_profile(grid: dict) -> dict:
+    """Per clock hour levels and coverage, every slot weighing the same.
+
+    Returns:
+        dict : Clock hour ("HH") -> "average_dB", "min_dB", "max_dB",
+            "peak_dB" (None when the hour has no segment), "coverage" (% of
+            the hour's slots holding a segment) and "low_coverage" (coverage
+            below LOW_COVERAGE_PERCENT).
+            Exemple : {"10": {"average_dB": 41.2, "min_dB": 28.0, "max_dB": 63.0,
+            "peak_dB": 70.0, "coverage": 98.6, "low_coverage": False}}
+    """
+    hours = hour_of_day(grid["timestamp"])
+    filled = grid["segments"] > 0
+    slots_per_hour = np.bincount(hours, minlength=24)
+    filled_per_hour = np.bincount(hours[filled], minlength=24)
+    level_sum = np.bincount(hours[filled], weights=grid["average_dB"][filled], minlength=24)
+
+    profile = {}
+    for hour in np.flatnonzero(slots_per_hour):
+        in_hour = filled & (hours == hour)
+        coverage = round(float(filled_per_hour[hour] / slots_per_hour[hour] * 100), 1)
+        profile[f"{hour:02d}"] = {
+            "average_dB": round(float(level_sum[hour] / filled_per_hour[hour]), 1) if filled_per_hour[hour] else 0,
+            "min_dB": _round_or_none(np.nanmin(grid["min_dB"][in_hour], initial=np.inf)),
+            "max_dB": _round_or_none(np.nanmax(grid["max_dB"][in_hour], initial=-np.inf)),
+            "peak_dB": _round_or_none(np.nanmax(grid["peak_dB"][in_hour], initial=-np.inf)),
+            "coverage": coverage,
+            "low_coverage": coverage < LOW_COVERAGE_PERCENT,
+        }
+    return profile
+
+
+def _round_or_none(value: float):
+    return None if not np.isfinite(value) else round(float(value), 1)
+
+
+def coverage_summary(grid: dict, max_gaps: int = MAX_REPORTED_GAPS) -> dict:
+    """Overall coverage of a capture and its longest gaps."""
+    gaps = find_gaps(grid)
+    return {
+        "step_seconds": grid["step_seconds"],
+        "coverage_percentage": round(float((grid["segments"] > 0).mean() * 100), 1) if len(grid["segments"]) else 0.0,
+        "gap_count": len(gaps),
+        "gap_minutes": round(sum(gap["duration_minutes"] for gap in gaps), 1),
+        "longest_gaps": sorted(gaps, key=lambda gap: gap["duration_minutes"], reverse=True)[:max_gaps],
+    }
@@ -0,0 +1,249 @@
+"""Portfolio-wide index of room diagnostics.
+
+Each room's aggregated diagnostic (from ``gather_extracted_data``) is stored
+in SQLite next to the accommodation fields of ``data/logement*.json``.
+Queries such as "bedrooms with night Leq > 40 dB in 69002" or "average grade
+by ville and étage" then hit indexed columns instead of re-aggregating raw
+captures.
+
+Usage:
+    python -m sonalyse_advisor.results_index index --db results.sqlite \\
+        --logement data/logement1.json --room "Chambre principale" --capture capture.json
+    python -m sonalyse_advisor.results_index rollup --db results.sqlite --by ville etage
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+
+from sonalyse_advisor.grading import GRADE_LETTERS, normalize_room_type
+from sonalyse_advisor.json_utils import gather_all_extracted_data, load_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logements (
+    id INTEGER PRIMARY KEY,
+    nom TEXT,
+    adresse TEXT,
+    code_postal TEXT,
+    ville TEXT,
+    type_de_logement TEXT,
+    etage INTEGER,
+    typologie TEXT
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    logement_id INTEGER NOT NULL REFERENCES logements(id),
+    nom TEXT NOT NULL,
+    type TEXT,
+    surface_m2 REAL,
+    UNIQUE (logement_id, nom)
+);
+CREATE TABLE IF NOT EXISTS room_results (
+    room_id INTEGER NOT NULL REFERENCES rooms(id),
+    capture TEXT NOT NULL,
+    average_db REAL,
+    day_leq_db REAL,
+    night_leq_db REAL,
+    grade TEXT,
+    grade_rank INTEGER,
+    dominant_noise TEXT,
+    indexed_at REAL,
+    PRIMARY KEY (room_id, capture)
+);
+CREATE TABLE IF NOT EXISTS hourly_results (
+    room_id INTEGER NOT NULL REFERENCES rooms(id),
+    capture TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    average_db REAL,
+    min_db REAL,
+    max_db REAL,
+    peak_db REAL,
+    dominant_noise TEXT,
+    PRIMARY KEY (room_id, capture, hour)
+);
+CREATE INDEX IF NOT EXISTS idx_logements_code_postal ON logements (code_postal);
+CREATE INDEX IF NOT EXISTS idx_logements_ville_etage ON logements (ville, etage);
+CREATE INDEX IF NOT EXISTS idx_rooms_type ON rooms (type, logement_id);
+CREATE INDEX IF NOT EXISTS idx_results_night ON room_results (night_leq_db);
+CREATE INDEX IF NOT EXISTS idx_results_grade ON room_results (grade_rank);
+"""
+
+ROLLUP_COLUMNS = {
+    "ville": "l.ville",
+    "code_postal": "l.code_postal",
+    "etage": "l.etage",
+    "typologie": "l.typologie",
+    "type_de_logement": "l.type_de_logement",
+    "room_type": "r.type",
+}
+
+
+class ResultsIndex:
+    """SQLite store of per-room diagnostics with indexed queries.
+
+    Args:
+        path : str : Database file, ":memory:" for a throwaway index.
+    """
+
+    def __init__(self, path: str = "results.sqlite"):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def upsert_logement(self, logement: dict) -> int:
+        """Insert or update an accommodation and its rooms, return its id."""
+        with self.connection:
+            self.connection.execute(
+                """INSERT INTO logements (id, nom, adresse, code_postal, ville, type_de_logement, etage, typologie)
+                VALUES (:id, :nom_du_logement, :adresse, :code_postal, :ville, :type_de_logement, :etage, :typologie)
+                ON CONFLICT (id) DO UPDATE SET
+                    nom = excluded.nom, adresse = excluded.adresse, code_postal = excluded.code_postal,
+                    ville = excluded.ville, type_de_logement = excluded.type_de_logement,
+                    etage = excluded.etage, typologie = excluded.typologie""",
+                {key: logement.get(key) for key in (
+                    "id", "nom_du_logement", "adresse", "code_postal", "ville",
+                    "type_de_logement", "etage", "typologie",
+                )},
+            )
+            for piece in logement.get("pieces", []):
+                self.connection.execute(
+                    """INSERT INTO rooms (logement_id, nom, type, surface_m2) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (logement_id, nom) DO UPDATE SET type = excluded.type, surface_m2 = excluded.surface_m2""",
+                    (logement["id"], piece["nom_de_la_piece"], normalize_room_type(piece.get("type")),
+                     piece.get("surface_m2")),
+                )
+        return logement["id"]
+
+    def room_id(self, logement_id: int, room_name: str) -> int:
+        row = self.connection.execute(
+            "SELECT id FROM rooms WHERE logement_id = ? AND nom = ?", (logement_id, room_name)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Pièce inconnue pour le logement {logement_id} : {room_name}")
+        return row["id"]
+
+    def add_room_result(self, logement_id: int, room_name: str, capture: str, all_data: dict):
+        """Store the diagnostic of one room (output of ``gather_extracted_data``)."""
+        room_id = self.room_id(logement_id, room_name)
+        daily, hourly = all_data["daily"], all_data["hourly"]
+        grade = daily["average_daily_rating"]
+        noise = daily["noise_daily_percentage"]
+        leq = daily.get("period_leq_dB", {})
+
+        with self.connection:
+            self.connection.execute(
+                """INSERT OR REPLACE INTO room_results
+                (room_id, capture, average_db, day_leq_db, night_leq_db, grade, grade_rank, dominant_noise, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (room_id, capture, daily["average_daily_db"], leq.get("day"), leq.get("night"), grade,
+                 GRADE_LETTERS.index(grade) if grade in GRADE_LETTERS else None,
+                 next(iter(noise), None), time.time()),
+            )
+            self.connection.execute("DELETE FROM hourly_results WHERE room_id = ? AND capture = ?", (room_id, capture))
+            self.connection.executemany(
+                """INSERT INTO hourly_results
+                (room_id, capture, hour, average_db, min_db, max_db, peak_db, dominant_noise)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [
+                    (room_id, capture, int(hour), values["average_dB"], values["min_dB"], values["max_dB"],
+                     values["peak_dB"], hourly["noise_hourly_percentage"].get(hour, {}).get("noise_type"))
+                    for hour, values in hourly["db_min_max_peak_per_hour"].items()
+                ],
+            )
+
+    def index_capture(self, logement: dict, room_name: str, json_path: str):
+        """Aggregate a capture once and index it for a room of ``logement``."""
+        logement_id = self.upsert_logement(logement)
+        room_type = next(
+            (p.get("type") for p in logement.get("pieces", []) if p["nom_de_la_piece"] == room_name), None
+        )
+        self.add_room_result(logement_id, room_name, json_path, gather_all_extracted_data(json_path, room_type))
+
+    def rooms_above(self, night_leq_min: float, code_postal: str = None, room_type: str = None) -> list:
+        """Rooms whose night Leq exceeds ``night_leq_min`` dB, optionally filtered.
+
+        Exemple : ``rooms_above(40, code_postal="69002", room_type="Chambre")``.
+        """
+        query = """SELECT l.id AS logement_id, l.nom AS logement, l.ville, l.code_postal, l.etage,
+                r.nom AS piece, r.type, res.capture, res.night_leq_db, res.grade
+            FROM room_results res
+            JOIN rooms r ON r.id = res.room_id
+            JOIN logements l ON l.id = r.logement_id
+            WHERE res.night_leq_db > ?"""
+        params = [night_leq_min]
+        if code_postal is not None:
+            query += " AND l.code_postal = ?"
+            params.append(code_postal)
+        if room_type is not None:
+            query += " AND r.type = ?"
+            params.append(normalize_room_type(room_type))
+        query += " ORDER BY res.night_leq_db DESC"
+        return [dict(row) for row in self.connection.execute(query, params)]
+
+    def grade_rollup(self, by=("ville", "etage")) -> list:
+        """Average grade, night Leq and room count grouped by accommodation fields.
+
+        Args:
+            by : tuple : Names from ROLLUP_COLUMNS, e.g. ("ville", "etage").
+        """
+        columns = [ROLLUP_COLUMNS[name] for name in by]
+        select = ", ".join(f"{column} AS {name}" for column, name in zip(columns, by))
+        rows = self.connection.execute(
+            f"""SELECT {select}, COUNT(*) AS rooms, AVG(res.grade_rank) AS grade_rank,
+                AVG(res.night_leq_db) AS night_leq_db, AVG(res.day_leq_db) AS day_leq_db
+            FROM room_results res
+            JOIN rooms r ON r.id = res.room_id
+            JOIN logements l ON l.id = r.logement_id
+            GROUP BY {", ".join(columns)}
+            ORDER BY {", ".join(columns)}"""
+        )
+        results = []
+        for row in rows:
+            result = dict(row)
+            rank = result.pop("grade_rank")
+            result["average_grade"] = GRADE_LETTERS[round(rank)] if rank is not None else "N/A"
+            result["average_grade_rank"] = None if rank is None else round(rank, 2)
+            results.append(result)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index des diagnostics du parc de logements")
+    parser.add_argument("--db", default="results.sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="Indexer la capture d'une pièce")
+    index.add_argument("--logement", required=True, help="Fichier logement (data/logement1.json)")
+    index.add_argument("--room", required=True, help="nom_de_la_piece mesurée")
+    index.add_argument("--capture", required=True, help="Capture JSON de la pièce")
+
+    above = commands.add_parser("above", help="Pièces dont le Leq nuit dépasse un seuil")
+    above.add_argument("night_leq", type=float)
+    above.add_argument("--code-postal")
+    above.add_argument("--room-type")
+
+    rollup = commands.add_parser("rollup", help="Note moyenne par champs du logement")
+    rollup.add_argument("--by", nargs="+", default=["ville", "etage"], choices=sorted(ROLLUP_COLUMNS))
+
+    args = parser.parse_args()
+    results_index = ResultsIndex(args.db)
+    if args.command == "index":
+        for logement in load_json(args.logement):
+            if any(p["nom_de_la_piece"] == args.room for p in logement.get("pieces", [])):
+                results_index.index_capture(logement, args.room, args.capture)
+        return
+    if args.command == "above":
+        rows = results_index.rooms_above(args.night_leq, args.code_postal, args.room_type)
+    else:
+        rows = results_index.grade_rollup(tuple(args.by))
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""Headless HTTP analysis service, next to the Streamlit UI.
+
+Other systems post captures and request their diagnostics without opening
+UI sessions:
+
+    POST /captures                       capture body (JSON, gzip, xz or zstd), stored by
+                                         content hash (see ``uploads``) -> {"sha256", ...}
+    GET  /captures/<sha256>/aggregates   aggregated data (``agent_backend.prompt_data``)
+    GET  /captures/<sha256>/d3           D3 payload, streamed
+    GET  /captures/<sha256>/pdf          PDF report, streamed
+    GET  /captures/<sha256>/report       report sections as NDJSON lines, streamed as each
+                                         section completes (``?llm=1`` for the AI report)
+    GET  /health                         pool, queue and request counters
+
+``room_type`` and ``accommodation`` (a file name in ``data/``) are query
+parameters. Artifacts and AI report sections are built by the incremental
+pipeline (``pipeline``) in a bounded pool of worker processes, sharing its
+on-disk cache, and identical concurrent requests share one build. The
+request threads only wait for the pool: the fingerprints of the inputs are
+computed by the workers. At most ``max_pending`` requests are admitted at
+once; the others get ``503`` with ``Retry-After`` so that clients back off
+instead of piling up.
+
+Usage:
+    python -m sonalyse_advisor.service --port 8600 --workers 4 --max-pending 32
+    curl --data-binary @data/dps_analysis_pi3_exemple.json http://127.0.0.1:8600/captures
+"""
+
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sonalyse_advisor.pipeline import DEFAULT_CACHE_DIR, DEFAULT_CONTEXT_PATH, Pipeline, default_params
+from sonalyse_advisor.single_flight import SingleFlight
+from sonalyse_advisor.uploads import UPLOAD_DIR, find_upload, ingest_stream
+
+DATA_DIR = "data"
+DEFAULT_ACCOMMODATION = "logement1.json"
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+RETRY_AFTER_SECONDS = 1
+ARTIFACT_ROUTE = re.compile(r"^/captures/([0-9a-f]{64})/(aggregates|d3|pdf|report)$")
+# Endpoint -> pipeline artifact.
+ENDPOINT_ARTIFACTS = {"aggregates": "aggregates", "d3": "d3_data", "pdf": "pdf", "report": "report"}
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def build_artifact(sources: dict, params: dict, cache_dir: str, name: str):
+    """Build (or load from the pipeline cache) one artifact, in a worker process."""
+    return Pipeline(sources, params, cache_dir).get(name)
+
+
+def build_section(sources: dict, params: dict, cache_dir: str, key: str) -> str:
+    """Generate one AI report section from the cached prompt and aggregates, in a worker process."""
+    from sonalyse_advisor.agent_backend import generate_section, local_report
+
+    pipeline = Pipeline(sources, params, cache_dir)
+    local = local_report(pipeline.get("aggregates"), params.get("room_type"))
+    return generate_section(pipeline.get("prompt"), key, local)
+
+
+class _BodyReader(io.RawIOBase):
+    """Request body of known length, read as a binary stream."""
+
+    def __init__(self, rfile, length: int):
+        self.rfile = rfile
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.remaining)
+        if size == 0:
+            return 0
+        data = self.rfile.read(size)
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+def _chunks(data: bytes):
+    for start in range(0, len(data), STREAM_CHUNK_BYTES):
+        yield data[start:start + STREAM_CHUNK_BYTES]
+
+
+def _json_chunks(value):
+    """Encode ``value`` as JSON piece by piece, grouped into chunks of about STREAM_CHUNK_BYTES."""
+    buffer, size = [], 0
+    for piece in json.JSONEncoder(ensure_ascii=False).iterencode(value):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_BYTES:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+class AnalysisService:
+    """Worker pool, admission control and artifact requests of the service.
+
+    Args:
+        workers : int : Worker processes building the artifacts.
+        max_pending : int : Requests admitted at once (running or queued), beyond which 503 is returned.
+        upload_dir : str : Directory of the posted captures.
+        cache_dir : str : Pipeline cache, shared by the workers.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, upload_dir: str = UPLOAD_DIR,
+                 cache_dir: str = DEFAULT_CACHE_DIR):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self.upload_dir = upload_dir
+        self.cache_dir = cache_dir
+        # spawn: the server already runs threads when the pool starts its processes
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.single_flight = SingleFlight(cross_process=False)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rejected": 0, "in_flight": 0, "errors": 0}
+
+    def _count(self, key: str, delta: int = 1):
+        with self._lock:
+            self.stats[key] += delta
+
+    def admit(self) -> bool:
+        """Take a request slot, False when the queue is full."""
+        self._count("requests")
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            return False
+        self._count("in_flight")
+        return True
+
+    def release(self):
+        self._count("in_flight", -1)
+        self._slots.release()
+
+    def health(self) -> dict:
+        with self._lock:
+            return dict(self.stats, workers=self.workers, max_pending=self.max_pending,
+                        shared_builds=self.single_flight.stats["shared_thread"])
+
+    def sources(self, sha256: str, query: dict) -> dict:
+        entry = find_upload(sha256, self.upload_dir)
+        if entry is None:
+            raise ServiceError(404, f"Capture inconnue : {sha256}")
+        accommodation = os.path.basename(query.get("accommodation", DEFAULT_ACCOMMODATION))
+        accommodation_path = os.path.join(DATA_DIR, accommodation)
+        if not accommodation.endswith(".json") or not os.path.exists(accommodation_path):
+            raise ServiceError(400, f"Logement inconnu : {accommodation}")
+        return {"capture": entry["path"], "accommodation": accommodation_path, "context": DEFAULT_CONTEXT_PATH}
+
+    def _shared(self, build, *args):
+        """``build(*args)`` run by the pool, identical concurrent requests sharing one run.
+
+        The key is made of the arguments only (the capture path contains its
+        content hash), so nothing is read or hashed on the request thread.
+        """
+        key = json.dumps([build.__name__, args], sort_keys=True)
+        return self.single_flight.do(key, lambda: self.pool.submit(build, *args).result())
+
+    def artifact(self, sources: dict, params: dict, name: str):
+        """Artifact built by the pool, identical concurrent requests sharing one build."""
+        return self._shared(build_artifact, sources, params, self.cache_dir, name)
+
+    def _sections(self, sources: dict, params: dict):
+        """``(key, code)`` of the AI report sections built by the pool, in completion order."""
+        from sonalyse_advisor.agent_backend import REPORT_SECTIONS
+
+        # Prompt and aggregates are cached before the sections read them
+        self.artifact(sources, params, "prompt")
+        with ThreadPoolExecutor(max_workers=len(REPORT_SECTIONS)) as executor:
+            futures = {
+                executor.submit(self._shared, build_section, sources, params, self.cache_dir, key): key
+                for key, _, _ in REPORT_SECTIONS
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def report_lines(self, sources: dict, room_type: str, use_llm: bool):
+        """NDJSON lines of the report sections, each sent as soon as it is ready."""
+        from sonalyse_advisor.agent_backend import REPORT_SECTIONS, llm_available
+
+        start = time.perf_counter()
+        if use_llm and llm_available():
+            sections = self._sections(sources, default_params(room_type, True))
+        else:
+            report = self.artifact(sources, default_params(room_type), "report")
+            sections = ((key, report["sections"][key]) for key, _, _ in REPORT_SECTIONS)
+        for key, code in sections:
+            yield (json.dumps({"section": key, "code": code}, ensure_ascii=False) + "\n").encode()
+        yield (json.dumps({"done": True, "seconds": round(time.perf_counter() - start, 3)}) + "\n").encode()
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def make_handler(service: AnalysisService):
+    class AnalysisHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_stream(self, content_type: str, chunks):
+            """Chunked response: the first chunk is built before the headers so that errors keep their status."""
+            chunks = iter(chunks)
+            first = next(chunks, b"")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for chunk in itertools.chain([first], chunks):
+                    if chunk:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except Exception:
+                # The status is already sent: cut the connection so the client sees a truncated body
+                service._count("errors")
+                self.close_connection = True
+
+        def _admitted(self, handle):
+            if not service.admit():
+                self._send_json(503, {"error": "File d'attente pleine, réessayez"},
+                                {"Retry-After": str(RETRY_AFTER_SECONDS)})
+                self.close_connection = True
+                return
+            try:
+                handle()
+            except ServiceError as error:
+                self._send_json(error.status, {"error": str(error)})
+            except Exception as error:
+                service._count("errors")
+                self._send_json(500, {"error": str(error)})
+            finally:
+                service.release()
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._send_json(200, service.health())
+                return
+            match = ARTIFACT_ROUTE.match(url.path)
+            if match is None:
+                self._send_json(404, {"error": "not found"})
+                return
+            sha256, endpoint = match.groups()
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            self._admitted(lambda: self._artifact(sha256, endpoint, query))
+
+        def _artifact(self, sha256: str, endpoint: str, query: dict):
+            sources = service.sources(sha256, query)
+            room_type = query.get("room_type")
+            if endpoint == "report":
+                use_llm = query.get("llm") not in (None, "", "0")
+                self._send_stream("application/x-ndjson", service.report_lines(sources, room_type, use_llm))
+                return
+            value = service.artifact(sources, default_params(room_type), ENDPOINT_ARTIFACTS[endpoint])
+            if endpoint == "pdf":
+                self._send_stream("application/pdf", _chunks(value))
+            elif endpoint == "d3":
+                self._send_stream("application/json", _json_chunks(value))
+            else:
+                self._send_json(200, value)
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/captures":
+                self._send_json(404, {"error": "not found"})
+                return
+            if "Content-Length" not in self.headers:
+                self._send_json(411, {"error": "Content-Length requis"})
+                self.close_connection = True
+                return
+            try:
+                length = int(self.headers["Content-Length"])
+            except ValueError:
+                length = -1
+            if length < 0:
+                self._send_json(400, {"error": "Content-Length invalide"})
+                self.close_connection = True
+                return
+            if length > MAX_UPLOAD_BYTES:
+                self._send_json(413, {"error": f"Capture de plus de {MAX_UPLOAD_BYTES} octets"})
+                self.close_connection = True
+                return
+            self._admitted(lambda: self._upload(length))
+
+        def _upload(self, length: int):
+            # A client that sends the hash of a known capture gets the answer without uploading it
+            known = find_upload(self.headers.get("X-Content-SHA256", "").lower(), service.upload_dir)
+            if known is not None:
+                self._send_json(200, dict(known, duplicate=True))
+                self.close_connection = True
+                return
+            body = _BodyReader(self.rfile, length)
+            try:
+                entry, _ = ingest_stream(body, self.headers.get("X-Filename", "capture.json"), service.upload_dir)
+            except ValueError as error:
+                raise ServiceError(400, f"Capture illisible : {error}")
+            finally:
+                # Leave the connection usable even when the parser stopped early, one chunk at a time
+                while body.read(STREAM_CHUNK_BYTES):
+                    pass
+            self._send_json(201, dict(entry, duplicate=False))
+
+    return AnalysisHandler
+
+
+def start_service(host: str = "127.0.0.1", port: int = 0, service: AnalysisService = None) -> tuple:
+    """Start the service in a background thread.
+
+    Returns:
+        tuple : (server, base_url). Call ``server.shutdown()`` then ``server.service.shutdown()`` to stop it.
+    """
+    service = service or AnalysisService()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP d'analyse (sans interface Streamlit)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, help="Processus de calcul (nombre de CPU par défaut)")
+    parser.add_argument("--max-pending", type=int, help="Requêtes admises à la fois (8 par processus par défaut)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    service = AnalysisService(args.workers, args.max_pending, cache_dir=args.cache_dir)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    server.daemon_threads = True
+    print(f"🩺 Service d'analyse sur http://{args.host}:{args.port} "
+          f"({service.workers} processus, {service.max_pending} requêtes admises)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
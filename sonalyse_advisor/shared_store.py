@@ -0,0 +1,96 @@
+"""Process-wide store of the data derived from captures.
+
+Every Streamlit session viewing the same capture reads the same entry (the
+dashboard data of ``app.build_dashboard_data``), computed once. Entries are
+kept pickled and each read returns a fresh copy, so a session that mutates
+its data cannot change what the other sessions see. Entries are evicted in
+LRU order once the memory budget is exceeded. Streamlit serves all sessions
+from one process, so the app shares a single store through
+``st.cache_resource``.
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+DEFAULT_BUDGET_BYTES = 256 * 1024 * 1024
+
+
+def capture_key(json_path: str) -> tuple:
+    """Identify a capture file by path, size and modification time."""
+    stat = os.stat(json_path)
+    return (os.path.abspath(json_path), stat.st_size, stat.st_mtime_ns)
+
+
+class SharedCaptureStore:
+    """Thread-safe LRU cache of captures bounded by a memory budget.
+
+    Args:
+        budget_bytes : int : Size of the pickled entries the store may hold.
+    """
+
+    def __init__(self, budget_bytes: int = DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, key, loader):
+        """Return a copy of the entry for ``key``, building it with ``loader()`` on a miss.
+
+        Concurrent misses on the same key wait for a single load.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(self._entries[key])
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return pickle.loads(self._entries[key])
+                self.misses += 1
+            value = loader()
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                self._entries[key] = blob
+                self._sizes[key] = len(blob)
+                self._loading.pop(key, None)
+                self._evict(keep=key)
+        # The loaded value itself is not stored: the caller may keep it as its copy
+        return value
+
+    def _evict(self, keep):
+        while self.nbytes > self.budget_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                self._entries.move_to_end(key)
+                key = next(iter(self._entries))
+            del self._entries[key]
+            del self._sizes[key]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
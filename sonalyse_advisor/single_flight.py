@@ -0,0 +1,199 @@
+"""Single-flight execution of identical in-flight computations.
+
+Concurrent calls of ``SingleFlight.do`` with the same key run the function
+once and all receive its result (or its exception). Within a process the
+followers wait for the leader thread. Across processes (several Streamlit
+workers, the CLI next to the app) the leader of each process takes an
+exclusive lock file per key; the process that gets it first computes and
+writes the result (JSON) next to the lock. The others were blocked on the
+lock meanwhile and read that result instead of recomputing. A result written
+before a process started waiting (give or take the resolution of file
+times) is not used, so this is not a cache: every process waiting on a key
+holds a shared lock on its ``.wait`` file, and the last one to leave deletes
+the key's files.
+
+Lock files live in a directory private to the user (mode 0700); a directory
+owned by someone else or open to other users disables the sharing between
+processes. Without ``fcntl`` (Windows), calls are only shared between threads.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+DEFAULT_LOCK_DIR = os.path.join(
+    tempfile.gettempdir(), f"sonalyse-single-flight-{os.getuid() if hasattr(os, 'getuid') else 'user'}"
+)
+# File modification times come from a coarse clock (a few ms behind time.time_ns).
+MTIME_SLACK_NS = 20_000_000
+
+_MISSING = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def private_directory(path: str) -> bool:
+    """Create ``path`` with mode 0700 if needed; True if it is a directory only its owner (this user) can use."""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid()
+            and not info.st_mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+
+def _open_locked(path: str, operation: int):
+    """Open and flock ``path``, retrying if it was deleted meanwhile by the last user of the key."""
+    while True:
+        file = open(path, "a")
+        fcntl.flock(file, operation)
+        try:
+            if os.fstat(file.fileno()).st_ino == os.stat(path).st_ino:
+                return file
+        except FileNotFoundError:
+            pass
+        file.close()
+
+
+class SingleFlight:
+    """Share the result of identical concurrent calls between threads and processes.
+
+    Args:
+        lock_dir : str : Directory of the lock and result files, private to the user.
+        cross_process : bool : Also share calls with the other processes using ``lock_dir``.
+            Only JSON-serializable results are shared between processes.
+    """
+
+    def __init__(self, lock_dir: str = DEFAULT_LOCK_DIR, cross_process: bool = True):
+        self.lock_dir = lock_dir
+        self.cross_process = cross_process and fcntl is not None
+        self._calls = {}
+        self._lock = threading.Lock()
+        # computed: runs of the function; shared_thread / shared_process: calls answered by another one
+        self.stats = {"computed": 0, "shared_thread": 0, "shared_process": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def do(self, key: str, fn):
+        """Return ``fn()``, computed once for all the concurrent calls with ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.stats["shared_thread"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._run(key, fn)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def _run(self, key: str, fn):
+        if not self.cross_process:
+            self._count("computed")
+            return fn()
+
+        if not private_directory(self.lock_dir):
+            self._count("computed")
+            return fn()
+
+        base = os.path.join(self.lock_dir, hashlib.sha256(key.encode()).hexdigest())
+        waiting_since = time.time_ns() - MTIME_SLACK_NS
+        wait_file = _open_locked(f"{base}.wait", fcntl.LOCK_SH)
+        try:
+            with open(f"{base}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    value = self._read_result(f"{base}.result", waiting_since)
+                    if value is not _MISSING:
+                        self._count("shared_process")
+                        return value
+                    self._count("computed")
+                    value = fn()
+                    self._write_result(f"{base}.result", value)
+                    return value
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            self._leave(base, wait_file)
+
+    @staticmethod
+    def _leave(base: str, wait_file):
+        """Release the key; the last process waiting on it deletes its files."""
+        try:
+            fcntl.flock(wait_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another process still waits for the result
+            return
+        finally:
+            wait_file.close()
+        for suffix in (".result", ".lock", ".wait"):
+            try:
+                os.remove(base + suffix)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _read_result(path: str, waiting_since: int):
+        """Result written by another process while this one was waiting, else _MISSING."""
+        try:
+            if os.stat(path).st_mtime_ns < waiting_since:
+                return _MISSING
+            with open(path, "r") as file:
+                return json.load(file)["value"]
+        except (OSError, ValueError, KeyError):
+            return _MISSING
+
+    @staticmethod
+    def _write_result(path: str, value):
+        try:
+            payload = json.dumps({"value": value}, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(payload)
+        os.replace(tmp_path, path)
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight group, creating it on first use."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
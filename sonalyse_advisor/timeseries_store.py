@@ -0,0 +1,314 @@
+"""Append-only, long-term time-series store of room measurements.
+
+Each append writes new Parquet files and never rewrites existing ones:
+
+    <root>/room=<room>/segments/date=<YYYY-MM-DD>/<part>.parquet
+    <root>/room=<room>/rollup=<hour|day|month>/<part>.parquet
+
+Segment files hold the validated segment columns. Rollup files hold
+mergeable partial aggregates per bucket (counts, energy sums by day and
+night, min/max/peak), so several appends touching the same bucket are
+combined at read time and ``compact`` can fold them into a single file. A
+query such as "monthly night Leq over the last year" reads a few kilobytes
+of month rollups instead of months of raw segments.
+
+Usage:
+    python -m sonalyse_advisor.timeseries_store append --root store --room "Chambre principale" capture.json
+    python -m sonalyse_advisor.timeseries_store trend --root store --room "Chambre principale" --resolution month
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from sonalyse_advisor.baseline import NIGHT_HOURS
+from sonalyse_advisor.columnar import FLOAT_FIELDS, hour_of_day
+from sonalyse_advisor.validation import clean_capture
+
+# Rollup resolution -> numpy datetime unit of its buckets.
+RESOLUTIONS = {"hour": "h", "day": "D", "month": "M"}
+SUM_FIELDS = ("count", "energy", "day_count", "day_energy", "night_count", "night_energy")
+LEVEL_REDUCERS = {"min_dB": np.fmin, "max_dB": np.fmax, "peak_dB": np.fmax}
+
+
+def _to_datetime(value) -> np.datetime64:
+    return None if value is None else np.datetime64(value, "s")
+
+
+def _part_name() -> str:
+    return f"{time.time_ns()}-{os.getpid()}.parquet"
+
+
+def rollup_columns(timestamps: np.ndarray, levels: np.ndarray, columns: dict, resolution: str) -> dict:
+    """Partial aggregates of segments per bucket of ``resolution``."""
+    buckets = timestamps.astype(f"datetime64[{RESOLUTIONS[resolution]}]")
+    keys, index = np.unique(buckets, return_inverse=True)
+    energy = 10 ** (levels / 10)
+    night = np.isin(hour_of_day(timestamps), NIGHT_HOURS)
+
+    # Weighted counts of an empty period come back as int64: keep every part float64 so parts concatenate
+    rollup = {
+        "bucket": keys.astype("datetime64[s]"),
+        "count": np.bincount(index, minlength=len(keys)),
+        "energy": np.bincount(index, weights=energy, minlength=len(keys)).astype(np.float64),
+        "day_count": np.bincount(index[~night], minlength=len(keys)),
+        "day_energy": np.bincount(index[~night], weights=energy[~night], minlength=len(keys)).astype(np.float64),
+        "night_count": np.bincount(index[night], minlength=len(keys)),
+        "night_energy": np.bincount(index[night], weights=energy[night], minlength=len(keys)).astype(np.float64),
+    }
+    order = np.argsort(index, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(index[order]) != 0]) if len(index) else np.array([], dtype=np.int64)
+    for name, ufunc in LEVEL_REDUCERS.items():
+        rollup[name] = ufunc.reduceat(columns[name][order], starts) if len(index) else np.array([])
+    return rollup
+
+
+def merge_rollups(rollup: dict) -> dict:
+    """Combine the rows of concatenated rollup parts that share a bucket."""
+    keys, index = np.unique(rollup["bucket"], return_inverse=True)
+    merged = {"bucket": keys}
+    for name in SUM_FIELDS:
+        merged[name] = np.bincount(index, weights=rollup[name], minlength=len(keys))
+    order = np.argsort(index, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(index[order]) != 0]) if len(index) else np.array([], dtype=np.int64)
+    for name, ufunc in LEVEL_REDUCERS.items():
+        merged[name] = ufunc.reduceat(rollup[name][order], starts) if len(index) else np.array([])
+    return merged
+
+
+def _leq(energy: np.ndarray, count: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 0, 10 * np.log10(energy / count), np.nan)
+
+
+class TimeSeriesStore:
+    """Append-only store of segments and multi-resolution rollups per room.
+
+    Args:
+        root : str : Root directory of the store.
+    """
+
+    def __init__(self, root: str = "timeseries"):
+        self.root = root
+
+    def _room_dir(self, room: str) -> str:
+        return os.path.join(self.root, f"room={room}")
+
+    def rooms(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[len("room="):] for name in os.listdir(self.root) if name.startswith("room="))
+
+    def segments_version(self, room: str) -> str:
+        """Token that changes whenever segments of ``room`` are appended, None without any.
+
+        Part files are never rewritten, so their names identify the stored segments.
+        """
+        directory = os.path.join(self._room_dir(room), "segments")
+        parts = sorted(
+            os.path.relpath(os.path.join(path, name), directory)
+            for path, _, names in os.walk(directory) for name in names if name.endswith(".parquet")
+        )
+        return hashlib.sha1("\n".join(parts).encode()).hexdigest() if parts else None
+
+    def _write(self, directory: str, columns: dict):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, _part_name())
+        pq.write_table(pa.table(columns), f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def append(self, room: str, json_data: list) -> int:
+        """Validate segment records and append them and their rollups.
+
+        Returns:
+            int : Number of segments stored.
+        """
+        import pyarrow as pa
+
+        _, columns, _ = clean_capture(json_data)
+        timestamps = columns["timestamp"]
+        if not len(timestamps):
+            return 0
+        levels = columns["average_dB"]
+        room_dir = self._room_dir(room)
+
+        days, day_index = np.unique(timestamps.astype("datetime64[D]"), return_inverse=True)
+        labels = np.array(columns["labels"] + (None,), dtype=object)
+        for i, day in enumerate(days):
+            rows = day_index == i
+            segment_columns = {"timestamp": pa.array(timestamps[rows], type=pa.timestamp("s"))}
+            for name in FLOAT_FIELDS:
+                segment_columns[name] = columns[name][rows]
+            segment_columns["label"] = pa.array(labels[columns["label"][rows]], type=pa.string()).dictionary_encode()
+            self._write(os.path.join(room_dir, "segments", f"date={day}"), segment_columns)
+
+        for resolution in RESOLUTIONS:
+            rollup = rollup_columns(timestamps, levels, columns, resolution)
+            rollup["bucket"] = pa.array(rollup["bucket"], type=pa.timestamp("s"))
+            self._write(os.path.join(room_dir, f"rollup={resolution}"), rollup)
+        return int(len(timestamps))
+
+    def read_segments(self, room: str, start=None, end=None, columns=None) -> dict:
+        """Segment columns of a room in [start, end), reading only the matching days.
+
+        Args:
+            start, end : str or datetime64 : Range bounds, open when None.
+            columns : list : Columns to read besides "timestamp", all by default.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        start, end = _to_datetime(start), _to_datetime(end)
+        segments_dir = os.path.join(self._room_dir(room), "segments")
+        names = ["timestamp"] + list(columns or list(FLOAT_FIELDS) + ["label"])
+        tables = []
+        for partition in sorted(os.listdir(segments_dir)) if os.path.isdir(segments_dir) else []:
+            day = np.datetime64(partition[len("date="):], "D")
+            if (start is not None and day + np.timedelta64(1, "D") <= start) or (end is not None and day >= end):
+                continue
+            directory = os.path.join(segments_dir, partition)
+            tables += [pq.read_table(os.path.join(directory, part), columns=names)
+                       for part in sorted(os.listdir(directory)) if part.endswith(".parquet")]
+        if not tables:
+            return {name: np.array([]) for name in names}
+
+        table = pa.concat_tables(tables)
+        result = {"timestamp": table["timestamp"].to_numpy().astype("datetime64[s]")}
+        for name in names[1:]:
+            column = table[name]
+            result[name] = np.array(column.to_pylist(), dtype=object) if name == "label" else column.to_numpy()
+        order = np.argsort(result["timestamp"], kind="stable")
+        keep = np.ones(len(order), dtype=bool)
+        if start is not None:
+            keep &= result["timestamp"][order] >= start
+        if end is not None:
+            keep &= result["timestamp"][order] < end
+        return {name: values[order][keep] for name, values in result.items()}
+
+    def _read_rollup_parts(self, room: str, resolution: str) -> dict:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        directory = os.path.join(self._room_dir(room), f"rollup={resolution}")
+        parts = sorted(p for p in os.listdir(directory) if p.endswith(".parquet")) if os.path.isdir(directory) else []
+        if not parts:
+            return None
+        table = pa.concat_tables([pq.read_table(os.path.join(directory, part)) for part in parts])
+        rollup = {name: table[name].to_numpy() for name in table.column_names}
+        rollup["bucket"] = rollup["bucket"].astype("datetime64[s]")
+        return rollup
+
+    def read_rollup(self, room: str, resolution: str = "day", start=None, end=None) -> dict:
+        """Merged rollup of a room with its Leq per bucket.
+
+        Returns:
+            dict : "bucket" (datetime64[s]), the SUM_FIELDS and LEVEL_REDUCERS
+                columns, plus "leq_dB", "day_leq_dB" and "night_leq_dB"
+                (NaN where a bucket has no segment of that period).
+        """
+        rollup = self._read_rollup_parts(room, resolution)
+        if rollup is None:
+            empty = np.array([])
+            return {"bucket": np.array([], dtype="datetime64[s]"), "leq_dB": empty,
+                    "day_leq_dB": empty, "night_leq_dB": empty, "count": empty}
+
+        merged = merge_rollups(rollup)
+        keep = np.ones(len(merged["bucket"]), dtype=bool)
+        if start is not None:
+            keep &= merged["bucket"] >= _to_datetime(start)
+        if end is not None:
+            keep &= merged["bucket"] < _to_datetime(end)
+        merged = {name: values[keep] for name, values in merged.items()}
+        merged["leq_dB"] = _leq(merged["energy"], merged["count"])
+        merged["day_leq_dB"] = _leq(merged["day_energy"], merged["day_count"])
+        merged["night_leq_dB"] = _leq(merged["night_energy"], merged["night_count"])
+        return merged
+
+    def read_downsampled(self, room: str, start=None, end=None, max_points: int = 500) -> dict:
+        """Finest rollup of [start, end) that has at most ``max_points`` buckets.
+
+        Returns:
+            dict : Output of ``read_rollup`` plus "resolution".
+        """
+        for resolution in RESOLUTIONS:
+            rollup = self.read_rollup(room, resolution, start, end)
+            if len(rollup["bucket"]) <= max_points or resolution == "month":
+                rollup["resolution"] = resolution
+                return rollup
+
+    def compact(self, room: str):
+        """Fold the parts of each rollup into one file (segments are left untouched)."""
+        import pyarrow as pa
+
+        for resolution in RESOLUTIONS:
+            directory = os.path.join(self._room_dir(room), f"rollup={resolution}")
+            rollup = self._read_rollup_parts(room, resolution)
+            if rollup is None:
+                continue
+            old_parts = [p for p in os.listdir(directory) if p.endswith(".parquet")]
+            if len(old_parts) < 2:
+                continue
+            merged = merge_rollups(rollup)
+            merged["bucket"] = pa.array(merged["bucket"], type=pa.timestamp("s"))
+            self._write(directory, merged)
+            for part in old_parts:
+                os.remove(os.path.join(directory, part))
+
+    def trend(self, room: str, resolution: str = "month", last: int = 12) -> list:
+        """Day and night Leq of the last ``last`` buckets, for trend charts and LLM prompts.
+
+        Returns:
+            list : [{"period": "2025-03", "leq_dB": 41.2, "day_leq_dB": 43.0, "night_leq_dB": 35.1, "segments": 250000}]
+        """
+        rollup = self.read_rollup(room, resolution)
+        unit = RESOLUTIONS[resolution]
+        rows = []
+        for i in range(max(0, len(rollup["bucket"]) - last), len(rollup["bucket"])):
+            rows.append({
+                "period": str(rollup["bucket"][i].astype(f"datetime64[{unit}]")),
+                **{name: None if np.isnan(rollup[name][i]) else round(float(rollup[name][i]), 1)
+                   for name in ("leq_dB", "day_leq_dB", "night_leq_dB")},
+                "segments": int(rollup["count"][i]),
+            })
+        return rows
+
+
+def main():
+    from sonalyse_advisor.json_utils import load_json
+
+    parser = argparse.ArgumentParser(description="Historique long terme des pièces (stockage en ajout seul)")
+    parser.add_argument("--root", default="timeseries")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    append = commands.add_parser("append", help="Ajouter des captures à l'historique d'une pièce")
+    append.add_argument("--room", required=True)
+    append.add_argument("captures", nargs="+")
+
+    trend = commands.add_parser("trend", help="Leq jour/nuit par période")
+    trend.add_argument("--room", required=True)
+    trend.add_argument("--resolution", choices=sorted(RESOLUTIONS), default="month")
+    trend.add_argument("--last", type=int, default=12)
+
+    compact = commands.add_parser("compact", help="Regrouper les fichiers de cumuls")
+    compact.add_argument("--room", required=True)
+
+    args = parser.parse_args()
+    store = TimeSeriesStore(args.root)
+    if args.command == "append":
+        for capture in args.captures:
+            print(f"✅ {capture} : {store.append(args.room, load_json(capture))} segments ajoutés")
+    elif args.command == "trend":
+        print(json.dumps(store.trend(args.room, args.resolution, args.last), ensure_ascii=False, indent=2))
+    else:
+        store.compact(args.room)
+
+
+if __name__ == "__main__":
+    main()
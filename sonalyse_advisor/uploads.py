@@ -0,0 +1,231 @@
+"""Uploaded captures, parsed while they are read and deduplicated by content.
+
+An upload is read once, in chunks: every chunk is hashed (SHA-256), copied
+to a temporary file and fed to the streaming parser of ``json_utils``
+(gzip/xz/zstd uploads are decompressed on the fly). Parsed segments are
+folded into an ``AggregationState`` batch by batch, so the summary is ready
+when the last chunk arrives. Each batch is checked against the last valid
+timestamp of the previous ones, so duplicates and out-of-order segments are
+caught across batch boundaries; the grid step is inferred from the first
+batch (``BATCH_SEGMENTS`` segments). The file is then stored under its hash:
+
+    <dir>/<sha256>.json[.gz|.xz|.zst]
+    <dir>/index.json    sha256 -> file name, size, segments, summary
+
+A file whose hash is already in the index is not parsed again. Updates of
+the index are serialized with an exclusive lock on ``index.json.lock`` so
+concurrent uploads (threads or processes) do not lose each other's entries.
+
+Usage:
+    python -m sonalyse_advisor.uploads capture.json.gz --room-type Chambre
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from sonalyse_advisor.aggregation import AggregationState, merge_states
+from sonalyse_advisor.json_utils import COMPRESSION_MAGIC, iter_json_array, open_json_bytes
+
+UPLOAD_DIR = "data/uploads"
+INDEX_FILENAME = "index.json"
+CHUNK_BYTES = 1 << 20
+BATCH_SEGMENTS = 10000
+EXTENSIONS = {None: ".json", "gzip": ".json.gz", "xz": ".json.xz", "zstd": ".json.zst"}
+
+
+class HashingReader(io.RawIOBase):
+    """Binary reader that hashes and copies every chunk its consumer reads.
+
+    Args:
+        stream : binary stream : Upload being read.
+        sink : binary file : Receives a copy of the bytes.
+        on_read : callable : Called with the number of bytes read so far.
+    """
+
+    def __init__(self, stream, sink, on_read=None):
+        self.stream = stream
+        self.sink = sink
+        self.on_read = on_read
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+        self.head = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self.stream.read(len(buffer))
+        if not chunk:
+            return 0
+        buffer[:len(chunk)] = chunk
+        self.digest.update(chunk)
+        self.sink.write(chunk)
+        if len(self.head) < 6:
+            self.head += chunk[:6 - len(self.head)]
+        self.bytes_read += len(chunk)
+        if self.on_read:
+            self.on_read(self.bytes_read)
+        return len(chunk)
+
+    def drain(self):
+        """Read whatever the parser left (trailing whitespace) so the hash covers the whole file."""
+        while self.read(CHUNK_BYTES):
+            pass
+
+
+def content_hash(stream) -> str:
+    """SHA-256 of a seekable binary stream, read in chunks and rewound."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_BYTES), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def load_index(upload_dir: str = UPLOAD_DIR) -> dict:
+    path = os.path.join(upload_dir, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def _save_entry(upload_dir: str, entry: dict):
+    """Add an entry to the index, read and rewritten under an exclusive lock."""
+    path = os.path.join(upload_dir, INDEX_FILENAME)
+    with open(f"{path}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            index = load_index(upload_dir)
+            index[entry["sha256"]] = entry
+            tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(index, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def find_upload(sha256: str, upload_dir: str = UPLOAD_DIR):
+    """Index entry of an already processed capture, None if unknown or deleted."""
+    entry = load_index(upload_dir).get(sha256)
+    if entry is None or not os.path.exists(entry["path"]):
+        return None
+    return entry
+
+
+def ingest_stream(stream, filename: str, upload_dir: str = UPLOAD_DIR, room_type: str = None,
+                  on_progress=None) -> tuple:
+    """Parse, aggregate, hash and store an upload in a single pass.
+
+    Args:
+        stream : binary stream : The upload.
+        filename : str : Name given by the user, kept in the index.
+        on_progress : callable : Called with (bytes read, segments parsed).
+
+    Returns:
+        tuple : (index entry, list of the parsed segment records).
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    tmp_path = os.path.join(upload_dir, f".upload-{os.getpid()}-{time.time_ns()}")
+    records, states, step, last_timestamp = [], [], None, None
+
+    def fold(batch):
+        nonlocal step, last_timestamp
+        state = AggregationState.from_records(batch, step, last_timestamp)
+        step = state.step_seconds
+        if state.last_timestamp is not None:
+            last_timestamp = state.last_timestamp
+        states.append(state)
+        if on_progress:
+            on_progress(reader.bytes_read, len(records))
+
+    try:
+        with open(tmp_path, "wb") as sink:
+            reader = HashingReader(stream, sink)
+            text = open_json_bytes(io.BufferedReader(reader, CHUNK_BYTES))
+            start = len(records)
+            for element in iter_json_array(text):
+                records.append(element)
+                if len(records) - start >= BATCH_SEGMENTS:
+                    fold(records[start:])
+                    start = len(records)
+            if len(records) > start or not states:
+                fold(records[start:])
+            reader.drain()
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    sha256 = reader.digest.hexdigest()
+    compression = next((name for magic, name in COMPRESSION_MAGIC.items() if reader.head.startswith(magic)), None)
+    path = os.path.join(upload_dir, sha256 + EXTENSIONS[compression])
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+
+    aggregates = merge_states(states).to_aggregates(room_type)
+    entry = {
+        "sha256": sha256,
+        "filename": filename,
+        "path": path,
+        "bytes": reader.bytes_read,
+        "segments": len(records),
+        "rejected_segments": aggregates["quality"]["rejected_segments"],
+        "average_db": aggregates["daily"]["average_daily_db"],
+        "grade": aggregates["daily"]["average_daily_rating"],
+        "coverage_percentage": aggregates["coverage"]["coverage_percentage"],
+        "uploaded_at": time.time(),
+    }
+    _save_entry(upload_dir, entry)
+    return entry, records
+
+
+def ingest_upload(stream, filename: str, upload_dir: str = UPLOAD_DIR, room_type: str = None,
+                  on_progress=None) -> tuple:
+    """Store an upload unless its content is already known.
+
+    Seekable uploads are hashed first, so a known file is answered without
+    being parsed.
+
+    Returns:
+        tuple : (index entry, parsed records or None for a duplicate, True if duplicate).
+    """
+    if stream.seekable():
+        entry = find_upload(content_hash(stream), upload_dir)
+        if entry is not None:
+            return entry, None, True
+    entry, records = ingest_stream(stream, filename, upload_dir, room_type, on_progress)
+    return entry, records, False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importer des captures (dédupliquées par contenu)")
+    parser.add_argument("captures", nargs="+")
+    parser.add_argument("--dir", default=UPLOAD_DIR)
+    parser.add_argument("--room-type", help="pieces[].type de la pièce mesurée")
+    args = parser.parse_args()
+
+    for capture in args.captures:
+        start = time.perf_counter()
+        with open(capture, "rb") as file:
+            entry, _, duplicate = ingest_upload(file, os.path.basename(capture), args.dir, args.room_type)
+        status = "déjà importée" if duplicate else f"{entry['segments']} segments, note {entry['grade']}"
+        print(f"✅ {capture} → {entry['path']} ({status}, {time.perf_counter() - start:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Vectorized validation of capture segments, with a quarantine report.
+
+Every check runs over the numpy columns of ``columnar.to_columns``, so a
+capture of millions of segments is validated in a few array passes. Bad rows
+are masked out instead of raising; the rejected rows and the reason(s) they
+were rejected for go to a quarantine report.
+
+Usage:
+    python -m sonalyse_advisor.validation capture.json --report quarantine.json
+"""
+
+import argparse
+import bisect
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from sonalyse_advisor.columnar import FLOAT_FIELDS, to_columns
+
+AST_CONFIG_PATH = "data/Config_AI_Classification.json"
+QUARANTINE_DIR = "data/quarantine"
+
+# Plausible range (dB) of each level column; anything outside is a sensor or parsing error.
+DB_RANGES = {name: (0.0, 140.0) for name in FLOAT_FIELDS}
+DB_RANGES["peak_dB"] = (0.0, 170.0)
+
+# Plausible capture dates: earlier ones come from an unset sensor clock, later ones
+# (beyond the tolerance) from a corrupted field.
+EARLIEST_TIMESTAMP = np.datetime64("2015-01-01T00:00:00", "s")
+FUTURE_TOLERANCE = np.timedelta64(1, "D")
+
+REASONS = (
+    "malformed",
+    "missing_timestamp",
+    "implausible_timestamp",
+    "duplicate_timestamp",
+    "non_monotonic_timestamp",
+    "missing_level",
+    "out_of_range_level",
+    "inconsistent_levels",
+    "missing_label",
+    "unknown_label",
+)
+
+# Spellings emitted by the sensor firmware for labels of the AST config.
+LABEL_ALIASES = {
+    "Walk, footstep": "Walk, footsteps",
+}
+
+# Rejected rows copied verbatim into the quarantine report.
+MAX_EXAMPLES = 50
+
+
+@lru_cache(maxsize=4)
+def load_known_labels(config_path: str = AST_CONFIG_PATH) -> frozenset:
+    """Return the labels of the AST classifier (``id2label`` of its config) and their aliases."""
+    with open(config_path, "r") as file:
+        labels = set(json.load(file)["id2label"].values())
+    return frozenset(labels | {alias for alias, label in LABEL_ALIASES.items() if label in labels})
+
+
+def _out_of_order(seconds: np.ndarray) -> np.ndarray:
+    """Mask of the rows to drop so that ``seconds`` is in order.
+
+    The kept rows are the longest non-decreasing subsequence: a single glitch,
+    forward or backward, flags only that row and not the rows around it.
+    Ordered captures (the usual case) are checked in one array pass.
+    """
+    out_of_order = np.zeros(len(seconds), dtype=bool)
+    if np.all(seconds[1:] >= seconds[:-1]):
+        return out_of_order
+
+    # Patience sorting: tails[k] is the smallest last value of a kept run of length k + 1
+    tails, tail_rows, previous = [], [], [-1] * len(seconds)
+    for row, value in enumerate(seconds.tolist()):
+        k = bisect.bisect_right(tails, value)
+        if k:
+            previous[row] = tail_rows[k - 1]
+        if k == len(tails):
+            tails.append(value)
+            tail_rows.append(row)
+        else:
+            tails[k] = value
+            tail_rows[k] = row
+
+    out_of_order[:] = True
+    row = tail_rows[-1]
+    while row >= 0:
+        out_of_order[row] = False
+        row = previous[row]
+    return out_of_order
+
+
+def _timestamp_checks(timestamps: np.ndarray, now: np.datetime64 = None, after: np.datetime64 = None) -> dict:
+    if now is None:
+        now = np.datetime64("now", "s")
+    missing = np.isnat(timestamps)
+    seconds = timestamps.astype(np.int64)
+    with np.errstate(invalid="ignore"):
+        implausible = ~missing & ((timestamps < EARLIEST_TIMESTAMP) | (timestamps > now + FUTURE_TOLERANCE))
+
+    # Rows of a batch at or before the last valid timestamp of the previous ones.
+    duplicate = np.zeros(len(timestamps), dtype=bool)
+    non_monotonic = np.zeros(len(timestamps), dtype=bool)
+    if after is not None:
+        with np.errstate(invalid="ignore"):
+            duplicate = ~missing & ~implausible & (timestamps == after)
+            non_monotonic = ~missing & ~implausible & (timestamps < after)
+
+    # Every occurrence of a timestamp but the first one is a duplicate.
+    present = np.flatnonzero(~missing & ~implausible & ~duplicate & ~non_monotonic)
+    _, first = np.unique(seconds[present], return_index=True)
+    duplicate[present] = True
+    duplicate[present[first]] = False
+
+    non_monotonic[present] = _out_of_order(seconds[present])
+
+    return {
+        "missing_timestamp": missing,
+        "implausible_timestamp": implausible,
+        "duplicate_timestamp": duplicate,
+        "non_monotonic_timestamp": non_monotonic,
+    }
+
+
+def validate_columns(columns: dict, known_labels: frozenset = None, now: np.datetime64 = None,
+                     after: np.datetime64 = None) -> dict:
+    """Check the columns of a capture and build the mask of valid rows.
+
+    Args:
+        columns : dict : Columns from ``columnar.to_columns``.
+        known_labels : frozenset : Accepted labels, defaults to the AST ``id2label``.
+        now : datetime64 : Upper bound of the plausible dates (plus FUTURE_TOLERANCE), the current time by default.
+        after : datetime64 : Last valid timestamp of the previous batches of
+            the capture; rows at or before it are duplicates or out of order.
+
+    Returns:
+        dict : "valid" (bool mask of the rows to keep), "reasons" (one bool
+            mask per entry of REASONS, True where the row fails the check)
+            and "counts" (number of rows failing each check).
+    """
+    if known_labels is None:
+        known_labels = load_known_labels()
+
+    reasons = {"malformed": columns["malformed"]}
+    reasons.update(_timestamp_checks(columns["timestamp"], now, after))
+
+    levels = np.column_stack([columns[name] for name in FLOAT_FIELDS])
+    low = np.array([DB_RANGES[name][0] for name in FLOAT_FIELDS])
+    high = np.array([DB_RANGES[name][1] for name in FLOAT_FIELDS])
+    with np.errstate(invalid="ignore"):
+        reasons["missing_level"] = np.isnan(levels).any(axis=1)
+        reasons["out_of_range_level"] = ((levels < low) | (levels > high)).any(axis=1)
+        reasons["inconsistent_levels"] = columns["min_dB"] > columns["max_dB"]
+
+    codes = columns["label"]
+    reasons["missing_label"] = codes < 0
+    # Check each distinct label once, then broadcast through the codes.
+    unknown_codes = np.array([label not in known_labels for label in columns["labels"]] + [False])
+    reasons["unknown_label"] = unknown_codes[codes]
+
+    invalid = np.zeros(len(codes), dtype=bool)
+    for mask in reasons.values():
+        invalid |= mask
+
+    return {
+        "valid": ~invalid,
+        "reasons": reasons,
+        "counts": {reason: int(mask.sum()) for reason, mask in reasons.items()},
+    }
+
+
+def select_rows(columns: dict, mask: np.ndarray) -> dict:
+    """Return read-only columns restricted to the rows of ``mask``."""
+    selected = {}
+    for name, value in columns.items():
+        if isinstance(value, np.ndarray):
+            value = value[mask]
+            value.flags.writeable = False
+        selected[name] = value
+    return selected
+
+
+def quarantine_report(json_data: list, validation: dict, max_examples: int = MAX_EXAMPLES) -> dict:
+    """Summarize the rejected rows of a capture.
+
+    Returns:
+        dict : "total", "valid" and "rejected" row counts, "counts" per
+            reason and up to ``max_examples`` rejected rows with their index,
+            reasons and original record.
+    """
+    rejected = np.flatnonzero(~validation["valid"])
+    reasons = validation["reasons"]
+    return {
+        "total": len(json_data),
+        "valid": len(json_data) - len(rejected),
+        "rejected": len(rejected),
+        "counts": {reason: count for reason, count in validation["counts"].items() if count},
+        "examples": [
+            {
+                "index": int(i),
+                "reasons": [reason for reason, mask in reasons.items() if mask[i]],
+                "record": json_data[i],
+            }
+            for i in rejected[:max_examples]
+        ],
+    }
+
+
+def write_quarantine_report(report: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def clean_capture(json_data: list, quarantine_path: str = None, after: np.datetime64 = None) -> tuple:
+    """Validate a capture and drop its bad rows.
+
+    Args:
+        json_data : list : Segment records.
+        quarantine_path : str : Where to write the quarantine report when rows are rejected.
+        after : datetime64 : Last valid timestamp of the previous batches, see ``validate_columns``.
+
+    Returns:
+        tuple : (valid records, their columns, quarantine report).
+    """
+    columns = to_columns(json_data)
+    validation = validate_columns(columns, after=after)
+    report = quarantine_report(json_data, validation)
+    if not report["rejected"]:
+        return json_data, columns, report
+
+    if quarantine_path:
+        write_quarantine_report(report, quarantine_path)
+    valid = validation["valid"]
+    records = [json_data[i] for i in np.flatnonzero(valid)]
+    return records, select_rows(columns, valid), report
+
+
+def quarantine_path_for(json_path: str, directory: str = QUARANTINE_DIR) -> str:
+    """Default quarantine report path of a capture file."""
+    name = os.path.splitext(os.path.basename(json_path))[0]
+    return os.path.join(directory, f"{name}.quarantine.json")
+
+
+def main():
+    from sonalyse_advisor.json_utils import load_json
+
+    parser = argparse.ArgumentParser(description="Validation et mise en quarantaine des segments d'une capture")
+    parser.add_argument("capture", help="Capture JSON à valider")
+    parser.add_argument("--report", help="Rapport de quarantaine (défaut : data/quarantine/<capture>.quarantine.json)")
+    args = parser.parse_args()
+
+    json_data = load_json(args.capture)
+    report_path = args.report or quarantine_path_for(args.capture)
+    _, _, report = clean_capture(json_data, report_path)
+    print(json.dumps({k: v for k, v in report.items() if k != "examples"}, ensure_ascii=False, indent=2))
+    if report["rejected"]:
+        print(f"Rapport de quarantaine : {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_segment(timestamp: str, level: float = 40.0, label="Speech", **fields) -> dict:
+    """Segment record shaped like the sensor output (``data/dps_analysis_pi3_exemple.json``)."""
+    segment = {
+        "timestamp": timestamp,
+        "LAeq_segment_dB": level,
+        "L50_dB": level - 2,
+        "Lmin_dB": level - 10,
+        "Lmax_dB": level + 10,
+        "LPeak_dB": level + 15,
+        "L90_dB": level - 5,
+        "LAeq_rating": "C",
+        "top_5_labels": [label],
+    }
+    segment.update(fields)
+    return segment
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """Data paths of the package (``data/...``) are relative to the repository root."""
+    monkeypatch.chdir(ROOT)
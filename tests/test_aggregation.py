@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from conftest import make_segment
+from sonalyse_advisor.aggregation import AggregationState, aggregate_shards, merge_states
+from sonalyse_advisor.json_utils import gather_extracted_data, load_json
+
+CAPTURE_PATH = "data/dps_analysis_pi3_exemple.json"
+
+
+@pytest.fixture(scope="module")
+def capture():
+    return load_json(CAPTURE_PATH)
+
+
+def write_shards(directory, records: list, sizes: list) -> list:
+    paths, start = [], 0
+    for i, size in enumerate(sizes):
+        path = directory / f"shard{i}.json"
+        path.write_text(json.dumps(records[start:start + size]))
+        paths.append(str(path))
+        start += size
+    return paths
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sharded_aggregates_equal_the_single_file(tmp_path, capture, workers):
+    paths = write_shards(tmp_path, capture, [7000, 7000, 6000])
+    sharded = aggregate_shards(paths, workers=workers).to_aggregates("Chambre")
+    assert sharded == gather_extracted_data(capture, "Chambre")
+
+
+def test_shard_order_and_cache_do_not_change_the_result(tmp_path, capture):
+    paths = write_shards(tmp_path, capture, [5000, 5000, 5000, 5000])
+    cache_dir = str(tmp_path / "cache")
+    expected = gather_extracted_data(capture)
+
+    assert aggregate_shards(paths[::-1], workers=1, cache_dir=cache_dir).to_aggregates() == expected
+    # Second run: every shard state comes from the cache
+    assert aggregate_shards(paths, workers=1, cache_dir=cache_dir).to_aggregates() == expected
+
+
+def test_state_survives_serialization(capture):
+    state = AggregationState.from_records(capture[:3000])
+    restored = AggregationState.from_dict(json.loads(json.dumps(state.to_dict())))
+    assert restored.to_aggregates() == state.to_aggregates()
+
+
+def test_rejected_segments_are_summed_across_shards():
+    first = [make_segment("2025-03-03 00:00:00"), make_segment("2025-03-03 00:00:10", level=-1.0)]
+    second = [make_segment("2025-03-03 00:00:20"), make_segment("2025-03-03 00:00:30", top_5_labels=[])]
+    merged = merge_states([AggregationState.from_records(first, 10), AggregationState.from_records(second, 10)])
+    quality = merged.to_aggregates()["quality"]
+
+    assert quality["segments"] == 4
+    assert quality["rejected_segments"] == 2
+    assert quality == gather_extracted_data(first + second)["quality"]
+
+
+def test_shards_with_different_steps_do_not_merge():
+    first = AggregationState.from_records([make_segment("2025-03-03 00:00:00")], 10)
+    second = AggregationState.from_records([make_segment("2025-03-03 00:00:20")], 20)
+    with pytest.raises(ValueError):
+        merge_states([first, second])
@@ -0,0 +1,36 @@
+import numpy as np
+
+from conftest import make_segment
+from sonalyse_advisor.baseline import detect_loud_nights, loud_nights_summary
+from sonalyse_advisor.timeseries_store import TimeSeriesStore
+from sonalyse_advisor.validation import clean_capture
+
+
+def segments(first_day: str, days: int, night_db: float) -> list:
+    """One segment per hour: 40 dB by day, ``night_db`` from 22 h to 6 h."""
+    start = np.datetime64(first_day, "h")
+    return [make_segment(str(hour).replace("T", " ") + ":00:00",
+                         night_db if int(str(hour)[11:13]) in (22, 23, 0, 1, 2, 3, 4, 5) else 40.0)
+            for hour in start + np.arange(days * 24)]
+
+
+def test_a_loud_night_stands_out_from_the_capture_itself():
+    records = segments("2025-03-03T06", 14, 30.0) + segments("2025-03-17T06", 1, 45.0)
+    nights = detect_loud_nights(clean_capture(records)[1])
+    assert [night["date"] for night in nights] == ["2025-03-17"]
+    assert nights[0]["excess_dB"] == 15.0
+
+
+def test_loud_nights_do_not_raise_their_own_baseline(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "timeseries"))
+    store.append("chambre", segments("2025-02-03T06", 28, 30.0))
+    capture = clean_capture(segments("2025-03-03T06", 28, 45.0))[1]
+
+    summary = loud_nights_summary(capture, "chambre", store)
+    assert summary["history_days"] == 28 and summary["enough_history"]
+    assert len(summary["abnormal_nights"]) == 28
+    assert {night["baseline_night_leq_dB"] for night in summary["abnormal_nights"]} == {30.0}
+
+    # Without stored history, the capture is its own history
+    assert not loud_nights_summary(capture, "salon", store)["abnormal_nights"]
+    assert loud_nights_summary(capture)["history_days"] == 28
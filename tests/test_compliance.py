@@ -0,0 +1,48 @@
+import numpy as np
+
+from conftest import make_segment
+from sonalyse_advisor.columnar import to_columns
+from sonalyse_advisor.compliance import compliance_summary, evaluate_compliance, load_oms_table, parse_oms_guide
+
+GUIDE = """Bruit dû au trafic routier
+
+Le GDG recommande fortement de réduire les niveaux sonores produits par le trafic routier
+à moins de 53 décibels (dB) Lden, et en période nocturne à moins de 45 dB
+Lnight.
+
+Bruit dû aux loisirs
+
+Réduire l'exposition annuelle moyenne à moins de 70,5 dB LAeq,24h.
+"""
+
+
+def test_guideline_values_are_read_across_line_breaks():
+    assert parse_oms_guide(GUIDE) == [
+        {"environment": "trafic routier", "indicator": "Lden", "period": "24h", "limit_dB": 53.0},
+        {"environment": "trafic routier", "indicator": "Lnight", "period": "night", "limit_dB": 45.0},
+        {"environment": "loisirs", "indicator": "LAeq,24h", "period": "24h", "limit_dB": 70.5},
+    ]
+    table = load_oms_table()
+    assert {row["environment"] for row in table} >= {"trafic routier", "trafic ferroviaire", "trafic aérien"}
+    table[0]["limit_dB"] = 0
+    assert load_oms_table()[0]["limit_dB"] == 53.0
+
+
+def test_indicators_and_exceedance_of_a_constant_day():
+    # 07:00 to 06:50 the next day, one segment every 10 minutes at 50 dB
+    start = np.datetime64("2025-03-03T07:00")
+    records = [make_segment(str(moment).replace("T", " ") + ":00", 50.0)
+               for moment in start + np.arange(0, 24 * 60, 10)]
+    table = parse_oms_guide(GUIDE)
+    report = evaluate_compliance({"chambre": to_columns(records), "vide": to_columns([])}, table)
+
+    chambre = report["chambre"]
+    assert chambre["indicators"] == {"Lden": 56.4, "Lnight": 50.0, "LAeq,24h": 50.0, "LAmax": 60.0}
+    lden, lnight, leisure = chambre["checks"]
+    assert not lden["compliant"] and lden["exceedance_minutes"] == 12 * 60
+    assert lnight["days_evaluated"] == 1 and lnight["days_exceeding"] == 1
+    assert set(lnight["exceedance_by_hour"]) == {"23", "00", "01", "02", "03", "04", "05", "06"}
+    assert leisure["compliant"] and leisure["exceedance_minutes"] == 0
+
+    assert all(check["compliant"] is None for check in report["vide"]["checks"])
+    assert compliance_summary(report["vide"])[0].endswith("non évaluable sur cette capture.")
@@ -0,0 +1,75 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import make_segment
+from sonalyse_advisor.columnar import to_columns
+from sonalyse_advisor.grading import (
+    DEFAULT_THRESHOLDS,
+    grade_letter,
+    grade_report,
+    load_threshold_table,
+    overall_grade,
+    room_thresholds,
+)
+
+
+@pytest.mark.parametrize("level, grade", [
+    (25.0, "A"), (30.0, "A"), (30.1, "B"), (45.0, "D"), (55.0, "F"), (55.1, "G"), (90.0, "G"),
+])
+def test_bedroom_day_bounds_are_inclusive(level, grade):
+    assert grade_letter(level, "day", "Chambre") == grade
+
+
+def test_night_is_stricter_and_room_types_differ():
+    assert grade_letter(33.0, "day", "Chambre") == "B"
+    assert grade_letter(33.0, "night", "Chambre") == "C"
+    assert grade_letter(33.0, "night", "Salon") == "B"
+    assert grade_letter(None, "day") == "N/A"
+    assert grade_letter(float("nan"), "night") == "N/A"
+
+
+def test_room_types_are_normalized_with_default_fallback():
+    assert room_thresholds("  CHAMBRE ") == DEFAULT_THRESHOLDS["chambre"]
+    assert room_thresholds("Salle  de bain") == DEFAULT_THRESHOLDS["salle de bain"]
+    assert room_thresholds("Garage") == DEFAULT_THRESHOLDS["default"]
+    assert room_thresholds(None) == DEFAULT_THRESHOLDS["default"]
+
+
+def test_overall_grade_is_the_worst_period():
+    assert overall_grade({"day": "B", "night": "E"}) == "E"
+    assert overall_grade({"day": "C", "night": "N/A"}) == "C"
+    assert overall_grade({"day": "N/A", "night": "N/A"}) == "N/A"
+
+
+def test_grade_report_uses_energetic_period_means():
+    # Day: 12 segments at 40 dB and 4 at 60 dB; night: 8 segments at 28 dB
+    records = [make_segment(f"2025-03-03 10:{minute:02d}:00", 40.0) for minute in range(12)]
+    records += [make_segment(f"2025-03-03 11:{minute:02d}:00", 60.0) for minute in range(4)]
+    records += [make_segment(f"2025-03-03 23:{minute:02d}:00", 28.0) for minute in range(8)]
+    report = grade_report(to_columns(records), "Chambre")
+
+    day_leq = round(10 * np.log10((12 * 10 ** 4 + 4 * 10 ** 6) / 16), 1)
+    assert report["leq_dB"] == {"day": day_leq, "night": 28.0}
+    assert report["period_grades"] == {"day": grade_letter(day_leq, "day", "Chambre"), "night": "B"}
+    assert report["grade"] == report["period_grades"]["day"] == "F"
+    assert report["distribution"]["hourly"]["11"]["G"] == 100.0
+    assert report["distribution"]["period"]["night"]["B"] == 100.0
+
+
+def test_custom_threshold_table(tmp_path):
+    path = tmp_path / "thresholds.json"
+    table = {"Default": {"day": [10, 20, 30, 40, 50, 60], "night": [5, 15, 25, 35, 45, 55]}}
+    path.write_text(json.dumps(table))
+    loaded = load_threshold_table(str(path))
+
+    assert grade_letter(25.0, "day", "Chambre", loaded) == "C"
+    assert grade_letter(25.0, "night", "Chambre", loaded) == "C"
+
+    path.write_text(json.dumps({"chambre": table["Default"]}))
+    with pytest.raises(ValueError):
+        load_threshold_table(str(path))
+    path.write_text(json.dumps({"default": {"day": [50, 40, 30, 20, 10, 5], "night": [1, 2, 3, 4, 5, 6]}}))
+    with pytest.raises(ValueError):
+        load_threshold_table(str(path))
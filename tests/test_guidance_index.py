@@ -0,0 +1,51 @@
+import os
+
+from sonalyse_advisor.guidance_index import chunk_document, load_index, room_query, search, tokenize
+
+DOCUMENT = """Bruit dû au trafic routier
+
+Recommandation
+Pour l'exposition nocturne, réduire le bruit du trafic routier en dessous de 45 dB Lnight : au-delà, il est associé à des effets sur le sommeil.
+
+Bruit des éoliennes
+
+Recommandation
+Pour l'exposition moyenne, réduire le bruit des éoliennes en dessous de 45 dB Lden.
+"""
+
+
+def test_passages_keep_the_title_of_their_section():
+    passages = chunk_document(DOCUMENT, "guide.txt")
+    assert [passage["title"] for passage in passages] == ["Bruit dû au trafic routier", "Bruit des éoliennes"]
+    assert passages[0]["text"].startswith("Pour l'exposition nocturne")
+    assert tokenize("Éoliennes bruyantes") == tokenize("eolienne bruyante")
+
+
+def test_search_ranks_the_matching_section_first(tmp_path):
+    path = tmp_path / "guide.txt"
+    path.write_text(DOCUMENT)
+    index_path = str(tmp_path / "index" / "index.json")
+    index = load_index([str(path)], index_path)
+
+    results = search("trafic routier nuit sommeil", index)
+    assert results[0][1]["title"] == "Bruit dû au trafic routier"
+    assert search("éoliennes", index)[0][1]["title"] == "Bruit des éoliennes"
+    assert os.listdir(os.path.dirname(index_path)) == ["index.json"]
+
+    # A changed document rebuilds the persisted index
+    path.write_text(DOCUMENT.replace("éoliennes", "chantiers"))
+    assert search("chantiers", load_index([str(path)], index_path))[0][1]["title"] == "Bruit des chantiers"
+
+
+def test_room_query_lists_only_indicators_known_to_be_exceeded():
+    all_data = {
+        "daily": {"noise_daily_percentage": {"Vehicle": 60.0, "Speech": 40.0}},
+        "oms_compliance": {"checks": [
+            {"indicator": "Lnight", "compliant": False},
+            {"indicator": "Lden", "compliant": None},
+            {"indicator": "LAmax", "compliant": True},
+        ]},
+    }
+    query = room_query(all_data, "Chambre")
+    assert "trafic" in query and "Lnight" in query and "sommeil" in query
+    assert "Lden" not in query and "LAmax" not in query
@@ -0,0 +1,120 @@
+import json
+import os
+
+import pytest
+
+from conftest import make_segment
+from sonalyse_advisor.live_ingest import LiveAggregates, LiveIngestServer, latest_day, load_snapshot, parse_record
+
+
+@pytest.mark.parametrize("item, reason", [
+    (["not", "an", "object"], "not_an_object"),
+    ({"LAeq_segment_dB": 40.0}, "missing_timestamp"),
+    (make_segment("yesterday"), "malformed_timestamp"),
+    (make_segment("2025-03-03 10:00:00", LAeq_segment_dB="loud"), "malformed_level"),
+    (make_segment("2025-03-03 10:00:00", LAeq_segment_dB=float("nan")), "malformed_level"),
+    (make_segment("2025-03-03 10:00:00", Lmax_dB=True), "malformed_level"),
+    (make_segment("2025-03-03 10:00:00", LPeak_dB=500.0), "out_of_range_level"),
+    (make_segment("2025-03-03 10:00:00", label=42), "malformed_label"),
+    (make_segment("2025-03-03 10:00:00", label=["Speech"]), "malformed_label"),
+    (make_segment("2025-03-03 10:00:00", top_5_labels=7), "malformed_label"),
+])
+def test_malformed_record_is_rejected_before_any_update(item, reason):
+    aggregates = LiveAggregates()
+    aggregates.update(make_segment("2025-03-03 09:00:00", room="salon"))
+    before = json.dumps(aggregates.to_dict(), sort_keys=True)
+
+    with pytest.raises(ValueError, match=reason):
+        aggregates.update(item)
+    assert json.dumps(aggregates.to_dict(), sort_keys=True) == before
+
+
+def test_records_are_grouped_by_source_and_day():
+    aggregates = LiveAggregates(room_type="Chambre")
+    aggregates.update(make_segment("2025-03-03 10:00:00", 40.0, room="chambre"))
+    aggregates.update(make_segment("2025-03-03 23:00:00", 30.0, room="chambre"))
+    aggregates.update(make_segment("2025-03-03 10:00:00", 50.0, sensor_id=7))
+    aggregates.update(make_segment("2025-03-04 10:00:00", 60.0))
+
+    snapshot = aggregates.to_dict()
+    assert snapshot["segments"] == 4
+    assert sorted(snapshot["sources"]) == ["7", "chambre", "default"]
+    day = snapshot["sources"]["chambre"]["2025-03-03"]
+    assert day["daily"]["period_leq_dB"] == {"day": 40.0, "night": 30.0}
+    assert day["daily"]["period_grades"] == {"day": "C", "night": "B"}
+    assert latest_day(snapshot)[:2] == ("default", "2025-03-04")
+    assert latest_day(snapshot, "chambre")[:2] == ("chambre", "2025-03-03")
+
+
+def test_only_the_last_days_are_kept():
+    aggregates = LiveAggregates(keep_days=2)
+    for day in (1, 2, 3):
+        aggregates.update(make_segment(f"2025-03-0{day} 10:00:00"))
+    assert list(aggregates.to_dict()["sources"]["default"]) == ["2025-03-02", "2025-03-03"]
+
+    with pytest.raises(ValueError, match="expired_day"):
+        aggregates.update(make_segment("2025-03-01 11:00:00"))
+    assert aggregates.segments == 3
+
+
+def test_server_counts_rejections_and_logs_only_valid_records(tmp_path):
+    server = LiveIngestServer(str(tmp_path))
+    lines = [
+        json.dumps(make_segment("2025-03-03 10:00:00")).encode(),
+        b"{not json",
+        json.dumps(make_segment("2025-03-03 10:00:10", LAeq_segment_dB="loud")).encode(),
+        json.dumps("a string").encode(),
+        json.dumps(make_segment("2025-03-03 10:00:20")).encode(),
+    ]
+    assert [server.ingest_line(line) for line in lines] == [True, False, False, False, True]
+
+    with open(server.log_path, "a") as server._log:
+        server.flush_log()
+    server.write_snapshot()
+    snapshot = load_snapshot(str(tmp_path))
+    assert snapshot["segments"] == 2
+    assert snapshot["rejected"] == 3
+    assert snapshot["rejected_reasons"] == {"malformed_json": 1, "malformed_level": 1, "not_an_object": 1}
+
+    # After a restart the log rebuilds the same aggregates
+    restarted = LiveIngestServer(str(tmp_path))
+    restarted.restore()
+    assert restarted.aggregates.to_dict() == server.aggregates.to_dict()
+
+
+def test_parse_record_converts_levels():
+    record = parse_record(make_segment("2025-03-03 22:30:00", 41, room="salon"))
+    assert record["source"] == "salon"
+    assert (record["day"], record["hour"]) == ("2025-03-03", 22)
+    assert record["average_dB"] == 41.0 and isinstance(record["average_dB"], float)
+    assert record["label"] == "Speech"
+
+
+def test_a_restart_replays_only_the_log_written_since_the_checkpoint(tmp_path):
+    server = LiveIngestServer(str(tmp_path), room_type="Chambre", log_max_bytes=0)
+    server.restore()
+    server._log = open(server.log_path, "a")
+    for second in range(3):
+        server.ingest_line(json.dumps(make_segment(f"2025-03-03 23:00:0{second}", 38.0)).encode())
+    server.checkpoint()
+    assert server.generation == 1 and os.path.getsize(server.log_path) == 0
+    server.ingest_line(json.dumps(make_segment("2025-03-03 23:00:05", 38.0)).encode())
+    server.flush_log()
+    server._log.close()
+
+    # A log of another generation is a leftover of an interrupted rotation
+    (tmp_path / "segments-0.jsonl").write_text(json.dumps(make_segment("2025-03-03 23:00:09")) + "\n")
+    restarted = LiveIngestServer(str(tmp_path), room_type="Chambre")
+    restarted.restore()
+    assert restarted.aggregates.to_dict() == server.aggregates.to_dict()
+    assert restarted.aggregates.segments == 4
+    assert sorted(os.listdir(tmp_path)) == ["aggregates.json", "checkpoint.json", "segments-1.jsonl"]
+
+    # The thresholds of the room grade the live aggregates
+    day = load_snapshot(str(tmp_path))["sources"]["default"]["2025-03-03"]
+    assert day["daily"]["period_grades"]["night"] == "D"
+
+
+def test_missing_snapshot_has_no_latest_day(tmp_path):
+    assert load_snapshot(str(tmp_path)) is None
+    assert latest_day(None) == (None, None, None)
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from sonalyse_advisor.llm_stub import StubSettings, start_stub_server
+
+groq = pytest.importorskip("groq")
+from sonalyse_advisor.llm_client import MIN_HEDGE_SAMPLES, LLMClientManager  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Diagnostic de la chambre"}]
+
+
+class FirstRequestSlow(StubSettings):
+    def delay(self, model: str = None) -> float:
+        return 1.0 if self.requests == 1 else 0.0
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(settings: StubSettings) -> LLMClientManager:
+        server, base_url = start_stub_server(settings=settings)
+        servers.append(server)
+        return LLMClientManager(api_key="stub", base_url=base_url, timeout=5, max_retries=2)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_completion_and_token_usage(stub):
+    manager = stub(StubSettings(latency=0, jitter=0, content="st.markdown('ok')"))
+    completion = manager.create(MESSAGES, model="stub")
+    assert completion.choices[0].message.content == "st.markdown('ok')"
+    assert completion.usage.prompt_tokens == len(MESSAGES[0]["content"]) // 4
+    assert manager.stats["calls"] == 1 and manager.stats["retries"] == 0
+
+
+def test_rate_limits_are_retried_then_raised(stub):
+    settings = StubSettings(latency=0, jitter=0, rate_limit_ratio=1.0)
+    manager = stub(settings)
+    with pytest.raises(groq.RateLimitError):
+        manager.complete(MESSAGES, model="stub")
+    assert settings.requests == 3
+    assert manager.stats["retries"] == 2 and manager.stats["failures"] == 1
+
+    # No request is started once the deadline has passed
+    with pytest.raises(TimeoutError):
+        manager.create(MESSAGES, model="stub", deadline=time.perf_counter())
+    assert settings.requests == 3
+
+
+def test_a_slow_request_is_hedged(stub):
+    settings = FirstRequestSlow(content="hedged")
+    manager = stub(settings)
+    manager.hedge = True
+    manager._latencies.extend([0.05] * MIN_HEDGE_SAMPLES)
+
+    start = time.perf_counter()
+    assert manager.complete(MESSAGES, model="stub") == "hedged"
+    assert time.perf_counter() - start < 0.8
+    assert manager.stats["hedges"] == 1 and manager.stats["hedge_wins"] == 1
@@ -0,0 +1,82 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from sonalyse_advisor import llm_client
+from sonalyse_advisor.config import LOCAL_MODEL
+from sonalyse_advisor.model_router import ModelRouter
+
+MESSAGES = [{"role": "user", "content": "Diagnostic"}]
+ROUTES = {"resume": {"models": ["fast", "large", LOCAL_MODEL], "timeout": 1, "retries": 0, "deadline": 5}}
+
+
+class APIError(Exception):
+    pass
+
+
+class FakeClient:
+    """Client manager answering from ``answers`` (model -> content, or an exception to raise)."""
+
+    api_errors = (APIError, TimeoutError)
+
+    def __init__(self, answers: dict, delay: float = 0):
+        self.answers = answers
+        self.delay = delay
+        self.calls = []
+
+    def create(self, messages, model, timeout=None, max_retries=None, deadline=None):
+        self.calls.append(model)
+        time.sleep(self.delay)
+        answer = self.answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))], usage=usage)
+
+
+def test_first_model_that_answers_is_used():
+    client = FakeClient({"fast": APIError("rate limit"), "large": "LARGE"})
+    router = ModelRouter(ROUTES, client)
+
+    assert router.complete("resume", MESSAGES, local=lambda: "LOCAL") == "LARGE"
+    assert client.calls == ["fast", "large"]
+    stats = router.stats()["resume"]
+    assert stats["models"] == {"large": 1}
+    assert stats["fallbacks"] == 1
+    assert stats["prompt_tokens"] == 100
+
+
+def test_local_rules_answer_when_every_model_fails():
+    client = FakeClient({"fast": APIError("down"), "large": TimeoutError("slow")})
+    router = ModelRouter(ROUTES, client)
+
+    assert router.complete("resume", MESSAGES, local=lambda: "LOCAL") == "LOCAL"
+    assert router.stats()["resume"]["models"] == {LOCAL_MODEL: 1}
+
+    # Without local rules, the last error reaches the caller
+    with pytest.raises(TimeoutError):
+        router.complete("resume", MESSAGES)
+    assert router.stats()["resume"]["failures"] == 1
+
+
+def test_models_left_after_the_deadline_are_skipped():
+    routes = {"resume": dict(ROUTES["resume"], deadline=0.1)}
+    client = FakeClient({"fast": APIError("down"), "large": "LARGE"}, delay=0.2)
+
+    assert ModelRouter(routes, client).complete("resume", MESSAGES, local=lambda: "LOCAL") == "LOCAL"
+    assert client.calls == ["fast"]
+
+
+def test_errors_other_than_api_errors_are_not_swallowed():
+    client = FakeClient({"fast": KeyError("bug"), "large": "LARGE"})
+    with pytest.raises(KeyError):
+        ModelRouter(ROUTES, client).complete("resume", MESSAGES, local=lambda: "LOCAL")
+
+
+def test_missing_api_key_falls_back_to_the_local_rules(monkeypatch):
+    pytest.importorskip("groq")
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.setattr(llm_client, "_manager", None)
+
+    assert ModelRouter(ROUTES).complete("resume", MESSAGES, local=lambda: "LOCAL") == "LOCAL"
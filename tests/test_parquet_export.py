@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from conftest import make_segment
+from sonalyse_advisor.parquet_export import export_capture
+
+ds = pytest.importorskip("pyarrow.dataset")
+
+
+def write_capture(path, levels: dict):
+    records = [make_segment(f"{day} {hour:02d}:00:00", level, label="Vehicle" if hour < 12 else "Speech")
+               for day, level in levels.items() for hour in range(24)]
+    path.write_text(json.dumps(records))
+    return str(path)
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "ipc"])
+def test_partitions_can_be_read_back(tmp_path, file_format):
+    capture = write_capture(tmp_path / "capture.json", {"2025-03-03": 40.0, "2025-03-04": 50.0})
+    out = str(tmp_path / "export")
+    written = export_capture(capture, out, room="chambre", room_type="Chambre", file_format=file_format)
+    assert written == {"segments": 48, "hourly": 48, "daily": 2}
+
+    daily = ds.dataset(f"{out}/daily", format=file_format, partitioning="hive").to_table().to_pylist()
+    assert sorted((row["date"], row["average_db"]) for row in daily) == [("2025-03-03", 40.0), ("2025-03-04", 50.0)]
+
+    segments = ds.dataset(f"{out}/segments", format=file_format, partitioning="hive")
+    day = segments.to_table(filter=ds.field("date") == "2025-03-04", columns=["average_dB", "label"])
+    assert day.num_rows == 24 and set(day["average_dB"].to_pylist()) == {50.0}
+    assert set(day["label"].to_pylist()) == {"Vehicle", "Speech"}
+
+
+def test_exporting_a_day_again_replaces_its_partition(tmp_path):
+    out = str(tmp_path / "export")
+    export_capture(write_capture(tmp_path / "a.json", {"2025-03-03": 40.0}), out, room="salon")
+    export_capture(write_capture(tmp_path / "b.json", {"2025-03-03": 45.0}), out, room="salon")
+
+    segments = ds.dataset(f"{out}/segments", partitioning="hive").to_table()
+    assert segments.num_rows == 24 and set(segments["average_dB"].to_pylist()) == {45.0}
@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from conftest import make_segment
+from sonalyse_advisor.pipeline import Pipeline, default_params, prune_cache
+from sonalyse_advisor.validation import clean_capture
+
+RECORDS = [make_segment(f"2025-03-03 {hour:02d}:{minute:02d}:00", 35.0 + hour % 10)
+           for hour in range(24) for minute in range(0, 60, 10)]
+
+
+@pytest.fixture
+def sources(tmp_path):
+    capture = tmp_path / "capture.json"
+    capture.write_text(json.dumps(RECORDS))
+    accommodation = tmp_path / "logement.json"
+    shutil.copy("data/logement1.json", accommodation)
+    return {"capture": str(capture), "accommodation": str(accommodation)}
+
+
+def statuses(pipeline: Pipeline) -> dict:
+    return {name: status for name, status, _ in pipeline.log}
+
+
+def test_only_the_artifacts_of_a_changed_input_are_rebuilt(tmp_path, sources):
+    cache_dir, params = str(tmp_path / "cache"), default_params("Chambre")
+    first = Pipeline(sources, params, cache_dir)
+    dashboard = first.get("dashboard")
+    first.get("report")
+    assert set(statuses(first).values()) == {"built"}
+    assert dashboard["measurements"] == 144
+
+    again = Pipeline(sources, params, cache_dir)
+    assert again.get("dashboard") == dashboard
+    again.get("report")
+    assert statuses(again) == {"dashboard": "cache", "report": "cache"}
+
+    # The accommodation is only read by the prompt
+    with open(sources["accommodation"]) as file:
+        accommodation = json.load(file)
+    accommodation[0]["nom_du_logement"] = "Autre logement"
+    with open(sources["accommodation"], "w") as file:
+        json.dump(accommodation, file)
+    edited = Pipeline(sources, params, cache_dir)
+    edited.get("dashboard")
+    edited.get("report")
+    assert statuses(edited) == {"dashboard": "cache", "aggregates": "cache", "prompt": "built", "report": "built"}
+
+    # A parameter read by the aggregates rebuilds them and what follows
+    salon = Pipeline(sources, default_params("Salon"), cache_dir)
+    salon.get("dashboard")
+    assert statuses(salon) == {"segments": "cache", "aggregates": "built", "dashboard": "built"}
+
+
+def test_put_value_is_used_instead_of_the_inputs(tmp_path, sources):
+    cache_dir = str(tmp_path / "cache")
+    pipeline = Pipeline(sources, default_params(), cache_dir)
+    pipeline.put("segments", clean_capture(RECORDS[:60]))
+    assert pipeline.get("dashboard")["measurements"] == 60
+
+    # The value is cached under the fingerprint of the capture
+    assert Pipeline(sources, default_params(), cache_dir).get("dashboard")["measurements"] == 60
+
+
+def test_without_cache_directory_nothing_is_written(tmp_path, sources):
+    pipeline = Pipeline(sources, default_params(), cache_dir=None)
+    assert pipeline.get("dashboard")["measurements"] == 144
+    assert set(statuses(pipeline).values()) == {"built"}
+    assert sorted(os.listdir(tmp_path)) == ["capture.json", "logement.json"]
+
+
+def test_prune_cache_drops_old_then_least_recently_used_files(tmp_path):
+    now = time.time()
+    for name, age_days, size in [("old", 40, 10), ("a", 3, 100), ("b", 2, 100), ("c", 1, 100)]:
+        path = tmp_path / name / "artifact.bin"
+        path.parent.mkdir()
+        path.write_bytes(b"x" * size)
+        os.utime(path, (now - age_days * 86400, now - age_days * 86400))
+
+    assert prune_cache(str(tmp_path), max_bytes=250, max_age_days=30) == 2
+    assert sorted(path for path in os.listdir(tmp_path) if os.listdir(tmp_path / path)) == ["b", "c"]
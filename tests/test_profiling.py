@@ -0,0 +1,38 @@
+import json
+import time
+
+from sonalyse_advisor import profiling
+
+
+def allocate_and_wait():
+    blocks = [bytearray(1024) for _ in range(512)]
+    time.sleep(0.05)
+    return blocks
+
+
+def test_stages_and_samples_are_written(tmp_path, monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    assert profiling.stage("idle") is profiling.stage("other")
+    assert profiling.profiling_requested({"profile": ["1"]})
+    assert not profiling.profiling_requested({"profile": "0"})
+
+    run = profiling.start_profile("test", str(tmp_path))
+    with profiling.stage("aggregates"):
+        with profiling.stage("nested"):
+            kept = allocate_and_wait()
+    paths = run.finish()
+    assert profiling.stage("after") is profiling._NO_PROFILE
+
+    with open(paths["stages"]) as file:
+        stages = json.load(file)["stages"]
+    assert [record["stage"] for record in stages] == ["nested", "aggregates"]
+    assert "allocated_kb" not in stages[0]
+    assert stages[1]["allocated_kb"] >= 512 and stages[1]["seconds"] >= 0.05
+    assert any(f"{__file__}:" in allocator["location"] for allocator in stages[1]["top_allocators"])
+    assert len(kept) == 512
+
+    with open(paths["speedscope"]) as file:
+        frames = json.load(file)["shared"]["frames"]
+    assert "allocate_and_wait" in {frame["name"] for frame in frames}
+    with open(paths["folded"]) as file:
+        assert "allocate_and_wait (test_profiling.py:" in file.read()
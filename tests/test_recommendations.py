@@ -0,0 +1,31 @@
+from sonalyse_advisor.recommendations import build_report, catalogue_text, indoor_limits, label_category
+
+
+def daily_data(day: float, night: float, percentages: dict) -> dict:
+    return {"daily": {"average_daily_rating": "C", "average_daily_db": day,
+                      "period_leq_dB": {"day": day, "night": night}, "noise_daily_percentage": percentages}}
+
+
+def test_labels_match_whole_words_only():
+    assert label_category("Car alarm") == "circulation"
+    assert label_category("Trucks") == "circulation"
+    assert label_category("Scary music") == "musique"
+    assert label_category("Silence") == "autres"
+
+
+def test_reference_levels_follow_the_grade_thresholds():
+    assert indoor_limits("Chambre") == {"day": 35, "night": 30}
+    assert indoor_limits("Salon") == {"day": 40, "night": 35}
+    assert "35 dB le jour, 30 dB la nuit" in catalogue_text("chambre")
+
+
+def test_tiers_grow_with_the_excess():
+    quiet = build_report(daily_data(33.0, 28.0, {"Speech": 70.0, "Vehicle": 30.0}), "Chambre")
+    assert quiet["dominant_category"] == "voix"
+    assert all(level["compliant"] for level in quiet["levels"].values())
+    assert quiet["recommendations"]["low_cost"] and not quiet["recommendations"]["heavy"]
+
+    loud = build_report(daily_data(42.0, 41.0, {"Vehicle": 80.0, "Speech": 20.0}), "Chambre")
+    assert loud["levels"]["night"]["excess_dB"] == 11.0
+    assert loud["recommendations"]["intermediate"] and loud["recommendations"]["heavy"]
+    assert any("priorité au calme nocturne" in line for line in loud["takeaways"])
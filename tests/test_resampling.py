@@ -0,0 +1,69 @@
+import numpy as np
+
+from conftest import make_segment
+from sonalyse_advisor.columnar import to_columns
+from sonalyse_advisor.resampling import (
+    MIN_GAP_SECONDS,
+    average_level,
+    coverage_summary,
+    grid_step,
+    hourly_profile,
+    resample,
+)
+
+
+def minute_capture(levels: dict) -> dict:
+    """Columns of one segment at each offset (s) of ``levels`` after 2025-03-03 10:00:00."""
+    start = np.datetime64("2025-03-03T10:00:00", "s")
+    return to_columns([
+        make_segment(str(start + np.timedelta64(offset, "s")).replace("T", " "), level)
+        for offset, level in sorted(levels.items())
+    ])
+
+
+def test_dense_segments_do_not_outweigh_sparse_ones():
+    levels = {offset: 40.0 for offset in range(0, 600, 10)}
+    levels.update({offset: 80.0 for offset in range(1, 10)})
+    grid = resample(minute_capture(levels), step_seconds=10)
+
+    assert grid["segments"][0] == 10
+    assert round(float(grid["average_dB"][0]), 1) == round(10 * np.log10((10 ** 4 + 9 * 10 ** 8) / 10), 1)
+    # One loud slot out of 60 moves the mean by (slot level - 40) / 60 only
+    assert average_level(grid) == round((59 * 40.0 + float(grid["average_dB"][0])) / 60, 1)
+
+
+def test_coverage_and_gaps():
+    # 10:00-10:10 and 10:30-10:40 covered, a 20 min gap in between
+    offsets = list(range(0, 600, 10)) + list(range(1800, 2400, 10))
+    grid = resample(minute_capture({offset: 45.0 for offset in offsets}), step_seconds=10)
+    coverage = coverage_summary(grid)
+
+    assert coverage["coverage_percentage"] == 50.0
+    assert coverage["gap_count"] == 1
+    assert coverage["longest_gaps"][0]["start"] == "2025-03-03 10:10:00"
+    assert coverage["longest_gaps"][0]["duration_minutes"] == 20.0
+    profile = hourly_profile(grid)
+    assert list(profile) == ["10"]
+    assert profile["10"]["coverage"] == 50.0
+    assert profile["10"]["low_coverage"] is False
+
+
+def test_short_gaps_are_not_reported():
+    offsets = [offset for offset in range(0, 1200, 10) if not 300 <= offset < 300 + MIN_GAP_SECONDS - 10]
+    grid = resample(minute_capture({offset: 45.0 for offset in offsets}), step_seconds=10)
+    assert coverage_summary(grid)["gap_count"] == 0
+
+
+def test_grid_is_capped_for_long_spans():
+    assert grid_step(599, 10, max_slots=60) == 10
+    assert grid_step(600, 10, max_slots=60) == 20
+    grid = resample(minute_capture({0: 40.0, 10 * 86400: 40.0}), step_seconds=1)
+    assert len(grid["segments"]) <= 1_000_000
+    assert int(grid["segments"].sum()) == 2
+
+
+def test_empty_capture():
+    grid = resample(to_columns([]))
+    assert len(grid["segments"]) == 0
+    assert average_level(grid) == 0
+    assert coverage_summary(grid)["coverage_percentage"] == 0.0
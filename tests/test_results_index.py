@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from sonalyse_advisor.results_index import ResultsIndex
+
+
+def room_data(night: float, grade: str) -> dict:
+    return {
+        "daily": {"average_daily_db": night + 5, "average_daily_rating": grade,
+                  "period_leq_dB": {"day": night + 8, "night": night},
+                  "noise_daily_percentage": {"Vehicle": 60.0, "Speech": 40.0}},
+        "hourly": {"db_min_max_peak_per_hour": {"23": {"average_dB": night, "min_dB": night - 5,
+                                                       "max_dB": night + 10, "peak_dB": night + 15}},
+                   "noise_hourly_percentage": {"23": {"noise_type": "Vehicle", "percentage": 60.0}}},
+    }
+
+
+@pytest.fixture
+def index():
+    with open("data/logement1.json") as file:
+        logement = json.load(file)[0]
+    other = dict(logement, id=2, code_postal="69002", ville="Lyon", etage=1)
+    index = ResultsIndex(":memory:")
+    for accommodation in (logement, other):
+        index.upsert_logement(accommodation)
+    index.add_room_result(1, "Chambre principale", "a.json", room_data(42.0, "E"))
+    index.add_room_result(1, "Salon", "a.json", room_data(45.0, "D"))
+    index.add_room_result(2, "Chambre principale", "b.json", room_data(38.0, "C"))
+    index.add_room_result(2, "Chambre enfant", "b.json", room_data(44.0, "F"))
+    yield index
+    index.close()
+
+
+def test_rooms_above_a_night_level(index):
+    rooms = index.rooms_above(40, room_type="Chambre")
+    assert [(room["logement_id"], room["piece"]) for room in rooms] == [(2, "Chambre enfant"), (1, "Chambre principale")]
+    assert [room["piece"] for room in index.rooms_above(40, code_postal="69002")] == ["Chambre enfant"]
+
+    # Indexing a capture again replaces its result
+    index.add_room_result(2, "Chambre enfant", "b.json", room_data(35.0, "B"))
+    assert not index.rooms_above(40, code_postal="69002")
+
+
+def test_grade_rollup_by_accommodation_fields(index):
+    rollup = index.grade_rollup(("ville",))
+    assert [(row["ville"], row["rooms"], row["average_grade"]) for row in rollup] == [("Lyon", 2, "E"), ("Paris", 2, "E")]
+    assert rollup[0]["night_leq_db"] == 41.0
+    with pytest.raises(KeyError):
+        index.add_room_result(1, "Grenier", "a.json", room_data(30.0, "A"))
@@ -0,0 +1,91 @@
+import http.client
+import json
+from urllib.parse import urlparse
+
+import pytest
+
+from conftest import make_segment
+from sonalyse_advisor.agent_backend import REPORT_SECTIONS
+from sonalyse_advisor.service import AnalysisService, start_service
+
+
+@pytest.fixture
+def service(tmp_path):
+    analysis = AnalysisService(workers=1, max_pending=4, upload_dir=str(tmp_path / "uploads"),
+                               cache_dir=str(tmp_path / "cache"))
+    server, url = start_service(service=analysis)
+    yield urlparse(url)
+    server.shutdown()
+    analysis.shutdown()
+
+
+def request(connection, method: str, path: str, body: bytes = None, headers: dict = None):
+    connection.request(method, path, body, headers or {})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def capture_body() -> bytes:
+    return json.dumps([make_segment(f"2025-03-03 {hour:02d}:{minute:02d}:00", 35.0 + hour % 10)
+                       for hour in range(24) for minute in range(0, 60, 10)]).encode()
+
+
+def test_upload_then_artifacts(service):
+    connection = http.client.HTTPConnection(service.hostname, service.port, timeout=120)
+    status, body = request(connection, "POST", "/captures", capture_body(), {"X-Filename": "capture.json"})
+    entry = json.loads(body)
+    assert status == 201 and entry["segments"] == 144 and not entry["duplicate"]
+    sha256 = entry["sha256"]
+
+    # The hash of a known capture is enough
+    status, body = request(connection, "POST", "/captures", b"", {"X-Content-SHA256": sha256})
+    assert status == 200 and json.loads(body)["sha256"] == sha256
+
+    connection = http.client.HTTPConnection(service.hostname, service.port, timeout=120)
+    status, body = request(connection, "GET", f"/captures/{sha256}/aggregates?room_type=Chambre")
+    aggregates = json.loads(body)
+    assert status == 200
+    assert aggregates["quality"]["segments"] == 144
+    assert set(aggregates["daily"]["period_leq_dB"]) == {"day", "night"}
+
+    status, body = request(connection, "GET", f"/captures/{sha256}/report?room_type=Chambre")
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert [line["section"] for line in lines[:-1]] == [key for key, _, _ in REPORT_SECTIONS]
+    assert lines[-1]["done"]
+
+    status, body = request(connection, "GET", f"/captures/{sha256}/d3")
+    assert status == 200 and json.loads(body)
+
+    status, body = request(connection, "GET", "/health")
+    assert status == 200 and json.loads(body)["errors"] == 0
+
+
+def test_unknown_captures_and_accommodations(service):
+    connection = http.client.HTTPConnection(service.hostname, service.port, timeout=30)
+    assert request(connection, "GET", f"/captures/{'0' * 64}/pdf")[0] == 404
+    assert request(connection, "GET", "/nowhere")[0] == 404
+
+    status, body = request(connection, "POST", "/captures", capture_body())
+    sha256 = json.loads(body)["sha256"]
+    assert request(connection, "GET", f"/captures/{sha256}/pdf?accommodation=../../etc/passwd")[0] == 400
+
+
+@pytest.mark.parametrize("length, status", [("abc", 400), ("-5", 400), (str(10 ** 12), 413)])
+def test_invalid_content_length_is_refused_before_reading(service, length, status):
+    connection = http.client.HTTPConnection(service.hostname, service.port, timeout=30)
+    connection.putrequest("POST", "/captures")
+    connection.putheader("Content-Length", length)
+    connection.endheaders()
+    assert connection.getresponse().status == status
+
+
+def test_unreadable_upload_keeps_the_connection_usable(service):
+    connection = http.client.HTTPConnection(service.hostname, service.port, timeout=30)
+    # Large enough for the server to drain it over several reads
+    body = b'[{"timestamp": 1}' + b" " * (1 << 20) + b"not json"
+    status, answer = request(connection, "POST", "/captures", body)
+    assert status == 400 and "illisible" in json.loads(answer)["error"]
+
+    status, _ = request(connection, "GET", "/health")
+    assert status == 200
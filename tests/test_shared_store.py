@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sonalyse_advisor.shared_store import SharedCaptureStore, capture_key
+
+
+def test_concurrent_misses_share_one_load():
+    store, loads = SharedCaptureStore(), []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.2)
+        return {"grade": "C"}
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: store.get("capture", loader), range(8)))
+    assert len(loads) == 1
+    assert results == [{"grade": "C"}] * 8
+    assert store.stats()["misses"] == 1 and store.stats()["hits"] == 7
+
+
+def test_sessions_cannot_change_each_others_data():
+    store = SharedCaptureStore()
+    first = store.get("capture", lambda: {"noise_types_by_hour": {"10": ["Speech"]}})
+    first["noise_types_by_hour"]["10"].append("Music")
+
+    second = store.get("capture", lambda: None)
+    assert second == {"noise_types_by_hour": {"10": ["Speech"]}}
+    second["noise_types_by_hour"].clear()
+    assert store.get("capture", lambda: None)["noise_types_by_hour"] == {"10": ["Speech"]}
+
+
+def test_least_recently_used_entries_are_evicted():
+    store = SharedCaptureStore(budget_bytes=2500)
+    for key in "abc":
+        store.get(key, lambda: b"x" * 1000)
+    store.get("b", lambda: None)
+    store.get("d", lambda: b"x" * 1000)
+
+    assert store.stats()["evictions"] == 2
+    assert store.nbytes <= 2500
+    assert store.get("b", lambda: "reloaded") == b"x" * 1000
+    assert store.get("a", lambda: "reloaded") == "reloaded"
+
+
+def test_capture_key_changes_with_the_file(tmp_path):
+    path = tmp_path / "capture.json"
+    path.write_text("[]")
+    key = capture_key(str(path))
+    assert capture_key(str(path)) == key
+    path.write_text("[{}]")
+    assert capture_key(str(path)) != key
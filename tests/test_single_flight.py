@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sonalyse_advisor.single_flight import SingleFlight, fcntl, private_directory
+
+
+def slow_call(counter: list, value, seconds: float = 0.3):
+    def fn():
+        counter.append(1)
+        time.sleep(seconds)
+        return value
+    return fn
+
+
+def test_concurrent_threads_share_one_call():
+    group, calls = SingleFlight(cross_process=False), []
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: group.do("key", slow_call(calls, {"grade": "C"})), range(8)))
+
+    assert len(calls) == 1
+    assert results == [{"grade": "C"}] * 8
+    assert group.stats == {"computed": 1, "shared_thread": 7, "shared_process": 0}
+
+
+def test_different_keys_and_later_calls_are_computed_again():
+    group, calls = SingleFlight(cross_process=False), []
+    with ThreadPoolExecutor(2) as executor:
+        list(executor.map(lambda key: group.do(key, slow_call(calls, key)), ["a", "b"]))
+    group.do("a", slow_call(calls, "a", 0))
+
+    assert len(calls) == 3
+
+
+def test_errors_reach_every_waiting_caller():
+    group, calls = SingleFlight(cross_process=False), []
+    started = threading.Event()
+
+    def failing():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    def call(_):
+        try:
+            group.do("key", failing)
+        except RuntimeError as error:
+            return str(error)
+
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(call, 0)]
+        started.wait()
+        futures += [executor.submit(call, i) for i in range(1, 4)]
+        assert [future.result() for future in futures] == ["boom"] * 4
+    assert len(calls) == 1
+
+
+def _process_call(lock_dir: str, log_path: str, barrier, results):
+    def compute():
+        with open(log_path, "a") as file:
+            file.write(f"{os.getpid()}\n")
+        time.sleep(0.5)
+        return {"pid": os.getpid()}
+
+    group = SingleFlight(lock_dir)
+    barrier.wait()
+    results.put(group.do("analysis", compute))
+
+
+@pytest.mark.skipif(fcntl is None, reason="fcntl is needed to share calls between processes")
+def test_concurrent_processes_share_one_call(tmp_path):
+    lock_dir, log_path = str(tmp_path / "locks"), str(tmp_path / "calls.log")
+    context = multiprocessing.get_context("spawn")
+    barrier, queue = context.Barrier(3), context.Queue()
+    processes = [context.Process(target=_process_call, args=(lock_dir, log_path, barrier, queue)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    results = [queue.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    with open(log_path) as file:
+        assert len(file.read().split()) == 1
+    assert len({result["pid"] for result in results}) == 1
+    # The last process to leave deletes the lock, wait and result files
+    assert os.listdir(lock_dir) == []
+
+
+@pytest.mark.skipif(fcntl is None, reason="fcntl is needed to share calls between processes")
+def test_lock_directory_open_to_others_disables_process_sharing(tmp_path):
+    lock_dir = tmp_path / "locks"
+    lock_dir.mkdir(mode=0o777)
+    os.chmod(lock_dir, 0o777)
+    assert not private_directory(str(lock_dir))
+
+    group, calls = SingleFlight(str(lock_dir)), []
+    assert group.do("key", slow_call(calls, 1, 0)) == 1
+    assert os.listdir(lock_dir) == []
+    assert private_directory(str(tmp_path / "private"))
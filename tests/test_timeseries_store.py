@@ -0,0 +1,37 @@
+import os
+
+from conftest import make_segment
+from sonalyse_advisor.timeseries_store import TimeSeriesStore
+
+
+def test_appends_are_combined_per_bucket_and_compacted(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    assert store.segments_version("chambre") is None
+    store.append("chambre", [make_segment("2025-03-03 10:00:00", 40.0), make_segment("2025-03-03 23:00:00", 30.0)])
+    version = store.segments_version("chambre")
+    # The second append touches the same day and month buckets
+    store.append("chambre", [make_segment("2025-03-03 11:00:00", 40.0), make_segment("2025-03-04 12:00:00", 50.0)])
+    assert store.segments_version("chambre") != version
+    assert store.rooms() == ["chambre"]
+
+    day = store.read_rollup("chambre", "day")
+    assert [str(bucket)[:10] for bucket in day["bucket"]] == ["2025-03-03", "2025-03-04"]
+    assert day["count"].tolist() == [3, 1]
+    assert round(float(day["night_leq_dB"][0]), 1) == 30.0
+    assert store.trend("chambre") == [
+        {"period": "2025-03", "leq_dB": 44.8, "day_leq_dB": 46.0, "night_leq_dB": 30.0, "segments": 4}
+    ]
+
+    store.compact("chambre")
+    assert len(os.listdir(tmp_path / "room=chambre" / "rollup=month")) == 1
+    assert store.read_rollup("chambre", "day")["count"].tolist() == [3, 1]
+
+
+def test_segments_are_read_from_the_requested_days_only(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    store.append("salon", [make_segment(f"2025-03-0{day} 12:00:00", 40.0 + day) for day in range(1, 6)])
+
+    segments = store.read_segments("salon", "2025-03-02", "2025-03-04", columns=["average_dB"])
+    assert [str(t)[:10] for t in segments["timestamp"]] == ["2025-03-02", "2025-03-03"]
+    assert segments["average_dB"].tolist() == [42.0, 43.0]
+    assert store.read_downsampled("salon", max_points=2)["resolution"] == "month"
@@ -0,0 +1,67 @@
+import gzip
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from conftest import make_segment
+from sonalyse_advisor import uploads
+from sonalyse_advisor.uploads import find_upload, ingest_upload, load_index
+from sonalyse_advisor.validation import clean_capture
+
+
+def capture_bytes(i: int) -> bytes:
+    return json.dumps([make_segment(f"2025-03-03 00:00:{i:02d}", 40.0 + i)]).encode()
+
+
+def upload(args) -> str:
+    upload_dir, i = args
+    entry, _, _ = ingest_upload(io.BytesIO(capture_bytes(i)), f"capture{i}.json", upload_dir)
+    return entry["sha256"]
+
+
+def test_concurrent_uploads_keep_every_index_entry(tmp_path):
+    upload_dir = str(tmp_path / "uploads")
+    with ThreadPoolExecutor(8) as executor:
+        hashes = list(executor.map(upload, [(upload_dir, i) for i in range(8)]))
+    with ProcessPoolExecutor(4) as executor:
+        hashes += list(executor.map(upload, [(upload_dir, i) for i in range(8, 16)]))
+
+    index = load_index(upload_dir)
+    assert sorted(index) == sorted(hashes)
+    assert len(index) == 16
+    # Neither temporary index files nor unfinished uploads are left behind
+    assert not [name for name in os.listdir(upload_dir) if name.endswith(".tmp") or name.startswith(".upload-")]
+
+
+def test_known_content_is_not_stored_twice(tmp_path):
+    upload_dir = str(tmp_path / "uploads")
+    entry, records, duplicate = ingest_upload(io.BytesIO(capture_bytes(1)), "a.json", upload_dir)
+    assert not duplicate and len(records) == 1
+    assert entry["segments"] == 1 and entry["rejected_segments"] == 0
+
+    again, records, duplicate = ingest_upload(io.BytesIO(capture_bytes(1)), "b.json", upload_dir)
+    assert duplicate and records is None
+    assert again == entry
+    assert find_upload(entry["sha256"], upload_dir) == entry
+
+
+def test_compressed_upload_is_hashed_as_sent(tmp_path):
+    upload_dir = str(tmp_path / "uploads")
+    body = gzip.compress(capture_bytes(2))
+    entry, records, _ = ingest_upload(io.BytesIO(body), "capture.json.gz", upload_dir)
+
+    assert entry["path"].endswith(".json.gz")
+    assert entry["bytes"] == len(body)
+    assert records == json.loads(capture_bytes(2))
+
+
+def test_batch_boundaries_are_checked_like_one_capture(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "BATCH_SEGMENTS", 3)
+    seconds = [0, 10, 20, 20, 30, 40, 5, 50, 60]
+    body = json.dumps([make_segment(f"2025-03-03 10:{second // 60:02d}:{second % 60:02d}") for second in seconds])
+    entry, records, _ = ingest_upload(io.BytesIO(body.encode()), "capture.json", str(tmp_path / "uploads"))
+
+    assert len(records) == 9
+    assert entry["rejected_segments"] == 2
+    assert entry["rejected_segments"] == clean_capture(records)[2]["rejected"]
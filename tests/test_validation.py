@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from conftest import make_segment
+from sonalyse_advisor.columnar import to_columns
+from sonalyse_advisor.validation import clean_capture, validate_columns
+
+NOW = np.datetime64("2025-03-04T00:00:00", "s")
+
+
+def reasons_of(records: list) -> list:
+    validation = validate_columns(to_columns(records), now=NOW)
+    return [
+        sorted(reason for reason, mask in validation["reasons"].items() if mask[i])
+        for i in range(len(records))
+    ]
+
+
+def test_malformed_rows_are_rejected_without_raising():
+    records = [
+        make_segment("2025-03-03 00:00:00"),
+        "not a segment",
+        make_segment("2025-03-03 00:00:10", LAeq_segment_dB="loud"),
+        make_segment("not a date"),
+        make_segment("2025-03-03 00:00:20", label=42),
+    ]
+    reasons = reasons_of(records)
+    assert reasons[0] == []
+    for i in range(1, len(records)):
+        assert "malformed" in reasons[i]
+
+
+def test_timestamp_checks():
+    records = [
+        make_segment("2025-03-03 00:00:00"),
+        make_segment("2025-03-03 00:00:10"),
+        make_segment("2025-03-03 00:00:10"),
+        make_segment("2025-03-03 00:00:05"),
+        make_segment(None),
+        make_segment("1970-01-01 00:00:00"),
+        make_segment("2031-01-01 00:00:00"),
+    ]
+    reasons = reasons_of(records)
+    assert reasons[:2] == [[], []]
+    assert reasons[2] == ["duplicate_timestamp"]
+    assert reasons[3] == ["non_monotonic_timestamp"]
+    assert reasons[4] == ["missing_timestamp"]
+    # Implausible dates are not taken as the reference of the order checks
+    assert reasons[5] == ["implausible_timestamp"]
+    assert reasons[6] == ["implausible_timestamp"]
+
+
+@pytest.mark.parametrize("glitch", ["2025-03-03 12:00:00", "2025-03-02 12:00:00"])
+def test_a_single_clock_glitch_rejects_only_that_row(glitch):
+    start = np.datetime64("2025-03-03T00:00:00", "s")
+    records = [make_segment(str(start + np.timedelta64(10 * i, "s")).replace("T", " ")) for i in range(1000)]
+    records[10]["timestamp"] = glitch
+
+    validation = validate_columns(to_columns(records), now=NOW)
+    assert np.flatnonzero(validation["reasons"]["non_monotonic_timestamp"]).tolist() == [10]
+    assert validation["counts"]["non_monotonic_timestamp"] == 1
+    assert validation["valid"].sum() == 999
+
+
+def test_level_and_label_checks():
+    records = [
+        make_segment("2025-03-03 00:00:00", level=200.0),
+        make_segment("2025-03-03 00:00:10", Lmin_dB=80.0),
+        make_segment("2025-03-03 00:00:20", label="Not an AudioSet label"),
+        make_segment("2025-03-03 00:00:30", top_5_labels=[]),
+        make_segment("2025-03-03 00:00:40", label="Walk, footstep"),
+    ]
+    reasons = reasons_of(records)
+    assert reasons[0] == ["out_of_range_level"]
+    assert reasons[1] == ["inconsistent_levels"]
+    assert reasons[2] == ["unknown_label"]
+    assert reasons[3] == ["missing_label"]
+    # Firmware spelling of a known label
+    assert reasons[4] == []
+
+
+def test_clean_capture_keeps_valid_rows_and_reports_the_others(tmp_path):
+    records = [make_segment(f"2025-03-03 00:00:{second:02d}") for second in range(0, 50, 10)]
+    records.insert(2, make_segment("2025-03-03 00:00:15", level=-5.0))
+    records.append({"timestamp": "2025-03-03 00:01:00"})
+    path = tmp_path / "quarantine.json"
+
+    valid, columns, report = clean_capture(records, str(path))
+
+    assert len(valid) == len(columns["timestamp"]) == 5
+    assert report["rejected"] == 2
+    assert report["counts"] == {"out_of_range_level": 1, "missing_level": 1, "missing_label": 1}
+    assert [example["index"] for example in report["examples"]] == [2, 6]
+    assert path.exists()
+    assert not columns["average_dB"].flags.writeable